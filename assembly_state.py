@@ -0,0 +1,408 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Штрихкод, приклеенный к концу наименования: "Кружка белая 4601234567890"
+TRAILING_BARCODE = re.compile(r'[\s,;:]*(\d{8,14})(\.0)?\s*$')
+
+
+def ensure_line_ids(items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Проставляет каждой позиции постоянный line_id и возвращает словарь
+    line_id -> позиция. Артикул для этого не подходит: один и тот же товар
+    может встречаться в отгрузке несколько раз.
+    """
+    used_ids = [item['line_id'] for item in items if isinstance(item.get('line_id'), int)]
+    next_id = max(used_ids, default=-1) + 1
+
+    by_line = {}
+    for item in items:
+        line_id = item.get('line_id')
+        if not isinstance(line_id, int) or line_id in by_line:
+            line_id = next_id
+            next_id += 1
+            item['line_id'] = line_id
+        by_line[line_id] = item
+    return by_line
+
+
+def short_barcode(barcode: str) -> str:
+    """Последние 4 цифры штрихкода, как в колонке "ШК"."""
+    barcode = barcode or ''
+    return (barcode[-4:] if len(barcode) >= 4 else barcode).lstrip('.')
+
+
+def clean_name(name: str, barcode: str = '') -> str:
+    """
+    Наименование без штрихкода позиции в конце. Число в конце убирается,
+    только если это ее собственный штрихкод (как есть или без ".0" и точки
+    в начале): номера моделей и артикулы в наименовании остаются.
+    """
+    name = str(name).strip()
+    barcode = str(barcode or '').strip()
+    if not barcode:
+        return name
+    if name.endswith(barcode):
+        cleaned = name[:-len(barcode)]
+    else:
+        match = TRAILING_BARCODE.search(name)
+        if not match or match.group(1) != re.sub(r'\.0*$', '', barcode.lstrip('.')):
+            return name
+        cleaned = name[:match.start()]
+    return cleaned.rstrip(' ,;:') or name
+
+
+class ItemDisplay(NamedTuple):
+    """Строки, которые экран сборки показывает для позиции."""
+    name: str
+    location: str
+    short_barcode: str
+    quantity: str
+
+
+def project_item(item: Dict[str, Any]) -> ItemDisplay:
+    barcode = item.get('barcode', '') or ''
+    return ItemDisplay(
+        name=clean_name(item['name'], barcode),
+        location=str(item.get('location', '')).strip() or '---',
+        short_barcode=short_barcode(barcode),
+        quantity=str(item['quantity'])
+    )
+
+
+class DisplayCache:
+    """
+    Отображаемые строки позиций, посчитанные один раз. Экран сборки после
+    показа позиции вызывает prefetch(), чтобы следующие позиции уже были
+    готовы и переход к ним сводился к поиску в словаре.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], ahead: int = 5):
+        self.items = items
+        self.ahead = ahead
+        self.cache: Dict[int, ItemDisplay] = {}  # line_id -> строки
+
+    def get(self, pos: int) -> ItemDisplay:
+        item = self.items[pos]
+        display = self.cache.get(item['line_id'])
+        if display is None:
+            display = self.cache[item['line_id']] = project_item(item)
+        return display
+
+    def prefetch(self, pos: int):
+        """Готовит строки для нескольких следующих необработанных позиций."""
+        remaining = self.ahead
+        pos += 1
+        while remaining and pos < len(self.items):
+            if self.items[pos]['status'] == 'pending':
+                self.get(pos)
+                remaining -= 1
+            pos += 1
+
+    def invalidate(self, item: Dict[str, Any]):
+        self.cache.pop(item['line_id'], None)
+
+
+class PrefixIndex:
+    """Отсортированный список (ключ, line_id) для поиска по префиксу через bisect."""
+
+    def __init__(self, entries: Iterable[Tuple[str, int]] = ()):
+        self.entries = sorted(entries)
+
+    def lookup(self, prefix: str) -> Set[int]:
+        start = bisect_left(self.entries, (prefix,))
+        end = bisect_left(self.entries, (prefix + '\uffff',))
+        return {line_id for _, line_id in self.entries[start:end]}
+
+    def add_many(self, entries: Iterable[Tuple[str, int]]):
+        self.entries.extend(entries)
+        self.entries.sort()
+
+
+class WordIndex:
+    """
+    Поиск по словам текста: у каждого слова - множество line_id строк, где
+    оно есть. Часть слова ищется по триграммам словаря (разных слов в
+    отгрузке намного меньше, чем строк), часть короче трех символов - по
+    началу слова.
+    """
+    N = 3
+
+    def __init__(self, entries: Iterable[Tuple[str, int]] = ()):
+        self.postings: Dict[str, Set[int]] = {}
+        self.grams: Dict[str, Set[str]] = defaultdict(set)  # триграмма -> слова словаря
+        self.sorted_words: List[str] = []
+        self.add_many(entries)
+
+    def add_many(self, entries: Iterable[Tuple[str, int]]):
+        postings = self.postings
+        new_words = []
+        for text, line_id in entries:
+            for word in text.split():
+                lines = postings.get(word)
+                if lines is None:
+                    lines = postings[word] = set()
+                    new_words.append(word)
+                lines.add(line_id)
+        n = self.N
+        for word in new_words:
+            for i in range(len(word) - n + 1):
+                self.grams[word[i:i + n]].add(word)
+        if new_words:
+            self.sorted_words.extend(new_words)
+            self.sorted_words.sort()
+
+    def words_containing(self, part: str) -> List[str]:
+        if len(part) < self.N:
+            start = bisect_left(self.sorted_words, part)
+            end = bisect_left(self.sorted_words, part + '\uffff')
+            return self.sorted_words[start:end]
+        postings = sorted((self.grams.get(part[i:i + self.N], set()) for i in range(len(part) - self.N + 1)), key=len)
+        return [word for word in postings[0] if part in word]
+
+    def lookup(self, part: str) -> Set[int]:
+        words = self.words_containing(part)
+        if len(words) == 1:
+            return self.postings[words[0]]
+        return set().union(*(self.postings[word] for word in words))
+
+
+class AssemblyIndex:
+    """
+    Индексы позиций сборки для фильтров и поиска в обзоре, а также кэш
+    отображаемых строк. Статус и коробка меняются во время сборки,
+    поэтому после каждого изменения позиции нужно вызвать touch(item).
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.items = items
+        self.by_line = ensure_line_ids(items)
+        self.position = {item['line_id']: pos for pos, item in enumerate(items)}
+        self.display = DisplayCache(items)
+
+        self.by_status: Dict[str, Set[int]] = defaultdict(set)
+        self.by_box: Dict[int, Set[int]] = defaultdict(set)
+        self.indexed: Dict[int, Tuple[str, int]] = {}  # line_id -> (статус, коробка) в индексе
+        for item in items:
+            self.touch(item)
+
+        self.locations = PrefixIndex((str(item.get('location', '')).lower(), item['line_id']) for item in items)
+        self.articles = PrefixIndex((str(item.get('article', '')).lower(), item['line_id']) for item in items)
+        self.barcodes = PrefixIndex((short_barcode(item.get('barcode', '')), item['line_id']) for item in items)
+        # Для перехода к позиции: наименования и штрихкоды задом наперед (поиск по последним цифрам)
+        self.names = WordIndex((str(item.get('name', '')).lower(), item['line_id']) for item in items)
+        self.barcode_tails = PrefixIndex((str(item.get('barcode', ''))[::-1], item['line_id']) for item in items)
+
+    def touch(self, item: Dict[str, Any]):
+        """Переносит позицию в индексах статуса и коробки, если они изменились."""
+        line_id = item['line_id']
+        current = (item['status'], item['box'])
+        previous = self.indexed.get(line_id)
+        if previous == current:
+            return
+        if previous is not None:
+            self.by_status[previous[0]].discard(line_id)
+            self.by_box[previous[1]].discard(line_id)
+        self.by_status[current[0]].add(line_id)
+        self.by_box[current[1]].add(line_id)
+        self.indexed[line_id] = current
+
+    def extend(self, new_items: List[Dict[str, Any]]):
+        """
+        Добавляет позиции в конец списка сборки (постепенная загрузка файла)
+        и дописывает их в индексы; уже собранные позиции не затрагиваются.
+        """
+        next_id = max(self.by_line, default=-1) + 1
+        start = len(self.items)
+        for offset, item in enumerate(new_items):
+            item['line_id'] = next_id + offset
+            self.by_line[item['line_id']] = item
+            self.position[item['line_id']] = start + offset
+            self.touch(item)
+        self.items.extend(new_items)
+
+        self.locations.add_many((str(item.get('location', '')).lower(), item['line_id']) for item in new_items)
+        self.articles.add_many((str(item.get('article', '')).lower(), item['line_id']) for item in new_items)
+        self.barcodes.add_many((short_barcode(item.get('barcode', '')), item['line_id']) for item in new_items)
+        self.names.add_many((str(item.get('name', '')).lower(), item['line_id']) for item in new_items)
+        self.barcode_tails.add_many((str(item.get('barcode', ''))[::-1], item['line_id']) for item in new_items)
+
+    def box_items(self, box: int) -> List[Dict[str, Any]]:
+        """Позиции коробки в порядке маршрута."""
+        return [self.by_line[line_id] for line_id in sorted(self.by_box.get(box, ()), key=self.position.__getitem__)]
+
+    def boxes(self) -> List[int]:
+        """Номера коробок, в которых сейчас есть позиции."""
+        return sorted(box for box, lines in self.by_box.items() if lines and box > 0)
+
+    def query(self, status: Optional[str] = None, box: Optional[int] = None,
+              location: str = '', text: str = '') -> List[int]:
+        """
+        Возвращает индексы позиций в списке сборки, подходящих под все фильтры:
+        статус, номер коробки, префикс ячейки и поиск по артикулу или
+        последним цифрам штрихкода.
+        """
+        candidates = []
+        if status:
+            candidates.append(self.by_status.get(status, set()))
+        if box is not None:
+            candidates.append(self.by_box.get(box, set()))
+        location = location.strip().lower()
+        if location:
+            candidates.append(self.locations.lookup(location))
+        text = text.strip().lower()
+        if text:
+            candidates.append(self.articles.lookup(text) | self.barcodes.lookup(text))
+
+        if not candidates:
+            return list(range(len(self.items)))
+
+        candidates.sort(key=len)
+        smallest, rest = candidates[0], candidates[1:]
+        positions = [self.position[line_id] for line_id in smallest
+                     if all(line_id in other for other in rest)]
+        positions.sort()
+        return positions
+
+    def find_barcode(self, code: str) -> List[int]:
+        """Индексы позиций с этим штрихкодом (точное совпадение) по порядку маршрута."""
+        return sorted(self.position[line_id] for line_id in self.barcode_tails.lookup(code[::-1])
+                      if self.by_line[line_id].get('barcode') == code)
+
+
+def _search_word(index: "AssemblyIndex", word: str) -> Set[int]:
+    lines = index.names.lookup(word) | index.articles.lookup(word)
+    if word.isdigit():
+        lines |= index.barcode_tails.lookup(word[::-1])
+    return lines
+
+
+def search_items(index: "AssemblyIndex", text: str, limit: int = 30) -> List[int]:
+    """
+    Поиск для перехода к позиции на экране сборки: каждое слово запроса
+    должно найтись в наименовании (подстрокой), в начале артикула или в
+    конце штрихкода. Возвращает индексы позиций: сначала необработанные,
+    дальше по порядку маршрута.
+    """
+    words = text.strip().lower().split()
+    if not words:
+        return []
+    lines = None
+    for word in sorted(words, key=len, reverse=True):  # Длинные слова отсекают больше
+        found = _search_word(index, word)
+        lines = found if lines is None else lines & found
+        if not lines:
+            return []
+    items, position = index.items, index.position
+    return heapq.nsmallest(limit, (position[line_id] for line_id in lines),
+                           key=lambda pos: (items[pos]['status'] != 'pending', pos))
+
+
+def cell_group(items: List[Dict[str, Any]], pos: int) -> List[int]:
+    """
+    Необработанные позиции подряд по маршруту в той же ячейке, что и позиция
+    pos (включая ее). Обработанные позиции этой ячейки пропускаются, группа
+    заканчивается на первой позиции из другой ячейки.
+    """
+    if not 0 <= pos < len(items):
+        return []
+    location = items[pos].get('location')
+    if not location:
+        return [pos]  # Без ячейки позиции не группируются
+    group = []
+    while pos < len(items) and items[pos].get('location') == location:
+        if items[pos]['status'] == 'pending':
+            group.append(pos)
+        pos += 1
+    return group
+
+
+class BatchChange(NamedTuple):
+    """Действие над несколькими позициями сразу; отменяется одним шагом."""
+    positions: List[int]
+    before: List[Tuple[str, int, int]]  # (статус, собрано, коробка) до действия
+    cursor: int  # позиция экрана сборки до действия
+
+
+def collect_positions(items: List[Dict[str, Any]], positions: List[int], box: int, cursor: int) -> BatchChange:
+    """Отмечает позиции собранными полностью в коробку box."""
+    change = BatchChange(
+        positions=list(positions),
+        before=[(items[pos]['status'], items[pos]['collected_quantity'], items[pos]['box']) for pos in positions],
+        cursor=cursor,
+    )
+    for pos in positions:
+        item = items[pos]
+        item['status'] = 'collected'
+        item['collected_quantity'] = item['quantity']
+        item['box'] = box
+    return change
+
+
+def undo_change(items: List[Dict[str, Any]], change: BatchChange) -> List[Dict[str, Any]]:
+    """Возвращает позициям значения до действия; результат - затронутые позиции."""
+    restored = []
+    for pos, (status, collected, box) in zip(change.positions, change.before):
+        item = items[pos]
+        item['status'], item['collected_quantity'], item['box'] = status, collected, box
+        restored.append(item)
+    return restored
+
+
+def collected_records(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Собранные позиции в формате ExcelWriter: коробка, артикул, количество, штрихкод."""
+    return [
+        {
+            'box': item['box'],
+            'article': item['article'],
+            'name': item['name'],
+            'quantity': item['collected_quantity'],
+            'barcode': item.get('barcode', '')
+        }
+        for item in items if item['status'] in ['collected', 'quantity_changed'] and item['collected_quantity'] > 0
+    ]
+
+
+def skip_uncollected(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Список для файла результата, где необработанные позиции - пропущенные
+    копии: промежуточный файл не меняет сами позиции (их статус, отметки
+    часов сессии и пометки перепроверки).
+    """
+    return [
+        {**item, 'status': 'skipped', 'collected_quantity': 0, 'box': 0} if item['status'] == 'pending' else item
+        for item in items
+    ]
+
+
+def discrepancy_notes(items: List[Dict[str, Any]]) -> List[str]:
+    """Строки расхождений для итогового файла: пропущенные и измененные позиции."""
+    discrepancies = []
+    for item in items:
+        identifier = item.get('barcode') or f"Арт: {item['article']}"
+        if item['status'] == 'skipped':
+            discrepancies.append(f"Пропущено: {identifier} - {item['quantity']} шт.")
+        elif item['status'] == 'quantity_changed' and item['collected_quantity'] != item['quantity']:
+            discrepancies.append(f"Изменено: {identifier} было {item['quantity']}, стало {item['collected_quantity']}")
+    return discrepancies
+
+
+def write_result(items: List[Dict[str, Any]], shipment_info: str, original_file_path: str,
+                 output_directory: Optional[str] = None, writer_cls=None) -> str:
+    """
+    Итоговый файл сборки: собранное по коробкам и расхождения. Один путь
+    для завершения сборки в приложениях, волны и пересоздания файлов из
+    сохраненных сессий, поэтому содержимое файла у них одинаковое.
+    """
+    if writer_cls is None:
+        from excel_processor import ExcelWriter as writer_cls
+    writer = writer_cls(
+        collected_data=collected_records(items),
+        shipment_info=shipment_info,
+        discrepancies=discrepancy_notes(items),
+        original_file_path=original_file_path,
+        output_directory=output_directory
+    )
+    return writer.generate_final_file()
@@ -0,0 +1,57 @@
+"""
+Замер способов чтения книги (READERS в excel_processor) на образце отгрузки
+и на синтетических отгрузках.
+
+Запуск: python bench_readers.py [кол-во строк ...]
+По умолчанию образец из репозитория и синтетические файлы на 10000 и 50000 строк.
+Для каждого файла проверяется, что все способы дали одинаковые позиции.
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from excel_processor import READERS, ExcelProcessor
+from manifest_factory import write_manifest
+
+SAMPLE = Path(__file__).with_name("озон омск 233 сорт.xlsx")
+
+
+def make_manifest(path: Path, count: int):
+    write_manifest(path, ((f"Товар {i} синий", 1 + i % 5, f"ART-{i}", f"A-{i // 100:03d}-{i % 100:02d}", 4600000000000 + i)
+                          for i in range(count)))
+
+
+def run(path: Path, repeats: int = 3) -> dict:
+    results = {}
+    for name, backend in READERS.items():
+        if path.suffix.lower() not in backend.suffixes or not backend.available():
+            continue
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            orders, _ = ExcelProcessor(str(path), reader=name).process_file()
+            times.append(time.perf_counter() - started)
+        results[name] = (min(times) * 1000, orders)
+    return results
+
+
+def main(counts):
+    files = [(SAMPLE.name, SAMPLE)] if SAMPLE.exists() else []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in counts:
+            path = Path(tmp) / f"synthetic_{count}.xlsx"
+            make_manifest(path, count)
+            files.append((f"{count} строк", path))
+
+        print(f"{'файл':>28} {'способ':>18} {'мс':>10} {'позиций':>8}")
+        for label, path in files:
+            results = run(path)
+            reference = next(iter(results.values()))[1]
+            for name, (ms, orders) in sorted(results.items(), key=lambda r: r[1][0]):
+                same = "" if orders == reference else "  РАСХОЖДЕНИЕ"
+                print(f"{label:>28} {name:>18} {ms:>10.1f} {len(orders):>8}{same}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10000, 50000])
@@ -0,0 +1,72 @@
+"""
+Замер открытия экрана обзора и правки одной строки в flet_app.
+
+Запуск: python bench_review.py [кол-во позиций ...]
+По умолчанию 1000, 10000 и 50000 позиций.
+"""
+import statistics
+import sys
+import time
+
+from assembly_state import AssemblyIndex
+from flet_app import AssemblyApp
+from headless_page import HeadlessPage
+
+
+def make_items(count: int):
+    return [
+        {
+            "name": f"Товар {i} 46000000{i:05d}",
+            "quantity": 1 + i % 5,
+            "article": f"ART-{i}",
+            "location": f"A-{i // 100:03d}-{i % 100:02d}",
+            "barcode": f"46000000{i:05d}",
+            "status": "pending",
+            "collected_quantity": 0,
+            "box": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def run(count: int, edits: int = 20) -> dict:
+    page = HeadlessPage()
+    app = AssemblyApp(page)
+    app.assembly_items = make_items(count)
+    app.assembly_index = AssemblyIndex(app.assembly_items)
+
+    started = time.perf_counter()
+    app.build_review_ui()
+    open_seconds = time.perf_counter() - started
+    open_controls = page.update_log[-1]["controls"]
+
+    edit_times = []
+    edit_controls = []
+    for n in range(edits):
+        idx = (n * 7) % min(count, app.REVIEW_CHUNK_SIZE)
+        started = time.perf_counter()
+        app.on_edit_quantity_only(idx)
+        dialog = page.last_dialog
+        dialog.content.value = str(n)
+        dialog.actions[1].on_click(None)
+        edit_times.append(time.perf_counter() - started)
+        edit_controls.append(page.update_log[-1]["controls"])
+
+    return {
+        "items": count,
+        "open_ms": open_seconds * 1000,
+        "open_controls": open_controls,
+        "edit_ms": statistics.median(edit_times) * 1000,
+        "edit_controls": max(edit_controls),
+    }
+
+
+def main(counts):
+    print(f"{'позиций':>8} {'открытие, мс':>14} {'контролов':>10} {'правка, мс':>12} {'контролов':>10}")
+    for count in counts:
+        r = run(count)
+        print(f"{r['items']:>8} {r['open_ms']:>14.1f} {r['open_controls']:>10} {r['edit_ms']:>12.2f} {r['edit_controls']:>10}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 50000])
@@ -0,0 +1,334 @@
+"""
+Локальный сервис разбора и выгрузки без интерфейса.
+
+Запуск: python conversion_service.py [--host 127.0.0.1] [--port 8765] [--workers 2] [--queue 8]
+
+    POST /parse?name=файл.xlsx   тело - исходный Excel-файл; ответ - JSON
+                                 {"shipment_info": ..., "orders": [...]}
+    POST /export                 тело - JSON с collected_data, shipment_info,
+                                 discrepancies и file_name; ответ - итоговый xlsx
+    GET  /stats                  очередь, выполняемые задания и задержки
+    GET  /health
+
+Разбор и запись выполняются в пуле процессов ограниченного размера.
+Запросы сверх пула ждут в очереди длиной --queue, дальше сервис отвечает
+503 с заголовком Retry-After. Ответы отдаются частями (chunked).
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+ORDERS_PER_CHUNK = 500
+LATENCY_WINDOW = 1000
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ServiceBusy(Exception):
+    """Пул и очередь заполнены."""
+
+
+# --- Задания, выполняемые в процессах пула ---
+
+def _timed(func, *args):
+    return time.time(), func(*args)
+
+
+def parse_manifest(data: bytes, file_name: str) -> Tuple[list, str]:
+    """Разбирает присланный файл через ExcelProcessor; формат определяется по расширению имени."""
+    from excel_processor import ExcelProcessor
+
+    suffix = Path(file_name).suffix.lower() or ".xlsx"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"manifest{suffix}"
+        path.write_bytes(data)
+        orders, shipment_info = ExcelProcessor(str(path)).process_file()
+    return orders, shipment_info
+
+
+def export_result(payload: Dict[str, Any]) -> Tuple[str, bytes]:
+    """Пишет итоговый файл через ExcelWriter во временную папку и возвращает имя и содержимое."""
+    from excel_processor import ExcelWriter
+
+    file_name = Path(str(payload.get("file_name") or "result.xlsx")).name
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ExcelWriter(
+            collected_data=payload.get("collected_data", []),
+            shipment_info=str(payload.get("shipment_info", "")),
+            discrepancies=list(payload.get("discrepancies", [])),
+            original_file_path=str(Path(tmp) / file_name),
+            output_directory=tmp
+        )
+        output_path = Path(writer.generate_final_file())
+        return output_path.name, output_path.read_bytes()
+
+
+# --- Пул и статистика ---
+
+class ServiceStats:
+    """Счетчики заданий и задержки последних LATENCY_WINDOW заданий."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+        self.totals = deque(maxlen=LATENCY_WINDOW)
+
+    @staticmethod
+    def percentile(values, fraction: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            waits, totals = list(self.waits), list(self.totals)
+            in_flight = self.in_flight
+            result = {
+                "workers": self.workers,
+                "running": min(in_flight, self.workers),
+                "queue_depth": max(0, in_flight - self.workers),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        for name, values in (("queue_wait_ms", waits), ("latency_ms", totals)):
+            result[name] = {
+                "p50": round(self.percentile(values, 0.5) * 1000, 1),
+                "p95": round(self.percentile(values, 0.95) * 1000, 1),
+                "max": round(max(values, default=0.0) * 1000, 1),
+            }
+        return result
+
+
+class ConversionService:
+    """
+    Пул процессов с ограниченной очередью. submit() возвращает Future с
+    результатом задания или выбрасывает ServiceBusy, если заняты все
+    workers процессов и queue_limit мест в очереди.
+    """
+
+    def __init__(self, workers: int = 2, queue_limit: int = 8):
+        self.workers = max(1, workers)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(self.workers + max(0, queue_limit))
+        self.stats = ServiceStats(self.workers)
+
+    def submit(self, func, *args) -> Future:
+        if not self.slots.acquire(blocking=False):
+            with self.stats.lock:
+                self.stats.rejected += 1
+            raise ServiceBusy()
+
+        submitted = time.time()
+        with self.stats.lock:
+            self.stats.in_flight += 1
+        try:
+            inner = self.pool.submit(_timed, func, *args)
+        except Exception:
+            self._release(submitted, None, failed=True)
+            raise
+
+        outer = Future()
+
+        def done(f):
+            try:
+                started, result = f.result()
+            except BaseException as e:
+                self._release(submitted, None, failed=True)
+                outer.set_exception(e)
+            else:
+                self._release(submitted, started, failed=False)
+                outer.set_result(result)
+
+        inner.add_done_callback(done)
+        return outer
+
+    def _release(self, submitted: float, started: Optional[float], failed: bool):
+        finished = time.time()
+        with self.stats.lock:
+            self.stats.in_flight -= 1
+            if failed:
+                self.stats.failed += 1
+            else:
+                self.stats.completed += 1
+                self.stats.waits.append(max(0.0, started - submitted))
+                self.stats.totals.append(finished - submitted)
+        self.slots.release()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- HTTP ---
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Нужен для передачи ответа частями
+    server_version = "OfflineAssembler/1.0"
+
+    @property
+    def service(self) -> ConversionService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_body(self) -> Optional[bytes]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_BYTES:
+            self.send_json(413, {"error": "Файл слишком большой"})
+            self.close_connection = True
+            return None
+        return self.rfile.read(length)
+
+    def run_job(self, func, *args):
+        """Ставит задание в пул и ждет результат; None означает, что ответ уже отправлен."""
+        try:
+            return self.service.submit(func, *args).result()
+        except ServiceBusy:
+            self.send_json(503, {"error": "Сервис занят, повторите позже"}, {"Retry-After": "1"})
+        except ValueError as e:
+            self.send_json(422, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        return None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self.send_json(200, self.service.stats.summary())
+        elif path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "Нет такого адреса"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/parse":
+            self.handle_parse(parse_qs(url.query))
+        elif url.path == "/export":
+            self.handle_export()
+        else:
+            self.send_json(404, {"error": "Нет такого адреса"})
+
+    def handle_parse(self, query: Dict[str, list]):
+        body = self.read_body()
+        if body is None:
+            return
+        if not body:
+            self.send_json(400, {"error": "Пустой файл"})
+            return
+        result = self.run_job(parse_manifest, body, query.get("name", ["manifest.xlsx"])[0])
+        if result is None:
+            return
+
+        orders, shipment_info = result
+        self.start_chunked("application/json; charset=utf-8")
+        self.write_chunk(f'{{"shipment_info": {json.dumps(shipment_info, ensure_ascii=False)}, "orders": ['.encode("utf-8"))
+        for start in range(0, len(orders), ORDERS_PER_CHUNK):
+            part = ", ".join(json.dumps(order, ensure_ascii=False) for order in orders[start:start + ORDERS_PER_CHUNK])
+            self.write_chunk(((", " if start else "") + part).encode("utf-8"))
+        self.write_chunk(b"]}")
+        self.end_chunked()
+
+    def handle_export(self):
+        body = self.read_body()
+        if body is None:
+            return
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("ожидается объект")
+        except ValueError as e:
+            self.send_json(400, {"error": f"Некорректный JSON: {e}"})
+            return
+        result = self.run_job(export_result, payload)
+        if result is None:
+            return
+
+        file_name, data = result
+        self.start_chunked(XLSX_CONTENT_TYPE, {
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name, safe='')}"
+        })
+        for start in range(0, len(data), CHUNK_SIZE):
+            self.write_chunk(data[start:start + CHUNK_SIZE])
+        self.end_chunked()
+
+
+class ConversionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: ConversionService, verbose: bool = False):
+        super().__init__(address, ConversionHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, workers: int = 2,
+                queue_limit: int = 8, verbose: bool = False) -> ConversionServer:
+    return ConversionServer((host, port), ConversionService(workers, queue_limit), verbose)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный сервис разбора и выгрузки Excel")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    parser.add_argument("--queue", type=int, default=8, help="сколько запросов может ждать свободный процесс")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.workers, args.queue, args.verbose)
+    print(f"Сервис слушает http://{args.host}:{server.server_port} ({args.workers} процессов, очередь {args.queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
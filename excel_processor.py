@@ -1,81 +1,507 @@
+import functools
+import importlib.util
+import os
 import re
+import socket
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterator, NamedTuple
+from xml.etree import ElementTree
 import pandas as pd
 import openpyxl
-import xlrd
 from openpyxl.styles import Alignment
 from collections import defaultdict
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from profiling import profiled
+
+# Переменная окружения для выбора способа чтения (имя из READERS)
+READER_ENV = "OFFLINE_ASSEMBLER_READER"
+# Как часто разбор строк проверяет отмену и сообщает о ходе работы
+PROGRESS_EVERY = 1000
+# Названия колонок - в строке 5 (индекс 4)
+HEADER_ROW = 4
+REQUIRED_COLUMNS = {"Наименование товара", "Количество", "Артикул"}
+SHIPMENT_PATTERN = re.compile(r'№\s*([\w.-]+)\s+от\s+([\d.]+)')
+# Листы многолистовой книги разбираются в отдельных процессах начиная с этого размера файла
+PARALLEL_MIN_BYTES = 1024 * 1024
+# Длины штрихкодов с контрольной цифрой
+BARCODE_LENGTHS = {8: "EAN-8", 12: "UPC-A", 13: "EAN-13"}
+SCIENTIFIC_NUMBER = r'^[0-9]+(?:\.[0-9]+)?[eE][+-]?[0-9]+$'  # Только ASCII: \d пропускает цифры других алфавитов
+# Куда печатать этикетки закрытых коробок: файл или host:port принтера
+LABELS_ENV = "OFFLINE_ASSEMBLER_LABELS"
+LABEL_FORMATS = ("zpl", "text")
+
+
+# --- Способы чтения книги ---
+#
+# Каждый способ читает лист (по номеру) в поток строк: кортежи текстов ячеек,
+# None - пустая ячейка. Числа без дробной части пишутся как целые, так что
+# все способы дают одинаковые строки. Способы зарегистрированы по убыванию
+# скорости (замер - bench_readers.py): без явного выбора берется первый
+# доступный для расширения файла.
+
+class ReaderBackend(NamedTuple):
+    name: str
+    suffixes: Tuple[str, ...]
+    read: Callable[[Path, int], Iterator[Tuple[Optional[str], ...]]]
+    requires: Tuple[str, ...]  # Модули, без которых способ недоступен
+
+    def available(self) -> bool:
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+
+READERS: Dict[str, ReaderBackend] = {}
+
+
+def register_reader(name: str, suffixes: Tuple[str, ...], requires: Tuple[str, ...] = ()):
+    def decorator(read):
+        READERS[name] = ReaderBackend(name, suffixes, read, requires)
+        return read
+    return decorator
+
+
+def _cell_text(value) -> Optional[str]:
+    if value is None or value == '' or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+_XML_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def _workbook_sheets(archive: zipfile.ZipFile) -> List[Any]:
+    return ElementTree.fromstring(archive.read('xl/workbook.xml')).findall(f'{_XML_NS}sheets/{_XML_NS}sheet')
+
+
+def _sheet_path(archive: zipfile.ZipFile, sheet: int) -> str:
+    rel_id = _workbook_sheets(archive)[sheet].get(f'{_REL_NS}id')
+    for rel in ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels')):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    raise ValueError(f"В книге не найден лист №{sheet + 1}")
+
+
+def sheet_names(path: Path) -> List[str]:
+    """Названия листов книги по порядку, без чтения самих листов."""
+    try:
+        if Path(path).suffix.lower() == '.xls':
+            import xlrd
+            book = xlrd.open_workbook(str(path), on_demand=True)
+            try:
+                return book.sheet_names()
+            finally:
+                book.release_resources()  # Иначе файл остается открытым (и заблокированным в Windows)
+        with zipfile.ZipFile(path) as archive:
+            return [sheet.get('name') for sheet in _workbook_sheets(archive)]
+    except Exception as e:
+        raise ValueError(f"Не удалось прочитать файл Excel: {e}")
+
+
+def _rich_text(element) -> str:
+    """Текст строки из sharedStrings или inlineStr: простой <t> или части <r><t> (без фонетики <rPh>)."""
+    parts = []
+    for child in element:
+        if child.tag == f'{_XML_NS}t':
+            parts.append(child.text or '')
+        elif child.tag == f'{_XML_NS}r':
+            parts.extend(t.text or '' for t in child.iter(f'{_XML_NS}t'))
+    return ''.join(parts)
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_strings(path: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """
+    Общие строки книги. Разбираются один раз на файл (ключ - путь, время
+    изменения и размер): просмотр заголовков всех листов и их разбор не
+    читают sharedStrings заново для каждого листа.
+    """
+    with zipfile.ZipFile(path) as archive:
+        if 'xl/sharedStrings.xml' not in archive.namelist():
+            return ()
+        shared = []
+        with archive.open('xl/sharedStrings.xml') as f:
+            for _, element in ElementTree.iterparse(f):
+                if element.tag == f'{_XML_NS}si':
+                    shared.append(_rich_text(element))
+                    element.clear()
+        return tuple(shared)
+
+
+@register_reader("xml_stream", ('.xlsx', '.xlsm'))
+def read_xml_stream(path: Path, sheet: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+    """
+    Разбор XML листа прямо из zip-архива через iterparse, без объектной
+    модели openpyxl. Числовые ячейки с форматом даты остаются числами.
+    """
+    stat = os.stat(path)
+    shared = _shared_strings(str(path), stat.st_mtime_ns, stat.st_size)
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(_sheet_path(archive, sheet)) as f:
+            expected_row = 1
+            cells: Dict[int, Optional[str]] = {}
+            column = 0
+            for _, element in ElementTree.iterparse(f):
+                tag = element.tag
+                if tag == f'{_XML_NS}c':
+                    ref = element.get('r')
+                    column = _column_index(ref) if ref else column
+                    kind = element.get('t', 'n')
+                    if kind == 'inlineStr':
+                        inline = element.find(f'{_XML_NS}is')
+                        value = _rich_text(inline) if inline is not None else None
+                    else:
+                        raw = element.findtext(f'{_XML_NS}v')
+                        if raw is None:
+                            value = None
+                        elif kind == 's':
+                            value = shared[int(raw)]
+                        elif kind == 'b':
+                            value = str(raw == '1')
+                        elif kind in ('str', 'e'):
+                            value = raw
+                        elif '.' in raw or 'E' in raw or 'e' in raw:
+                            value = float(raw)
+                        else:
+                            value = int(raw)
+                    cells[column] = _cell_text(value)
+                    column += 1
+                elif tag == f'{_XML_NS}row':
+                    row_number = int(element.get('r') or expected_row)
+                    for _ in range(expected_row, row_number):
+                        yield ()  # Пропущенные в XML пустые строки
+                    width = max(cells, default=-1) + 1
+                    yield tuple(cells.get(i) for i in range(width))
+                    expected_row = row_number + 1
+                    cells = {}
+                    column = 0
+                    element.clear()
+
+
+@register_reader("openpyxl_readonly", ('.xlsx', '.xlsm'), requires=('openpyxl',))
+def read_openpyxl_readonly(path: Path, sheet: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for values in wb.worksheets[sheet].iter_rows(values_only=True):
+            yield tuple(_cell_text(value) for value in values)
+    finally:
+        wb.close()
+
+
+@register_reader("pandas", ('.xlsx', '.xlsm', '.xls'), requires=('pandas', 'openpyxl', 'xlrd'))
+def read_pandas(path: Path, sheet: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+    """Лист целиком через pd.read_excel; единственный способ для .xls."""
+    engine = 'xlrd' if path.suffix.lower() == '.xls' else 'openpyxl'
+    df = pd.read_excel(path, sheet_name=sheet, header=None, dtype=object, engine=engine)
+    for values in df.itertuples(index=False, name=None):
+        yield tuple(_cell_text(value) for value in values)
+
+
+def select_readers(path: Path, name: Optional[str] = None) -> List[ReaderBackend]:
+    """Способы чтения файла в порядке попыток: выбранный явно или все доступные по скорости."""
+    suffix = Path(path).suffix.lower()
+    if name:
+        if name not in READERS:
+            raise ValueError(f"Неизвестный способ чтения: {name}. Доступны: {', '.join(READERS)}")
+        if suffix not in READERS[name].suffixes:
+            raise ValueError(f"Способ чтения {name} не поддерживает файлы {suffix}")
+        return [READERS[name]]
+    backends = [backend for backend in READERS.values() if suffix in backend.suffixes and backend.available()]
+    if not backends:
+        raise ValueError(f"Нет способа чтения для файлов {suffix or 'без расширения'}")
+    return backends
+
+
+def read_rows(path: Path, name: Optional[str] = None, sheet: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+    """
+    Поток строк листа. Если выбранный автоматически способ не смог
+    начать чтение (например, нестандартная книга), пробуется следующий.
+    Ошибки чтения превращаются в ValueError.
+    """
+    backends = select_readers(path, name)
+    for n, backend in enumerate(backends):
+        rows = backend.read(Path(path), sheet)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return
+        except Exception as e:
+            if n + 1 < len(backends):
+                continue
+            raise ValueError(f"Не удалось прочитать файл Excel: {e}")
+        break
+
+    try:
+        yield first
+        yield from rows
+    except (OSError, zipfile.BadZipFile, ElementTree.ParseError, KeyError) as e:
+        raise ValueError(f"Не удалось прочитать файл Excel: {e}")
+    finally:
+        rows.close()
+
+
+class LoadCancelled(Exception):
+    """Загрузка файла отменена пользователем."""
+
+
+def _expand_scientific(value: str) -> str:
+    try:
+        return format(Decimal(value), 'f')
+    except InvalidOperation:
+        return value
+
+
+def normalize_barcodes(values: pd.Series) -> pd.Series:
+    """
+    Приводит колонку штрихкодов к строкам цифр одной операцией над колонкой:
+    убирает пробелы и точки в начале, хвост ".0" от чисел с плавающей точкой
+    и раскрывает запись вида 4.60123456789E+12. Пустые значения - "".
+    """
+    text = values.fillna('').astype(str).str.replace(r'\s+', '', regex=True).str.lstrip('.')
+    scientific = text.str.match(SCIENTIFIC_NUMBER)
+    if scientific.any():
+        # Decimal, а не float: длинные коды не теряют последние цифры
+        text[scientific] = text[scientific].map(_expand_scientific)
+    return text.str.replace(r'^([0-9]+)\.0*$', r'\1', regex=True)
+
+
+def barcode_problems(barcodes: pd.Series) -> pd.Series:
+    """
+    Проверка нормализованных штрихкодов: для каждого - пустая строка, если код
+    корректен (или отсутствует), иначе причина. Контрольная цифра EAN-8,
+    UPC-A и EAN-13 считается матрично для всех кодов одной длины сразу.
+    """
+    problems = pd.Series('', index=barcodes.index, dtype=object)
+    lengths = barcodes.str.len()
+    digits = barcodes.str.fullmatch(r'[0-9]+').fillna(False).astype(bool)
+    problems[(lengths > 0) & ~digits] = "недопустимые символы"
+    unknown = digits & ~lengths.isin(list(BARCODE_LENGTHS))
+    problems[unknown] = "неизвестная длина (" + lengths[unknown].astype(str) + " цифр)"
+
+    for length in BARCODE_LENGTHS:
+        mask = (digits & (lengths == length)).to_numpy()
+        if not mask.any():
+            continue
+        codes = np.frombuffer(''.join(barcodes[mask]).encode('ascii'), dtype=np.uint8).reshape(-1, length) - ord('0')
+        # Веса 3 и 1 по очереди, начиная с цифры перед контрольной
+        weights = np.where((length - 2 - np.arange(length - 1)) % 2 == 0, 3, 1)
+        check = (10 - (codes[:, :-1] @ weights) % 10) % 10
+        bad = check != codes[:, -1]
+        problems[barcodes.index[mask][bad]] = "неверная контрольная цифра"
+    return problems
+
+
+class LoadReport:
+    """
+    Итог разбора файла: пропущенные строки, неверные и повторяющиеся штрихкоды.
+    Место в файле - текст вида "строка 12" или "лист «Склад 2», строка 12".
+    """
+
+    def __init__(self):
+        self.row_errors: List[str] = []
+        self.invalid_barcodes: List[Tuple[str, str, str]] = []  # (место, значение в файле, причина)
+        self._codes: List[str] = []  # Корректные штрихкоды и их места - для поиска повторов
+        self._code_places: List[str] = []
+
+    def add_barcodes(self, places: List[str], raw: pd.Series, barcodes: pd.Series, problems: pd.Series):
+        invalid = (problems != '').to_numpy()
+        places = np.asarray(places, dtype=object)
+        self.invalid_barcodes.extend(zip(places[invalid].tolist(), raw[invalid].tolist(), problems[invalid].tolist()))
+        valid = ~invalid & (barcodes != '').to_numpy()
+        self._codes.extend(barcodes[valid].tolist())
+        self._code_places.extend(places[valid].tolist())
+
+    def extend(self, other: "LoadReport"):
+        """Добавляет отчет по другому листу той же книги."""
+        self.row_errors.extend(other.row_errors)
+        self.invalid_barcodes.extend(other.invalid_barcodes)
+        self._codes.extend(other._codes)
+        self._code_places.extend(other._code_places)
+
+    def duplicate_barcodes(self) -> Dict[str, List[str]]:
+        """Штрихкод -> места, если он встречается в файле больше одного раза."""
+        places = pd.Series(self._code_places, index=self._codes, dtype=object)
+        repeated = places[places.index.duplicated(keep=False)]
+        return {code: list(group) for code, group in repeated.groupby(level=0, sort=False)}
+
+    def has_issues(self) -> bool:
+        return bool(self.row_errors or self.invalid_barcodes or self.duplicate_barcodes())
+
+    def summary(self) -> str:
+        return (f"Пропущено строк: {len(self.row_errors)}, неверных штрихкодов: {len(self.invalid_barcodes)}, "
+                f"повторяющихся штрихкодов: {len(self.duplicate_barcodes())}")
+
+    def lines(self) -> List[str]:
+        lines = list(self.row_errors)
+        lines += [f"{_capital(place)}: штрихкод «{raw}» - {reason}" for place, raw, reason in self.invalid_barcodes]
+        lines += [f"Штрихкод {code} повторяется: {'; '.join(places)}"
+                  for code, places in self.duplicate_barcodes().items()]
+        return lines
+
+
+def _capital(text: str) -> str:
+    return text[:1].upper() + text[1:]
+
+
+class MissingColumnsError(ValueError):
+    """На листе нет обязательных колонок."""
+
+
+def _parse_sheet(file_path: str, reader: Optional[str], sheet: int, name: str,
+                 labelled: bool) -> Tuple[str, Optional[List[Dict[str, Any]]], LoadReport, str]:
+    """
+    Заголовок и разбор одного листа в отдельном процессе (см.
+    ExcelProcessor._parse_sheets_parallel). Возвращает текст первой строки,
+    позиции (None - лист без обязательных колонок, тогда вместо них текст
+    ошибки), отчет загрузки.
+    """
+    processor = ExcelProcessor(file_path, reader=reader)
+    processor.shipment_info = ""  # Заголовок отгрузки выбирает основной процесс по текстам всех листов
+    try:
+        orders = [order for batch in processor._iter_batches([(sheet, name)], PROGRESS_EVERY, labelled) for order in batch]
+    except MissingColumnsError as e:
+        return processor._header_text, None, processor.report, str(e)
+    return processor._header_text, orders, processor.report, ""
+
 
 class ExcelProcessor:
     """Класс для чтения и обработки исходного Excel-файла."""
 
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, cancel_event: Optional[threading.Event] = None,
+                 progress: Optional[Callable[[str], None]] = None, reader: Optional[str] = None):
         self.file_path = Path(file_path)
-        self.df: Optional[pd.DataFrame] = None
+        # Способ чтения из READERS; None - самый быстрый доступный (или из READER_ENV)
+        self.reader = reader or os.environ.get(READER_ENV) or None
+        # Для загрузки в фоне: флаг отмены и функция, получающая текст этапа
+        self.cancel_event = cancel_event
+        self.progress = progress
+        self.shipment_info: Optional[str] = None  # Заполняется при постепенной загрузке
+        self._sheet = ""  # Лист, который сейчас разбирается, и его подпись в отчете загрузки
+        self._sheet_label: Optional[str] = None
+        self._header_text = ""  # Первая строка последнего открытого листа
+        self.report = LoadReport()  # Пропущенные строки и замечания к штрихкодам
 
+    def _check_cancel(self, stage: Optional[str] = None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise LoadCancelled()
+        if stage and self.progress is not None:
+            self.progress(stage)
+
+    @profiled()
     def process_file(self) -> Tuple[List[Dict[str, Any]], str]:
         """
         Основной метод, который загружает и парсит файл.
         Возвращает кортеж из списка товаров и информации об отгрузке.
         """
-        self._load_dataframe()
-        shipment_info = self._extract_shipment_details()
-        orders = self._parse_orders()
-        
-        # Преобразуем информацию об отгрузке в строку для совместимости с GUI
-        shipment_info_str = f"Отгрузка №{shipment_info['number']} от {shipment_info['date']}"
-        
-        return orders, shipment_info_str
+        self._check_cancel("Чтение файла...")
+        names = sheet_names(self.file_path)
+        if len(names) > 1 and (os.cpu_count() or 1) > 1 and self.file_path.stat().st_size >= PARALLEL_MIN_BYTES:
+            orders = self._parse_sheets_parallel(list(enumerate(names)))
+        else:
+            sheets = self._data_sheets(names)
+            orders = []
+            for batch in self._iter_batches(sheets, PROGRESS_EVERY, len(sheets) > 1):
+                orders.extend(batch)
+                self._check_cancel(f"Разобрано позиций: {len(orders)}")
+        if not orders:
+            raise ValueError("Не найдено валидных позиций для сборки.")
+        return orders, self.shipment_info
 
-    def _load_dataframe(self):
-        """Загружает данные из Excel-файла в DataFrame."""
-        if self.df is None:
+    def _data_sheets(self, names: Optional[List[str]] = None) -> List[Tuple[int, str]]:
+        """
+        Листы с позициями: (номер, название). Книга из одного листа заранее не
+        просматривается. В многолистовой книге берутся листы с обязательными
+        колонками, а заголовок отгрузки - с первого листа, где он есть.
+        """
+        if names is None:
+            self._check_cancel("Чтение файла...")
+            names = sheet_names(self.file_path)
+        if len(names) <= 1:
+            return [(0, names[0] if names else "")]
+
+        found = []
+        header_text = None
+        first_columns = None
+        for index, name in enumerate(names):
+            rows = read_rows(self.file_path, self.reader, index)
             try:
-                # Определяем формат файла по расширению
-                file_ext = self.file_path.suffix.lower()
-                engine = 'xlrd' if file_ext == '.xls' else 'openpyxl'
-                
-                self.df = pd.read_excel(
-                    self.file_path,
-                    header=4, # Строка 5 (индекс 4)
-                    dtype=str,
-                    engine=engine
-                )
-            except Exception as e:
-                raise ValueError(f"Не удалось прочитать файл Excel: {e}")
-
-    def _extract_shipment_details(self) -> dict:
-        """Извлекает номер и дату отгрузки из первой строки."""
-        # Читаем первую строку отдельно, так как основной df теперь с header=3
+                text, columns = self._read_header(rows)
+            finally:
+                rows.close()
+            if header_text is None and SHIPMENT_PATTERN.search(text):
+                header_text = text
+            if REQUIRED_COLUMNS <= set(columns):
+                found.append((index, name))
+            elif first_columns is None:
+                first_columns = columns
+        if not found:
+            self._check_columns(first_columns)
+        self.shipment_info = self._format_shipment_info(self._parse_shipment_text(header_text or ""))
+        return found
+
+    def _parse_sheets_parallel(self, sheets: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+        """
+        Листы разбираются одновременно в пуле процессов, так что время
+        определяется самым большим листом. Заголовки листов тоже читаются в
+        процессах пула: листы без обязательных колонок возвращаются пустыми,
+        а заголовок отгрузки берется с первого листа, где он есть. Позиции
+        идут в порядке листов. Если процессы недоступны (например, на
+        Android), листы читаются по очереди.
+        """
         try:
-            # Определяем формат файла по расширению
-            file_ext = self.file_path.suffix.lower()
-            engine = 'xlrd' if file_ext == '.xls' else 'openpyxl'
-            
-            temp_df = pd.read_excel(
-                self.file_path,
-                header=None,
-                nrows=1,
-                dtype=str,
-                engine=engine
-            )
-        except Exception:
-             return {
-                "number": f"SHIP_{datetime.now().strftime('%Y%m%d_%H%M')}",
-                "date": datetime.now().strftime('%d-%m-%Y')
-            }
-
-        if temp_df.empty:
-             return {
-                "number": f"SHIP_{datetime.now().strftime('%Y%m%d_%H%M')}",
-                "date": datetime.now().strftime('%d-%m-%Y')
-            }
-
-        first_row_text = " ".join(str(cell) for cell in temp_df.iloc[0, :].dropna())
-        pattern = re.compile(r'№\s*([\w.-]+)\s+от\s+([\d.]+)')
-        match = pattern.search(first_row_text)
+            pool = ProcessPoolExecutor(max_workers=min(len(sheets), os.cpu_count() or 1))
+            futures = [pool.submit(_parse_sheet, str(self.file_path), self.reader, index, name, True)
+                       for index, name in sheets]
+        except (OSError, ImportError, NotImplementedError):
+            orders = []
+            for batch in self._iter_batches(self._data_sheets([name for _, name in sheets]), PROGRESS_EVERY, True):
+                orders.extend(batch)
+            return orders
+
+        try:
+            pending = set(futures)
+            while pending:
+                self._check_cancel(f"Разобрано листов: {len(futures) - len(pending)} из {len(futures)}")
+                _, pending = wait(pending, timeout=0.2)
+            orders = []
+            header_text = None
+            errors = []
+            for future in futures:
+                text, sheet_orders, report, error = future.result()
+                if header_text is None and SHIPMENT_PATTERN.search(text):
+                    header_text = text
+                if sheet_orders is None:
+                    errors.append(error)
+                    continue
+                orders.extend(sheet_orders)
+                self.report.extend(report)
+            if len(errors) == len(futures):
+                raise MissingColumnsError(errors[0])
+            self.shipment_info = self._format_shipment_info(self._parse_shipment_text(header_text or ""))
+            return orders
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _parse_shipment_text(first_row_text: str) -> dict:
+        """Номер и дата отгрузки из текста первой строки; если их нет - по текущему времени."""
+        match = SHIPMENT_PATTERN.search(first_row_text)
         
         if match:
             shipment_number = match.group(1)
@@ -92,55 +518,135 @@ class ExcelProcessor:
             "date": datetime.now().strftime('%d-%m-%Y')
         }
 
-    def _parse_orders(self) -> List[Dict[str, Any]]:
-        """Преобразует DataFrame в список товаров для сборки."""
-        if self.df is None:
-            raise ValueError("DataFrame не загружен.")
-        
-        # Очищаем названия колонок от пробелов
-        self.df.columns = self.df.columns.astype(str).str.strip()
+    @staticmethod
+    def _format_shipment_info(shipment_info: dict) -> str:
+        return f"Отгрузка №{shipment_info['number']} от {shipment_info['date']}"
 
-        required = {"Наименование товара", "Количество", "Артикул"}
-        # "Ячейка" и "Штрихкод" могут называться по-разному или отсутствовать в явном виде,
-        # но мы ожидаем их наличие согласно ТЗ. Добавим проверку.
-        
-        if not required.issubset(set(self.df.columns)):
-            missing = required - set(self.df.columns)
-            raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing)}")
+    @staticmethod
+    def _check_columns(columns):
+        missing = REQUIRED_COLUMNS - set(columns)
+        if missing:
+            raise MissingColumnsError(f"Отсутствуют обязательные колонки: {', '.join(missing)}")
+
+    def _place(self, row_number: int) -> str:
+        if self._sheet_label:
+            return f"лист «{self._sheet_label}», строка {row_number}"
+        return f"строка {row_number}"
+
+    def _parse_row(self, row: Dict[str, Any], row_number: int) -> Optional[Dict[str, Any]]:
+        """
+        Одна строка таблицы (колонка -> текст или None) в позицию сборки.
+        Пустые строки и нулевое количество пропускаются молча, некорректные
+        данные - с записью в отчет загрузки.
+        """
+        name = row.get("Наименование товара")
+        if name is None or not str(name).strip():
+            return None
+
+        try:
+            quantity = int(float(row["Количество"]))
+        except (ValueError, KeyError, TypeError):
+            self.report.row_errors.append(
+                f"{_capital(self._place(row_number))}: некорректное количество «{row.get('Количество')}»"
+            )
+            return None
+        if quantity <= 0:
+            return None
+
+        location = str(row.get("Ячейка") or "").strip()
+        barcode = str(row.get("Штрихкод") or "").strip()
+
+        return {
+            "name": str(name).strip(),
+            "quantity": quantity,
+            "article": str(row.get("Артикул") or "").strip() or "?",
+            "location": location,
+            "barcode": barcode,
+            "sheet": self._sheet
+        }
+
+    def _check_barcodes(self, orders: List[Dict[str, Any]], row_numbers: List[int]):
+        """Нормализует штрихкоды позиций и заносит неверные и повторы в отчет загрузки."""
+        raw = pd.Series([order['barcode'] for order in orders], dtype=object)
+        barcodes = normalize_barcodes(raw)
+        self.report.add_barcodes([self._place(n) for n in row_numbers], raw, barcodes, barcode_problems(barcodes))
+        for order, barcode in zip(orders, barcodes.tolist()):
+            order['barcode'] = barcode
+
+    @staticmethod
+    def _read_header(rows: Iterator[Tuple[Optional[str], ...]]) -> Tuple[str, List[str]]:
+        """Текст первой строки и названия колонок из строки HEADER_ROW + 1."""
+        first_row = next(rows, ())
+        for _ in range(HEADER_ROW - 1):
+            next(rows, None)
+        header = next(rows, None) or ()
+        columns = [c.strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        return " ".join(v for v in first_row if v is not None), columns
+
+    def _sheet_rows(self, sheet: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Строки листа по мере чтения файла выбранным способом (см. READERS).
+        Возвращает пары (номер строки в Excel, колонка -> текст).
+        """
+        rows = read_rows(self.file_path, self.reader, sheet)
+        try:
+            text, columns = self._read_header(rows)
+            self._header_text = text
+            if self.shipment_info is None:
+                self.shipment_info = self._format_shipment_info(self._parse_shipment_text(text))
+            self._check_columns(columns)
+
+            for n, values in enumerate(rows):
+                yield HEADER_ROW + 2 + n, dict(zip(columns, values))
+        finally:
+            rows.close()
 
-        orders = []
-        for _, row in self.df.iterrows():
+    def _iter_batches(self, sheets: List[Tuple[int, str]], batch_size: int,
+                      labelled: bool) -> Iterator[List[Dict[str, Any]]]:
+        """Позиции листов по очереди, партиями; labelled - указывать лист в отчете загрузки."""
+        found = 0
+        for sheet, name in sheets:
+            self._sheet = name
+            self._sheet_label = name if labelled else None
+            rows = self._sheet_rows(sheet)
+            batch = []
+            batch_rows = []
             try:
-                # Пропускаем пустые строки или строки без наименования
-                if pd.isna(row["Наименование товара"]) or not str(row["Наименование товара"]).strip():
-                    continue
+                for row_number, row in rows:
+                    order = self._parse_row(row, row_number)
+                    if order is None:
+                        continue
+                    batch.append(order)
+                    batch_rows.append(row_number)
+                    if len(batch) >= batch_size:
+                        found += len(batch)
+                        self._check_barcodes(batch, batch_rows)
+                        yield batch
+                        batch, batch_rows = [], []
+                        self._check_cancel(f"Прочитано позиций: {found}")
+            finally:
+                rows.close()
 
-                quantity = int(float(row["Количество"]))
-                if quantity <= 0:
-                    continue
-                
-                # Извлекаем новые поля
-                location = str(row.get("Ячейка", "")).strip()
-                if location == "nan": location = ""
-                
-                barcode = str(row.get("Штрихкод", "")).strip()
-                if barcode == "nan": barcode = ""
-
-                orders.append({
-                    "name": str(row["Наименование товара"]).strip(),
-                    "quantity": quantity,
-                    "article": str(row["Артикул"]).strip() or "?",
-                    "location": location,
-                    "barcode": barcode
-                })
-            except (ValueError, KeyError, TypeError):
-                # Пропускаем строки с некорректными данными
-                continue
-        
-        if not orders:
-            raise ValueError("Не найдено валидных позиций для сборки.")
+            if batch:
+                found += len(batch)
+                self._check_barcodes(batch, batch_rows)
+                yield batch
 
-        return orders
+    def iter_order_batches(self, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Постепенная загрузка: отдает позиции партиями по мере чтения файла,
+        чтобы сборку можно было начать до конца разбора. shipment_info
+        заполняется до первой партии. Листы многолистовой книги читаются по
+        очереди. Ошибки в строках и штрихкодах копятся в report и не
+        прерывают загрузку.
+        """
+        sheets = self._data_sheets()
+        found = 0
+        for batch in self._iter_batches(sheets, batch_size, len(sheets) > 1):
+            found += len(batch)
+            yield batch
+        if not found:
+            raise ValueError("Не найдено валидных позиций для сборки.")
 
 
 class ExcelWriter:
@@ -153,6 +659,7 @@ class ExcelWriter:
         self.original_file_path = Path(original_file_path)
         self.output_directory = Path(output_directory) if output_directory else self.original_file_path.parent
 
+    @profiled()
     def generate_final_file(self) -> str:
         """
         Создает итоговый Excel-файл и возвращает его имя.
@@ -223,4 +730,109 @@ class ExcelWriter:
         except PermissionError as e:
             raise ValueError(f"Нет доступа к папке: {self.output_directory}")
         except Exception as e:
-            raise ValueError(f"Ошибка сохранения файла: {e}")
\ No newline at end of file
+            raise ValueError(f"Ошибка сохранения файла: {e}")
+
+
+def shipment_number(shipment_info: str) -> str:
+    """Номер отгрузки из строки «Отгрузка №N от ...» (см. _parse_shipment_text)."""
+    match = SHIPMENT_PATTERN.search(shipment_info or "")
+    return match.group(1) if match else (shipment_info or "")
+
+
+def _zpl_text(text: str) -> str:
+    return str(text).replace("^", " ").replace("~", " ")  # Управляющие символы ZPL
+
+
+class LabelWriter:
+    """
+    Этикетки коробок для термопринтера: ZPL (Zebra и совместимые) или
+    простой текст. Каждая этикетка записывается и сбрасывается в поток
+    сразу, поэтому принтер или файл получают ее, как только коробка закрыта.
+    """
+
+    def __init__(self, shipment_info: str, stream, label_format: str = "zpl"):
+        if label_format not in LABEL_FORMATS:
+            raise ValueError(f"Неизвестный формат этикеток: {label_format}")
+        self.shipment_info = shipment_info
+        self.number = shipment_number(shipment_info)
+        self.stream = stream  # Двоичный поток: файл или makefile() сокета
+        self.label_format = label_format
+        self.connection: Optional[socket.socket] = None
+        self.lock = threading.Lock()
+        self.written = 0
+
+    @classmethod
+    def open(cls, target: str, shipment_info: str, label_format: Optional[str] = None) -> "LabelWriter":
+        """
+        target - путь к файлу (этикетки дописываются в конец) или host:port
+        (сырой порт принтера, обычно 9100). Формат по умолчанию - ZPL,
+        для файлов .txt - текст.
+        """
+        if label_format is None:
+            label_format = "text" if Path(target).suffix.lower() == ".txt" else "zpl"
+        host, sep, port = target.rpartition(":")
+        if sep and host and port.isdigit():
+            try:
+                connection = socket.create_connection((host, int(port)), timeout=5)
+            except OSError as e:
+                raise ValueError(f"Нет связи с принтером {target}: {e}")
+            writer = cls(shipment_info, connection.makefile("wb"), label_format)
+            writer.connection = connection
+            return writer
+        return cls(shipment_info, open(target, "ab"), label_format)
+
+    def box_id(self, box: int) -> str:
+        return f"{self.number}-{box:03d}"
+
+    def render(self, box: int, records: List[Dict]) -> str:
+        lines = len(records)
+        units = sum(record['quantity'] for record in records)
+        if self.label_format == "text":
+            return (f"{self.shipment_info}\nКОРОБКА №{box}\nСтрок: {lines}   Шт.: {units}\n"
+                    f"Штрихкод: {self.box_id(box)}\n\f")
+        # 4x3 дюйма при 203 dpi; ^CI28 - текст в UTF-8
+        return (
+            "^XA^CI28^PW812^LL609\n"
+            f"^FO40,40^A0N,36,36^FD{_zpl_text(self.shipment_info)}^FS\n"
+            f"^FO40,100^A0N,90,90^FDКОРОБКА №{box}^FS\n"
+            f"^FO40,220^A0N,40,40^FDСтрок: {lines}   Шт.: {units}^FS\n"
+            f"^FO40,300^BY3^BCN,160,Y,N,N^FD{_zpl_text(self.box_id(box))}^FS\n"
+            "^XZ\n"
+        )
+
+    def write_box(self, box: int, records: List[Dict]) -> str:
+        """Этикетка одной коробки; records - строки коробки в формате ExcelWriter."""
+        label = self.render(box, records)
+        with self.lock:
+            self.stream.write(label.encode("utf-8"))
+            self.stream.flush()
+            self.written += 1
+        return label
+
+    def write_all(self, collected_data: List[Dict]) -> int:
+        """Этикетки всех коробок collected_data по возрастанию номера, как листы ExcelWriter."""
+        boxes = defaultdict(list)
+        for record in collected_data:
+            boxes[record['box']].append(record)
+        for box_num in sorted(boxes):
+            self.write_box(box_num, boxes[box_num])
+        return len(boxes)
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+
+
+def print_box_label(shipment_info: str, box: int, records: List[Dict], target: Optional[str] = None) -> Optional[str]:
+    """Этикетка закрытой коробки в LABELS_ENV (или target); без настройки и для пустой коробки ничего не делает."""
+    target = target or os.environ.get(LABELS_ENV)
+    if not target or not records:
+        return None
+    writer = LabelWriter.open(target, shipment_info)
+    try:
+        return writer.write_box(box, records)
+    finally:
+        writer.close()
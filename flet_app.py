@@ -1,14 +1,44 @@
+import time
+_process_started = time.perf_counter()  # Reference point for the startup profiler, taken before any heavy import
 
 import flet as ft
-from excel_processor import ExcelProcessor, ExcelWriter
+from assembly_state import (AssemblyIndex, cell_group, collect_positions, collected_records, discrepancy_notes,
+                            project_item, search_items, skip_uncollected, undo_change, write_result)
+from ui_metrics import StartupTimeline, UIUpdateRecorder, count_controls
+from telemetry import PickTelemetry, session_log_path
+import profiling
+from profiling import profiled
+from wave_picking import Wave
+from scan_input import ScanPipeline
+from session_merge import SessionClock, merge_sessions, reimport_manifest
 import pickle
 from pathlib import Path
 import os
 import json
+import threading
+import asyncio
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Opt-in startup timeline (OFFLINE_ASSEMBLER_STARTUP_PROFILE=1)
+startup_timeline = StartupTimeline.from_env(_process_started)
+if startup_timeline is not None:
+    startup_timeline.mark("flet_app imports")
+
+
+def excel_module():
+    """Import excel_processor (pandas, openpyxl, xlrd) on first use instead of at startup"""
+    import excel_processor
+    return excel_processor
+
 
 class AssemblyApp:
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, ui_recorder: UIUpdateRecorder = None):
+        self.startup = startup_timeline
+        self.mark_startup("AssemblyApp created")
         self.page = page
+        # Opt-in timing of every UI update (OFFLINE_ASSEMBLER_UI_STATS=1)
+        self.ui_recorder = ui_recorder or UIUpdateRecorder.from_env()
         self.page.title = "Offline Assembler"
         self.page.theme_mode = ft.ThemeMode.DARK
         self.page.padding = 0
@@ -28,31 +58,114 @@ class AssemblyApp:
         
         # --- State ---
         self.assembly_items = []
+        self.assembly_index = AssemblyIndex(self.assembly_items)  # Line ids, review filters and search
+        self.return_index = None  # Where picking resumes after an item reached through search
+        self.current_group = []  # Pending items in the current cell, offered as one pick
+        self.last_change = None  # Whole-cell pick that the snack bar can still undo
         self.current_item_index = 0
         self.current_box = 1
         self.shipment_info = ""
         self.input_file_path = ""
         self.output_directory = ""  # Will be set by user selection
         self.output_file_path = ""  # Store the final output file path for sharing
+        self.telemetry = None  # Pick log of the current shipment
+        self.wave = None  # Several manifests picked in one walk; None for a single file
+        self.put_index = 0  # Current put-wall task of the wave
+        self.session_clock = None  # Lamport clock stamping item changes for multi-device merge
+        
+        # --- Background work ---
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="assembler-io")  # Disk and parse work
+        self.label_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assembler-labels")  # Box labels in order
+        self.busy_dialog = None  # Modal progress dialog, built on first use
+        self.busy_cancel = None  # Cancel flag of the running operation
+        self.manifest_loading = None  # Cancel flag of the background batch reader while a manifest is still loading
+        self.load_errors = []  # Load report of the last manifest: skipped rows, bad and repeated barcodes
+        self.assembly_view = None  # Root column of the assembly screen
+        self.LOAD_BATCH_SIZE = 500  # Items parsed before the assembly screen can start
         self.AUTOSAVE_KEY = "offline_assembler_autosave"  # Key for client_storage
+        self.AUTOSAVE_SUMMARY_KEY = "offline_assembler_autosave_summary"  # Small header read at startup
+        self.PROFILING_KEY = "offline_assembler_profiling"  # Settings toggle for profiling spans
+
+        # --- Review list ---
+        self.REVIEW_ROW_HEIGHT = 50
+        self.REVIEW_CHUNK_SIZE = 60  # Rows materialized per scroll step
+        self.REVIEW_COLUMN_WIDTHS = [50, 90, 60, 50, 60, 60]
+        self.REVIEW_STATUS_LABELS = {
+            'pending': 'В ожидании',
+            'collected': 'Собрано',
+            'skipped': 'Пропущено',
+            'quantity_changed': 'Кол-во изменено',
+        }
+        self.review_indices = []
+        self.review_rows = {}  # item index -> row control
+        self.review_filter = {"status": None, "box": None, "location": "", "text": ""}
+
+        # One reusable snack bar, updated on its own instead of the whole page
+        self.snack = ft.SnackBar(ft.Text(""))
+        self.page.overlay.append(self.snack)
+        
+        # Keyboard-wedge scanner: keys are framed into barcodes on their own thread, picked in order on the UI loop
+        self.scanner = ScanPipeline(self.hand_scan_to_loop)
+        self.scanner.start()
+        self.page.on_keyboard_event = self.on_keyboard
+
+        # --- Startup pipeline ---
+        # 1. Draw the welcome screen (and the resume question) using only the autosave summary
+        self.init_ui()
+        self.mark_startup("first paint")
+        self.offer_autosave_resume()
+        
+        # Profiling toggle saved in settings (the environment variable works without it)
+        try:
+            if self.page.client_storage.get(self.PROFILING_KEY) and not profiling.is_enabled():
+                profiling.enable()
+        except Exception as ex:
+            print(f"Profiling settings error: {ex}")
+        
+        # 2. Register file pickers once something is already on screen
+        self.register_file_pickers()
+        self.mark_startup("file pickers registered")
+        
+        # 3. Load pandas/openpyxl in the background, before the user picks a file
+        threading.Thread(target=self.warm_up_excel, daemon=True).start()
+
+    def mark_startup(self, name):
+        if self.startup is not None:
+            self.startup.mark(name)
 
-        # --- UI Components ---
+    def register_file_pickers(self):
         self.file_picker = ft.FilePicker(on_result=self.on_file_picked)
         self.page.overlay.append(self.file_picker)
         
         self.save_file_picker = ft.FilePicker(on_result=self.on_save_file_picked)
         self.page.overlay.append(self.save_file_picker)
         
+        self.merge_file_picker = ft.FilePicker(on_result=self.on_merge_file_picked)
+        self.page.overlay.append(self.merge_file_picker)
+        
+        self.reimport_file_picker = ft.FilePicker(on_result=self.on_reimport_file_picked)
+        self.page.overlay.append(self.reimport_file_picker)
+        
         self.folder_picker = ft.FilePicker(on_result=self.on_folder_picked)
         self.page.overlay.append(self.folder_picker)
-
-        # Try to load autosave on startup
-        self.try_load_autosave()
         
-        if not self.assembly_items:
-            self.init_ui()
+        self.wave_picker = ft.FilePicker(on_result=self.on_wave_files_picked)
+        self.page.overlay.append(self.wave_picker)
+        
+        # Overlay additions are only sent with a page update; the page is still just the first screen
+        self.page.update()
+
+    def warm_up_excel(self):
+        try:
+            excel_module()
+            self.mark_startup("excel_processor imported (background)")
+        except Exception as ex:
+            print(f"Excel warm-up error: {ex}")  # Will surface again on first use
+        if self.startup is not None:
+            print(self.startup.report())
 
     def init_ui(self):
+        self.stop_manifest_loading()
         self.page.clean()
         
         # Welcome Screen
@@ -86,6 +199,12 @@ class AssemblyApp:
                             shape=ft.RoundedRectangleBorder(radius=10),
                         ),
                         on_click=lambda _: self.file_picker.pick_files(allow_multiple=False, allowed_extensions=["assm-save"])
+                    ),
+                    ft.Container(height=10),
+                    ft.TextButton(
+                        "Волна: несколько отгрузок за один обход",
+                        icon=ft.Icons.MERGE_TYPE,
+                        on_click=lambda _: self.wave_picker.pick_files(allow_multiple=True, allowed_extensions=["xlsx", "xls"])
                     )
                 ],
                 alignment=ft.MainAxisAlignment.CENTER,
@@ -97,7 +216,85 @@ class AssemblyApp:
         
         self.page.add(self.welcome_view)
 
-    def on_file_picked(self, e: ft.FilePickerResultEvent):
+    # --- Background work ---
+
+    async def run_blocking(self, func, *args):
+        """Run blocking disk or parse work in the executor so the event loop keeps serving the UI"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def begin_busy(self, message, cancellable=False):
+        """Show the modal progress dialog; returns the cancel flag that identifies this operation"""
+        if self.busy_dialog is None:
+            self.busy_text = ft.Text("", size=14)
+            self.busy_cancel_btn = ft.TextButton("Отмена", on_click=self.on_cancel_busy)
+            self.busy_dialog = ft.AlertDialog(
+                modal=True,
+                content=ft.Column(
+                    [ft.ProgressRing(), self.busy_text],
+                    tight=True,
+                    horizontal_alignment=ft.CrossAxisAlignment.CENTER
+                ),
+                actions=[self.busy_cancel_btn],
+                actions_alignment=ft.MainAxisAlignment.END,
+            )
+        self.busy_cancel = threading.Event()
+        self.busy_text.value = message
+        self.busy_cancel_btn.visible = cancellable
+        self.page.open(self.busy_dialog)
+        return self.busy_cancel
+
+    def busy_reporter(self):
+        """Progress callback for worker threads; the text is applied on the event loop"""
+        loop = asyncio.get_running_loop()
+        cancel = self.busy_cancel
+        
+        def report(text):
+            loop.call_soon_threadsafe(self.set_busy_text, cancel, text)
+        return report
+
+    def set_busy_text(self, cancel, text):
+        if cancel is self.busy_cancel and not cancel.is_set():
+            self.busy_text.value = text
+            self.refresh('set_busy_text', self.busy_text)
+
+    def end_busy(self, cancel):
+        """Close the progress dialog unless another operation took it over"""
+        if cancel is self.busy_cancel and self.busy_dialog.open:
+            self.page.close(self.busy_dialog)
+
+    def on_cancel_busy(self, e):
+        # The worker stops at its next check; its result is dropped either way
+        self.busy_cancel.set()
+        self.page.close(self.busy_dialog)
+        self.show_snack("Загрузка отменена")
+
+    @staticmethod
+    def open_manifest(filepath, cancel, progress, batch_size):
+        """Start reading a manifest; returns the processor, its batch iterator and the first batch"""
+        processor = excel_module().ExcelProcessor(filepath, cancel_event=cancel, progress=progress)
+        batches = processor.iter_order_batches(batch_size)
+        return processor, batches, next(batches)
+
+    @staticmethod
+    def read_manifest(filepath, cancel, progress):
+        return excel_module().ExcelProcessor(filepath, cancel_event=cancel, progress=progress).process_file()
+
+    @staticmethod
+    def read_wave(filepaths, cancel, progress):
+        processor = functools.partial(excel_module().ExcelProcessor, cancel_event=cancel, progress=progress)
+        return Wave.from_files(filepaths, processor)
+
+    @staticmethod
+    def read_session_file(filepath):
+        with open(filepath, "rb") as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def write_session_file(filepath, session_data):
+        with open(filepath, "wb") as f:
+            pickle.dump(session_data, f)
+
+    async def on_file_picked(self, e: ft.FilePickerResultEvent):
         if not e.files:
             return
         
@@ -109,27 +306,93 @@ class AssemblyApp:
         ext = Path(filepath).suffix
         
         if ext == ".assm-save":
-            self.load_session(filepath)
+            await self.load_session(filepath)
         else:
-            self.load_excel(filepath)
+            await self.load_excel(filepath)
 
-    def load_excel(self, filepath):
+    async def on_wave_files_picked(self, e: ft.FilePickerResultEvent):
+        if not e.files:
+            return
+        
+        filepaths = [f.path for f in e.files]
+        if not all(filepaths):
+            self.show_error("В веб-версии нельзя получить путь к файлу. Используйте Desktop или Android.")
+            return
+        
+        if len(filepaths) == 1:
+            await self.load_excel(filepaths[0])
+        else:
+            await self.load_wave(filepaths)
+
+    async def load_wave(self, filepaths):
+        """Merge several manifests into one pick list ordered by cell"""
+        self.stop_manifest_loading()
+        cancel = self.begin_busy("Чтение файлов волны...", cancellable=True)
         try:
-            processor = ExcelProcessor(filepath)
-            items_to_collect, self.shipment_info = processor.process_file()
+            wave = await self.run_blocking(self.read_wave, filepaths, cancel, self.busy_reporter())
+        except Exception as ex:
+            if not cancel.is_set():
+                self.end_busy(cancel)
+                self.show_error(f"Ошибка чтения файла: {ex}")
+            return
+        if cancel.is_set():
+            return  # Cancelled while the last file was finishing
+        self.end_busy(cancel)
+        
+        try:
+            self.wave = wave
+            self.assembly_items = self.wave.pick_items
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.return_index = None
             
-            self.assembly_items = [
-                {
-                    **item,
-                    'status': 'pending',
-                    'collected_quantity': 0,
-                    'box': 0
-                } for item in items_to_collect
-            ]
+            self.shipment_info = self.wave.shipment_info
+            self.input_file_path = filepaths[0]
+            self.current_item_index = 0
+            self.current_box = 1
+            self.put_index = 0
+            self.start_session_clock()
+            self.open_telemetry(fresh=True)
+            
+            self.show_folder_selection_dialog()
+            
+        except Exception as ex:
+            self.wave = None
+            self.show_error(f"Ошибка чтения файла: {ex}")
+
+    async def load_excel(self, filepath):
+        """Start picking after the first batch of the manifest; the rest is appended in the background"""
+        self.stop_manifest_loading()
+        cancel = self.begin_busy("Чтение файла...", cancellable=True)
+        try:
+            processor, batches, first_batch = await self.run_blocking(
+                self.open_manifest, filepath, cancel, self.busy_reporter(), self.LOAD_BATCH_SIZE
+            )
+        except Exception as ex:
+            if not cancel.is_set():
+                self.end_busy(cancel)
+                self.show_error(f"Ошибка чтения файла: {ex}")
+            return
+        if cancel.is_set():
+            return  # Cancelled while parsing was finishing
+        self.end_busy(cancel)
+        
+        try:
+            self.wave = None
+            self.shipment_info = processor.shipment_info
+            self.assembly_items = [self.pending_item(item) for item in first_batch]
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.return_index = None
             
             self.input_file_path = filepath
             self.current_item_index = 0
             self.current_box = 1
+            self.start_session_clock()
+            self.open_telemetry(fresh=True)
+            
+            # The same flag now stops the background reader
+            self.manifest_loading = cancel
+            self.load_errors = []
+            self.page.run_task(self.load_remaining_batches, processor, batches, cancel)
             
             # Show folder selection dialog before starting assembly
             self.show_folder_selection_dialog()
@@ -137,17 +400,120 @@ class AssemblyApp:
         except Exception as ex:
             self.show_error(f"Ошибка чтения файла: {ex}")
 
-    def load_session(self, filepath):
+    @staticmethod
+    def pending_item(item):
+        return {**item, 'status': 'pending', 'collected_quantity': 0, 'box': 0}
+
+    async def load_remaining_batches(self, processor, batches, cancel):
+        """Append the rest of the manifest batch by batch while the picker is already working"""
+        processor.progress = None  # The progress dialog is closed
+        error = None
+        try:
+            while not cancel.is_set():
+                batch = await self.run_blocking(next, batches, None)
+                if batch is None or cancel.is_set():
+                    break
+                self.append_items([self.pending_item(item) for item in batch])
+        except Exception as ex:
+            error = ex
+        finally:
+            await self.run_blocking(batches.close)  # Releases the workbook if reading stopped early
+        if cancel.is_set():
+            return  # Another file or session replaced this one
+        
+        self.manifest_loading = None
+        self.load_errors = processor.report.lines()
+        if self.assembly_screen_shown():
+            self.update_item_display()  # Drops the "still counting" mark, or finishes if the picker was waiting
+        self.autosave_session()
+        
+        total = len(self.assembly_items)
+        if error is not None:
+            self.show_error(f"Чтение файла прервано: {error}. Загружено позиций: {total}")
+        elif self.load_errors:
+            self.show_snack(
+                f"Файл загружен: {total} поз. {processor.report.summary()}",
+                action="Подробнее", on_action=self.show_load_errors
+            )
+        else:
+            self.show_snack(f"Файл загружен: {total} поз.")
+
+    def append_items(self, items):
+        waiting = self.current_item_index >= len(self.assembly_items)  # The picker reached the end of the loaded part
+        self.assembly_index.extend(items)
+        if not self.assembly_screen_shown():
+            return
+        if waiting:
+            self.update_item_display()
+        else:
+            self.progress_text.value = self.progress_label()
+            self.refresh('append_items', self.progress_text)
+
+    def stop_manifest_loading(self):
+        if self.manifest_loading is not None:
+            self.manifest_loading.set()
+            self.manifest_loading = None
+
+    def still_loading(self):
+        """Block actions that need the whole manifest while it is being read"""
+        if self.manifest_loading is None:
+            return False
+        self.show_snack("Файл еще загружается, дождитесь окончания")
+        return True
+
+    def assembly_screen_shown(self):
+        return self.assembly_view is not None and self.assembly_view in self.page.controls
+
+    def progress_label(self):
+        # "…" after the total: the manifest is still being read and the total will grow
+        return f"{self.current_item_index + 1} / {len(self.assembly_items)}{'…' if self.manifest_loading else ''}"
+
+    def show_load_errors(self, e=None):
+        notes = self.load_errors if len(self.load_errors) <= 50 else \
+            self.load_errors[:50] + [f"... и еще {len(self.load_errors) - 50}"]
+        
+        def close_dlg(e):
+            self.page.close(errors_dialog)
+        
+        errors_dialog = ft.AlertDialog(
+            title=ft.Text(f"Замечания к файлу: {len(self.load_errors)}"),
+            content=ft.Column(
+                [ft.Text(note, size=13) for note in notes],
+                tight=True,
+                scroll=ft.ScrollMode.AUTO,
+                height=min(400, 30 * len(notes) + 20)
+            ),
+            actions=[ft.TextButton("OK", on_click=close_dlg)],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(errors_dialog)
+
+    async def load_session(self, filepath):
+        self.stop_manifest_loading()
+        cancel = self.begin_busy("Загрузка сессии...", cancellable=True)
+        try:
+            session_data = await self.run_blocking(self.read_session_file, filepath)
+        except Exception as ex:
+            if not cancel.is_set():
+                self.end_busy(cancel)
+                self.show_error(f"Ошибка загрузки сессии: {ex}")
+            return
+        if cancel.is_set():
+            return
+        self.end_busy(cancel)
+        
         try:
-            with open(filepath, "rb") as f:
-                session_data = pickle.load(f)
-            
             self.assembly_items = session_data["assembly_items"]
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.return_index = None
             self.current_item_index = session_data["current_item_index"]
             self.current_box = session_data["current_box"]
             self.shipment_info = session_data["shipment_info"]
             self.input_file_path = session_data["input_file_path"]
             self.output_directory = session_data.get("output_directory", "")
+            self.restore_wave(session_data)
+            self.start_session_clock(session_data)
+            self.open_telemetry()
             
             # If no output directory, ask for it
             if not self.output_directory:
@@ -159,11 +525,47 @@ class AssemblyApp:
             self.show_error(f"Ошибка загрузки сессии: {ex}")
 
     def start_assembly(self):
+        if self.wave is not None and self.wave.allocated:
+            self.start_put_wall()  # The wave was already picked; resume distributing it
+            return
         self.page.clean()
         self.is_review_mode = False
         self.build_assembly_ui()
+        self.track('start')  # Time spent outside the assembly screen is not pick time
         self.update_item_display()
 
+    def start_session_clock(self, session_data=None):
+        """Clock of a fresh shipment (box 1 is opened here) or of a loaded session"""
+        if session_data is None:
+            self.session_clock = SessionClock.for_session({})
+            self.session_clock.open_box(self.current_box)
+        else:
+            self.session_clock = SessionClock.for_session(session_data)
+
+    def session_data(self):
+        return {
+            "assembly_items": self.assembly_items,
+            "current_item_index": self.current_item_index,
+            "current_box": self.current_box,
+            "shipment_info": self.shipment_info,
+            "input_file_path": self.input_file_path,
+            "output_directory": self.output_directory,
+            "wave": self.wave.to_dict() if self.wave is not None else None,
+            "clock": self.session_clock.to_dict() if self.session_clock is not None else None,
+        }
+
+    def open_telemetry(self, fresh=False):
+        """Open the pick log of the current shipment; resuming a session appends to it"""
+        try:
+            self.telemetry = PickTelemetry(session_log_path(self.shipment_info, self.input_file_path), fresh=fresh)
+        except Exception as ex:
+            print(f"Telemetry error: {ex}")  # Keep timing in memory only
+            self.telemetry = PickTelemetry()
+
+    def track(self, action, item=None, box=0, quantity=0):
+        if self.telemetry is not None:
+            self.telemetry.record(action, item, box=box, quantity=quantity)
+
     def build_assembly_ui(self):
         # --- Top Bar ---
         self.progress_text = ft.Text(
@@ -173,6 +575,15 @@ class AssemblyApp:
             color=self.COLOR_PRIMARY  # Changed from TEXT_SEC to PRIMARY
         )
         self.box_text = ft.Text("Коробка №1", size=18, weight=ft.FontWeight.BOLD, color=self.COLOR_PRIMARY)
+        self.eta_text = ft.Text("", size=12, color=self.COLOR_TEXT_SEC)  # Remaining time at the current pace
+        
+        # Jump to an item found on the shelf before the route reaches it
+        self.search_btn = ft.IconButton(
+            icon=ft.Icons.SEARCH,
+            icon_size=28,
+            icon_color=self.COLOR_TEXT,
+            on_click=self.open_item_search
+        )
         
         # Menu button for additional options
         self.top_menu_btn = ft.IconButton(
@@ -188,7 +599,12 @@ class AssemblyApp:
                     self.box_text,
                     ft.Row(
                         [
-                            self.progress_text,
+                            ft.Column(
+                                [self.progress_text, self.eta_text],
+                                spacing=0,
+                                horizontal_alignment=ft.CrossAxisAlignment.END
+                            ),
+                            self.search_btn,
                             self.top_menu_btn
                         ],
                         spacing=5
@@ -246,6 +662,17 @@ class AssemblyApp:
             on_click=self.on_collect
         )
         
+        # Several lines in the same cell: collect all of them at once or pick some from a checklist
+        self.cell_btn = ft.OutlinedButton("", on_click=self.on_collect_cell)
+        self.cell_row = ft.Row(
+            [
+                self.cell_btn,
+                ft.IconButton(icon=ft.Icons.CHECKLIST, icon_color=self.COLOR_TEXT_SEC, on_click=self.open_cell_checklist),
+            ],
+            alignment=ft.MainAxisAlignment.CENTER,
+            visible=False
+        )
+        
         self.menu_btn = ft.IconButton(
             icon=ft.Icons.MENU,
             icon_size=30,
@@ -257,6 +684,7 @@ class AssemblyApp:
             content=ft.Column(
                 [
                     self.collect_btn,
+                    self.cell_row,
                     ft.Container(height=10),
                     ft.Row(
                         [
@@ -274,17 +702,16 @@ class AssemblyApp:
             border_radius=ft.border_radius.only(top_left=20, top_right=20)
         )
 
-        self.page.add(
-            ft.Column(
-                [
-                    top_bar,
-                    main_card,
-                    bottom_bar
-                ],
-                expand=True,
-                spacing=0
-            )
+        self.assembly_view = ft.Column(
+            [
+                top_bar,
+                main_card,
+                bottom_bar
+            ],
+            expand=True,
+            spacing=0
         )
+        self.page.add(self.assembly_view)
         
         # --- Bottom Sheet ---
         self.bs = ft.BottomSheet(
@@ -321,6 +748,26 @@ class AssemblyApp:
                             title=ft.Text("Завершить сборку досрочно"), 
                             on_click=self.on_finish_early
                         ),
+                        ft.ListTile(
+                            leading=ft.Icon(ft.Icons.TIMER, color=self.COLOR_ACCENT), 
+                            title=ft.Text("Отчет смены"), 
+                            on_click=self.on_shift_report
+                        ),
+                        ft.ListTile(
+                            leading=ft.Icon(ft.Icons.MERGE, color=self.COLOR_PRIMARY), 
+                            title=ft.Text("Объединить с сессией другого устройства"), 
+                            on_click=self.on_merge_session
+                        ),
+                        ft.ListTile(
+                            leading=ft.Icon(ft.Icons.SYNC, color=self.COLOR_ACCENT), 
+                            title=ft.Text("Обновить отгрузку из нового файла"), 
+                            on_click=self.on_reimport_manifest
+                        ),
+                        ft.ListTile(
+                            leading=ft.Icon(ft.Icons.SPEED, color=self.COLOR_TEXT_SEC), 
+                            title=ft.Text("Профилирование (журнал для отчета об ошибке)"), 
+                            trailing=ft.Switch(value=profiling.is_enabled(), on_change=self.on_toggle_profiling)
+                        ),
                     ],
                     tight=True
                 ),
@@ -331,32 +778,131 @@ class AssemblyApp:
         )
         self.page.overlay.append(self.top_menu_bs)
 
-    def update_item_display(self):
+    @profiled("AssemblyApp.update_item_display")
+    def update_item_display(self, *extra_controls):
+        """Update the assembly card; only controls whose value changed are sent, together with extra_controls"""
         if 0 <= self.current_item_index < len(self.assembly_items):
-            item = self.assembly_items[self.current_item_index]
-            
-            self.location_text.value = item.get('location', '---')
-            self.name_text.value = item['name']
+            # Display strings are precomputed per item (name without barcode, last 4 barcode digits)
+            display = self.assembly_index.display.get(self.current_item_index)
             
-            barcode = item.get('barcode', '')
-            # Show last 4 digits, remove leading dots if any
-            display_barcode = barcode[-4:] if len(barcode) >= 4 else barcode
-            self.barcode_text.value = display_barcode.lstrip('.')
+            changed = list(extra_controls)
+            for control, value in (
+                (self.location_text, display.location),
+                (self.name_text, display.name),
+                (self.barcode_text, display.short_barcode),
+                (self.quantity_text, display.quantity),
+                (self.progress_text, self.progress_label()),
+                (self.box_text, f"Коробка №{self.current_box}"),
+                (self.eta_text, self.telemetry.eta_text(len(self.assembly_index.by_status['pending'])) if self.telemetry else ""),
+            ):
+                if control.value != value:
+                    control.value = value
+                    changed.append(control)
+            self.current_group = cell_group(self.assembly_items, self.current_item_index)
+            cell_text = f"Вся ячейка: {len(self.current_group)} поз." if len(self.current_group) > 1 else ""
+            if self.cell_btn.text != cell_text:
+                self.cell_btn.text = cell_text
+                self.cell_row.visible = bool(cell_text)
+                changed.append(self.cell_row)
+            recheck = self.assembly_items[self.current_item_index].get('recheck')
+            if recheck:
+                changed.append(self.snack_message(f"Перепроверить: {recheck}", bgcolor=self.COLOR_ACCENT))
             
-            self.quantity_text.value = str(item['quantity'])
-            
-            self.progress_text.value = f"{self.current_item_index + 1} / {len(self.assembly_items)}"
-            self.box_text.value = f"Коробка №{self.current_box}"
-            
-            self.page.update()
+            if changed:
+                self.refresh('update_item_display', *changed)
+            self.assembly_index.display.prefetch(self.current_item_index)
+        elif self.manifest_loading is not None:
+            # Picked faster than the file is read: the next batch continues the screen
+            self.show_snack("Позиции еще загружаются...")
         else:
-            self.finish_assembly()
+            self.page.run_task(self.finish_assembly)
 
-    def next_item(self):
+    def next_item(self, *extra_controls):
+        if self.return_index is not None:
+            # The item reached through search is done: continue from where the route was
+            self.current_item_index = self.return_index - 1
+            self.return_index = None
         self.current_item_index += 1
         while 0 <= self.current_item_index < len(self.assembly_items) and self.assembly_items[self.current_item_index]['status'] != 'pending':
             self.current_item_index += 1
-        self.update_item_display()
+        self.update_item_display(*extra_controls)
+
+    # --- Jump to item ---
+
+    def open_item_search(self, e):
+        self.search_results = ft.ListView(height=360, item_extent=64, spacing=0)
+        self.search_dialog = ft.AlertDialog(
+            title=ft.Text("Найти позицию"),
+            content=ft.Column(
+                [
+                    ft.TextField(
+                        label="Наименование, артикул или последние цифры штрихкода",
+                        autofocus=True,
+                        on_change=self.on_item_search
+                    ),
+                    self.search_results
+                ],
+                tight=True,
+                width=500
+            ),
+            actions=[ft.TextButton("Закрыть", on_click=lambda _: self.page.close(self.search_dialog))],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(self.search_dialog)
+
+    def on_item_search(self, e):
+        # Word and n-gram indexes are built at load time, so this runs on every keystroke
+        positions = search_items(self.assembly_index, e.control.value or "")
+        self.search_results.controls = [self.search_result_tile(pos) for pos in positions]
+        self.refresh('on_item_search', self.search_results)
+
+    def search_result_tile(self, pos):
+        item = self.assembly_items[pos]
+        display = self.assembly_index.display.get(pos)
+        details = f"{display.location or '-'} · Арт: {item['article']} · ...{display.short_barcode}"
+        if item['status'] != 'pending':
+            details += f" · {self.REVIEW_STATUS_LABELS.get(item['status'], item['status'])}"
+        return ft.ListTile(
+            dense=True,
+            title=ft.Text(display.name, max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+            subtitle=ft.Text(details, size=12, color=self.COLOR_TEXT_SEC),
+            on_click=lambda _, pos=pos: self.jump_to_item(pos)
+        )
+
+    def jump_to_item(self, pos):
+        self.page.close(self.search_dialog)
+        if self.assembly_items[pos]['status'] != 'pending':
+            self.show_snack("Позиция уже обработана. Изменить ее можно в обзоре")
+            return
+        if pos == self.current_item_index:
+            return
+        if self.return_index is None:
+            self.return_index = self.current_item_index
+        self.current_item_index = pos
+        self.update_item_display(self.snack_message(f"После этой позиции сборка вернется к №{self.return_index + 1}"))
+
+    def refresh(self, source, *controls):
+        """Send only the given controls to the client in one batched update; source names the caller in UI stats"""
+        if self.ui_recorder is None:
+            self.page.update(*controls)
+            return
+        started = time.perf_counter()
+        self.page.update(*controls)
+        elapsed = time.perf_counter() - started
+        self.ui_recorder.record(source, count_controls(*controls), elapsed)
+
+    def snack_message(self, message, bgcolor=None, action=None, on_action=None):
+        """Prepare the shared snack bar; the caller sends it with refresh()"""
+        self.snack.content.value = message
+        self.snack.content.color = ft.Colors.WHITE if bgcolor else None
+        self.snack.bgcolor = bgcolor
+        self.snack.action = action
+        self.snack.on_action = on_action
+        self.snack.open = True
+        return self.snack
+
+    def show_snack(self, message, bgcolor=None, action=None, on_action=None):
+        self.refresh('show_snack', self.snack_message(message, bgcolor, action, on_action))
 
     def on_collect(self, e):
         if self.current_item_index >= len(self.assembly_items): return
@@ -365,29 +911,138 @@ class AssemblyApp:
         item['status'] = 'collected'
         item['collected_quantity'] = item['quantity']
         item['box'] = self.current_box
+        self.item_changed(item)
+        self.track('collect', item, box=self.current_box, quantity=item['quantity'])
         
         self.autosave_session()
         self.next_item()
 
+    def item_changed(self, item):
+        """Keep the review indexes in sync after an item's status or box changed"""
+        self.last_change = None  # Any other change closes the undo of a whole-cell pick
+        self.assembly_index.touch(item)
+        item.pop('recheck', None)  # Processed again after a manifest update
+        if self.session_clock is not None:
+            self.session_clock.stamp(item)
+
+    # --- Scanner ---
+
+    def on_keyboard(self, e: ft.KeyboardEvent):
+        # Typing into a dialog field (quantity, search) is not a scan
+        if self.assembly_screen_shown() and not any(
+            isinstance(control, ft.AlertDialog) and control.open for control in self.page.overlay
+        ):
+            self.scanner.feed(e.key)
+
+    def hand_scan_to_loop(self, code):
+        """Scanner thread: the pick runs on the UI loop with every other handler; waiting keeps scans paced"""
+        done = self.page.run_task(self.apply_scan, code)
+        if isinstance(done, Future):
+            done.result()
+
+    async def apply_scan(self, code):
+        self.on_scan(code)
+
+    def on_scan(self, code):
+        """A whole barcode from the scanner: confirms the current line or says where the scanned item is"""
+        if not self.assembly_screen_shown() or not 0 <= self.current_item_index < len(self.assembly_items):
+            return
+        item = self.assembly_items[self.current_item_index]
+        if item.get('barcode') == code and item['status'] == 'pending':
+            self.on_collect(None)
+            return
+        positions = self.assembly_index.find_barcode(code)
+        pending = [pos for pos in positions if self.assembly_items[pos]['status'] == 'pending']
+        if pending:
+            other = self.assembly_items[pending[0]]
+            self.show_snack(f"Это не текущий товар: {other['name']}, ячейка {other.get('location') or '-'}", bgcolor=ft.Colors.RED)
+        elif positions:
+            self.show_snack(f"Товар {code} уже обработан", bgcolor=ft.Colors.RED)
+        else:
+            self.show_snack(f"Штрихкода {code} нет в отгрузке", bgcolor=ft.Colors.RED)
+
+    # --- Whole cell ---
+
+    def on_collect_cell(self, e):
+        self.collect_cell(self.current_group)
+
+    def open_cell_checklist(self, e):
+        checks = [
+            ft.Checkbox(label=f"{self.assembly_index.display.get(pos).name} — {self.assembly_items[pos]['quantity']} шт.", value=True, data=pos)
+            for pos in self.current_group
+        ]
+        
+        def collect_checked(e):
+            self.page.close(self.cell_dialog)
+            self.collect_cell([check.data for check in checks if check.value])
+        
+        self.cell_dialog = ft.AlertDialog(
+            title=ft.Text(f"Ячейка {self.assembly_items[self.current_item_index]['location']}"),
+            content=ft.Column(checks, tight=True, scroll=ft.ScrollMode.AUTO, height=min(400, 48 * len(checks))),
+            actions=[
+                ft.TextButton("Отмена", on_click=lambda _: self.page.close(self.cell_dialog)),
+                ft.TextButton("Собрать отмеченные", on_click=collect_checked),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(self.cell_dialog)
+
+    def collect_cell(self, positions):
+        """Collect several lines into the current box as one change: one autosave, one telemetry write, one undo"""
+        if not positions:
+            return
+        items_list = self.assembly_items
+        change = collect_positions(items_list, positions, self.current_box, self.current_item_index)
+        items = [items_list[pos] for pos in positions]
+        for item in items:
+            self.item_changed(item)
+        self.last_change = change
+        if self.telemetry is not None:
+            self.telemetry.record_many('collect', items, box=self.current_box)
+        self.autosave_session()
+        
+        snack = self.snack_message(
+            f"Собрано позиций: {len(items)} в коробку №{self.current_box}",
+            action="Отменить",
+            on_action=lambda _: self.undo_cell(change, items_list)
+        )
+        if items_list[self.current_item_index]['status'] == 'pending':
+            self.update_item_display(snack)  # The current line was left unchecked
+        else:
+            self.next_item(snack)
+
+    def undo_cell(self, change, items_list):
+        if change is not self.last_change or items_list is not self.assembly_items:
+            self.show_snack("Отменить уже нельзя: после сбора ячейки были другие действия")
+            return
+        for item in undo_change(items_list, change):
+            self.item_changed(item)
+        self.current_item_index = change.cursor
+        self.autosave_session()
+        self.update_item_display(self.snack_message("Сбор ячейки отменен"))
+
     def open_bottom_sheet(self, e):
         self.bs.open = True
-        self.bs.update()
+        self.refresh('open_bottom_sheet', self.bs)
 
     def on_skip(self, e):
         self.bs.open = False
-        self.bs.update()
         
-        if self.current_item_index >= len(self.assembly_items): return
+        if self.current_item_index >= len(self.assembly_items):
+            self.refresh('on_skip', self.bs)
+            return
         item = self.assembly_items[self.current_item_index]
         item['status'] = 'skipped'
         item['collected_quantity'] = 0
         item['box'] = 0
+        self.item_changed(item)
+        self.track('skip', item)
         self.autosave_session()
-        self.next_item()
+        self.next_item(self.bs)
 
     def on_change_qty(self, e, item_index=None):
         self.bs.open = False
-        self.bs.update()
+        self.refresh('on_change_qty', self.bs)
         
         idx = item_index if item_index is not None else self.current_item_index
         if idx < 0 or idx >= len(self.assembly_items): return
@@ -406,6 +1061,7 @@ class AssemblyApp:
                 item['status'] = 'quantity_changed'
                 item['collected_quantity'] = new_qty
                 item['box'] = new_box
+                self.item_changed(item)
                 
                 # Если меняем текущий товар, обновляем и текущую коробку (опционально, но логично)
                 if idx == self.current_item_index:
@@ -413,19 +1069,20 @@ class AssemblyApp:
                 
                 self.page.close(self.qty_dialog)
                 
-                # Если мы в режиме обзора, обновляем таблицу
+                # Если мы в режиме обзора, обновляем строку таблицы
                 if getattr(self, 'is_review_mode', False):
-                    self.build_review_ui()
+                    self.refresh_review_row(idx)
                 else:
                     self.update_item_display()
                     # Если меняли текущий элемент и это не обзор, переходим к следующему
                     if idx == self.current_item_index:
+                        self.track('quantity', item, box=new_box, quantity=new_qty)
                         self.autosave_session()
                         self.next_item()
 
             except ValueError:
                 qty_field.error_text = "Введите корректное число"
-                qty_field.update()
+                self.refresh('save_qty', qty_field)
 
         qty_field = ft.TextField(label="Новое количество", value=str(item.get('collected_quantity', item['quantity'])), autofocus=True, keyboard_type=ft.KeyboardType.NUMBER)
         box_field = ft.TextField(label="Номер коробки", value=str(item.get('box', self.current_box)), keyboard_type=ft.KeyboardType.NUMBER)
@@ -441,6 +1098,7 @@ class AssemblyApp:
         )
         self.page.open(self.qty_dialog)
 
+    @profiled("AssemblyApp.build_review_ui")
     def build_review_ui(self):
         self.page.clean()
         self.is_review_mode = True
@@ -459,97 +1117,223 @@ class AssemblyApp:
             bgcolor=self.COLOR_SURFACE
         )
 
-        # --- Data Table ---
-        rows = []
-        for i, item in enumerate(self.assembly_items):
-            status_color = ft.Colors.WHITE
-            status_icon = ft.Icons.CIRCLE_OUTLINED
-            
-            if item['status'] == 'collected':
-                status_color = self.COLOR_SUCCESS
-                status_icon = ft.Icons.CHECK_CIRCLE
-            elif item['status'] == 'skipped':
-                status_color = ft.Colors.RED
-                status_icon = ft.Icons.CANCEL
-            elif item['status'] == 'quantity_changed':
-                status_color = ft.Colors.ORANGE
-                status_icon = ft.Icons.EDIT
-            
-            box_val = str(item.get('box', '-'))
-            if box_val == '0': box_val = '-'
-            
-            # Extract last 4 digits of barcode
-            barcode = item.get('barcode', '')
-            barcode_last4 = barcode[-4:] if len(barcode) >= 4 else barcode
-            barcode_last4 = barcode_last4.lstrip('.')
-
-            rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Icon(status_icon, color=status_color)),
-                        ft.DataCell(ft.Text(item.get('location', '-'))),
-                        ft.DataCell(ft.Text(barcode_last4)),  # New barcode column
-                        ft.DataCell(ft.Text(str(item['quantity']))),
-                        ft.DataCell(
-                            ft.Text(str(item['collected_quantity']), color=status_color, weight=ft.FontWeight.BOLD),
-                            on_tap=lambda e, idx=i: self.on_edit_quantity_only(idx)  # Click to edit quantity
-                        ),
-                        ft.DataCell(
-                            ft.Text(box_val),
-                            on_tap=lambda e, idx=i: self.on_edit_box_only(idx)  # Click to edit box
-                        ),
-                    ],
-                )
-            )
+        # --- Filters ---
+        status_options = [ft.dropdown.Option(key="all", text="Все статусы")] + [
+            ft.dropdown.Option(key=status, text=label) for status, label in self.REVIEW_STATUS_LABELS.items()
+        ]
+        box_options = [ft.dropdown.Option(key="all", text="Все коробки")] + [
+            ft.dropdown.Option(key=str(box), text=f"Коробка {box}") for box in self.assembly_index.boxes()
+        ]
+        self.review_status_filter = ft.Dropdown(
+            options=status_options,
+            value=self.review_filter["status"] or "all",
+            on_change=self.on_review_filter_change,
+            expand=True,
+            dense=True
+        )
+        self.review_box_filter = ft.Dropdown(
+            options=box_options,
+            value=str(self.review_filter["box"]) if self.review_filter["box"] is not None else "all",
+            on_change=self.on_review_filter_change,
+            expand=True,
+            dense=True
+        )
+        self.review_location_filter = ft.TextField(
+            label="Ячейка",
+            value=self.review_filter["location"],
+            on_change=self.on_review_filter_change,
+            expand=True,
+            dense=True
+        )
+        self.review_search = ft.TextField(
+            label="Артикул / ШК",
+            value=self.review_filter["text"],
+            on_change=self.on_review_filter_change,
+            expand=True,
+            dense=True
+        )
+        self.review_count_text = ft.Text("", size=12, color=self.COLOR_TEXT_SEC)
+        filters = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Row([self.review_status_filter, self.review_box_filter]),
+                    ft.Row([self.review_location_filter, self.review_search]),
+                    self.review_count_text
+                ],
+                spacing=5
+            ),
+            padding=ft.padding.symmetric(horizontal=10, vertical=5)
+        )
 
-        self.review_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Статус")),
-                ft.DataColumn(ft.Text("Ячейка")),
-                ft.DataColumn(ft.Text("ШК")),  # New barcode column
-                ft.DataColumn(ft.Text("План")),
-                ft.DataColumn(ft.Text("Факт")),
-                ft.DataColumn(ft.Text("Коробка")),
-            ],
-            rows=rows,
-            column_spacing=10,
-            data_row_min_height=50,
+        # --- Column titles ---
+        column_titles = ft.Container(
+            content=ft.Row(
+                [
+                    self.review_cell(ft.Text(title, weight=ft.FontWeight.BOLD, color=self.COLOR_TEXT_SEC), width)
+                    for title, width in zip(["Статус", "Ячейка", "ШК", "План", "Факт", "Коробка"], self.REVIEW_COLUMN_WIDTHS)
+                ],
+                spacing=0
+            ),
+            padding=ft.padding.symmetric(horizontal=10, vertical=5)
+        )
+
+        # --- Rows ---
+        # Rows are materialized in chunks while scrolling; item_extent lets the
+        # client lay out the list lazily without measuring every row.
+        self.review_list = ft.ListView(
+            expand=True,
+            item_extent=self.REVIEW_ROW_HEIGHT,
+            on_scroll_interval=100,
+            on_scroll=self.on_review_scroll
         )
+        self.fill_review_list()
 
         self.page.add(
             ft.Column(
                 [
                     header,
-                    ft.Container(
-                        content=ft.Column([self.review_table], scroll=ft.ScrollMode.AUTO),
-                        expand=True,
-                    )
+                    filters,
+                    column_titles,
+                    self.review_list
                 ],
-                expand=True
+                expand=True,
+                spacing=0
+            )
+        )
+
+    def fill_review_list(self):
+        """Query the indexes with the current filter and rebuild the first chunk of rows"""
+        self.review_indices = self.assembly_index.query(**self.review_filter)
+        self.review_rows = {}
+        self.review_list.controls.clear()
+        self.append_review_rows()
+        self.review_count_text.value = f"Найдено: {len(self.review_indices)} из {len(self.assembly_items)}"
+
+    def on_review_filter_change(self, e):
+        status = self.review_status_filter.value
+        box = self.review_box_filter.value
+        self.review_filter = {
+            "status": status if status and status != "all" else None,
+            "box": int(box) if box and box.isdigit() else None,
+            "location": self.review_location_filter.value or "",
+            "text": self.review_search.value or "",
+        }
+        self.fill_review_list()
+        self.refresh('on_review_filter_change', self.review_list, self.review_count_text)
+
+    def review_cell(self, content, width):
+        return ft.Container(content=content, width=width, alignment=ft.alignment.center_left)
+
+    def review_status_style(self, status):
+        """Icon and color for an item status in the review list"""
+        if status == 'collected':
+            return ft.Icons.CHECK_CIRCLE, self.COLOR_SUCCESS
+        if status == 'skipped':
+            return ft.Icons.CANCEL, ft.Colors.RED
+        if status == 'quantity_changed':
+            return ft.Icons.EDIT, ft.Colors.ORANGE
+        return ft.Icons.CIRCLE_OUTLINED, ft.Colors.WHITE
+
+    def append_review_rows(self):
+        """Materialize the next chunk of review rows, returns False when everything is built"""
+        start = len(self.review_list.controls)
+        end = min(start + self.REVIEW_CHUNK_SIZE, len(self.review_indices))
+        for idx in self.review_indices[start:end]:
+            row = ft.Container(
+                height=self.REVIEW_ROW_HEIGHT,
+                padding=ft.padding.symmetric(horizontal=10)
             )
+            self.fill_review_row(row, idx)
+            self.review_rows[idx] = row
+            self.review_list.controls.append(row)
+        return end > start
+
+    def fill_review_row(self, row, idx):
+        item = self.assembly_items[idx]
+        display = self.assembly_index.display.get(idx)
+        status_icon, status_color = self.review_status_style(item['status'])
+        
+        box_val = str(item.get('box', '-'))
+        if box_val == '0': box_val = '-'
+
+        widths = self.REVIEW_COLUMN_WIDTHS
+        row.content = ft.Row(
+            [
+                self.review_cell(ft.Icon(status_icon, color=status_color), widths[0]),
+                self.review_cell(ft.Text(display.location), widths[1]),
+                self.review_cell(ft.Text(display.short_barcode), widths[2]),
+                self.review_cell(ft.Text(display.quantity), widths[3]),
+                ft.Container(
+                    content=ft.Text(str(item['collected_quantity']), color=status_color, weight=ft.FontWeight.BOLD),
+                    width=widths[4],
+                    alignment=ft.alignment.center_left,
+                    data=idx,
+                    on_click=self.on_review_quantity_tap  # Click to edit quantity
+                ),
+                ft.Container(
+                    content=ft.Text(box_val),
+                    width=widths[5],
+                    alignment=ft.alignment.center_left,
+                    data=idx,
+                    on_click=self.on_review_box_tap  # Click to edit box
+                ),
+            ],
+            spacing=0
         )
 
+    def refresh_review_row(self, idx):
+        """Re-render a single review row in place, if it is materialized"""
+        row = self.review_rows.get(idx)
+        if row is None:
+            return
+        self.fill_review_row(row, idx)
+        self.refresh('refresh_review_row', row)
+
+    def on_review_scroll(self, e: ft.OnScrollEvent):
+        if e.pixels is None or e.max_scroll_extent is None:
+            return
+        # Build the next chunk before the user reaches the end of the built rows
+        if e.max_scroll_extent - e.pixels < self.REVIEW_ROW_HEIGHT * self.REVIEW_CHUNK_SIZE / 2:
+            if self.append_review_rows():
+                self.refresh('on_review_scroll', self.review_list)
+
+    def on_review_quantity_tap(self, e):
+        self.on_edit_quantity_only(e.control.data)
+
+    def on_review_box_tap(self, e):
+        self.on_edit_box_only(e.control.data)
+
     def on_next_box(self, e):
         self.bs.open = False
-        self.bs.update()
-        self.current_box += 1
+        closed_box = self.current_box
+        self.current_box = self.session_clock.next_box(self.current_box)
+        self.track('box', box=closed_box)
         self.autosave_session()
-        self.update_item_display()
-        self.page.snack_bar = ft.SnackBar(ft.Text(f"Начата коробка №{self.current_box}"))
-        self.page.snack_bar.open = True
-        self.page.update()
+        self.print_box_label(closed_box)
+        self.update_item_display(self.bs, self.snack_message(f"Начата коробка №{self.current_box}"))
+
+    def print_box_label(self, box):
+        """Label of a closed box goes to the printer (OFFLINE_ASSEMBLER_LABELS) off the UI thread"""
+        records = collected_records(self.assembly_index.box_items(box))
+        if records:
+            self.label_executor.submit(self.write_box_label, self.shipment_info, box, records)
+
+    @staticmethod
+    def write_box_label(shipment_info, box, records):
+        try:
+            excel_module().print_box_label(shipment_info, box, records)
+        except Exception as ex:
+            print(f"Box label error: {ex}")  # A missing printer must not stop picking
 
     def on_select_folder(self, e):
         self.bs.open = False
-        self.bs.update()
+        self.refresh('on_select_folder', self.bs)
         self.folder_picker.get_directory_path()
 
     def on_folder_picked(self, e: ft.FilePickerResultEvent):
         if e.path:
             self.output_directory = e.path
-            self.page.snack_bar = ft.SnackBar(ft.Text(f"Папка сохранения: {e.path}"))
-            self.page.snack_bar.open = True
-            self.page.update()
+            self.show_snack(f"Папка сохранения: {e.path}")
     
     def show_folder_selection_dialog(self):
         """Show dialog to select output folder before starting assembly"""
@@ -598,13 +1382,14 @@ class AssemblyApp:
                 
                 item['status'] = 'quantity_changed'
                 item['collected_quantity'] = new_qty
+                self.item_changed(item)
                 
                 self.page.close(qty_dialog)
-                self.build_review_ui()  # Refresh the review table
+                self.refresh_review_row(item_index)  # Refresh only the edited row
             
             except ValueError:
                 qty_field.error_text = "Введите корректное число"
-                qty_field.update()
+                self.refresh('save_qty', qty_field)
         
         qty_field = ft.TextField(
             label="Количество",
@@ -641,13 +1426,14 @@ class AssemblyApp:
                     raise ValueError
                 
                 item['box'] = new_box
+                self.item_changed(item)
                 
                 self.page.close(box_dialog)
-                self.build_review_ui()  # Refresh the review table
+                self.refresh_review_row(item_index)  # Refresh only the edited row
             
             except ValueError:
                 box_field.error_text = "Введите корректное число (минимум 1)"
-                box_field.update()
+                self.refresh('save_box', box_field)
         
         box_field = ft.TextField(
             label="Номер коробки",
@@ -667,69 +1453,58 @@ class AssemblyApp:
         )
         self.page.open(box_dialog)
 
-    def on_save_file_picked(self, e: ft.FilePickerResultEvent):
-        if e.path:
+    async def on_save_file_picked(self, e: ft.FilePickerResultEvent):
+        if e.path and not self.still_loading():
+            # The dialog is modal, so items cannot change while they are written
+            cancel = self.begin_busy("Сохранение сессии...")
             try:
-                session_data = {
-                    "assembly_items": self.assembly_items,
-                    "current_item_index": self.current_item_index,
-                    "current_box": self.current_box,
-                    "shipment_info": self.shipment_info,
-                    "input_file_path": self.input_file_path,
-                    "output_directory": self.output_directory,
-                }
-                with open(e.path, "wb") as f:
-                    pickle.dump(session_data, f)
-                self.page.snack_bar = ft.SnackBar(ft.Text("Сессия сохранена!"))
-                self.page.snack_bar.open = True
-                self.page.update()
+                await self.run_blocking(self.write_session_file, e.path, self.session_data())
+                self.end_busy(cancel)
+                self.show_snack("Сессия сохранена!")
             except Exception as ex:
+                self.end_busy(cancel)
                 self.show_error(f"Ошибка сохранения: {ex}")
 
-    def finish_assembly(self):
-        collected_data = [
-            {
-                'box': item['box'],
-                'article': item['article'],
-                'name': item['name'],
-                'quantity': item['collected_quantity'],
-                'barcode': item.get('barcode', '')
-            }
-            for item in self.assembly_items if item['status'] in ['collected', 'quantity_changed'] and item['collected_quantity'] > 0
-        ]
-
-        discrepancies = []
-        for item in self.assembly_items:
-            identifier = item.get('barcode') or f"Арт: {item['article']}"
-            if item['status'] == 'skipped':
-                discrepancies.append(f"Пропущено: {identifier} - {item['quantity']} шт.")
-            elif item['status'] == 'quantity_changed' and item['collected_quantity'] != item['quantity']:
-                 discrepancies.append(f"Изменено: {identifier} было {item['quantity']}, стало {item['collected_quantity']}")
+    async def finish_assembly(self):
+        if self.still_loading():
+            return
+        if self.wave is not None:
+            self.start_put_wall()  # Wave results are written per shipment after distribution
+            return
+        
+        collected_data = collected_records(self.assembly_items)
+        discrepancies = discrepancy_notes(self.assembly_items)
 
         if not collected_data and not discrepancies:
             self.show_error("Нет данных для сохранения")
             return
 
+        cancel = self.begin_busy("Сохранение файла...")
         try:
-            writer = ExcelWriter(
-                collected_data=collected_data,
-                shipment_info=self.shipment_info,
-                discrepancies=discrepancies,
-                original_file_path=self.input_file_path,
-                output_directory=self.output_directory
+            output_filename = await self.run_blocking(
+                write_result, self.assembly_items, self.shipment_info, self.input_file_path, self.output_directory
             )
-            output_filename = writer.generate_final_file()
             self.output_file_path = str(Path(output_filename).absolute())  # Store for sharing
+            self.print_box_label(self.current_box)  # The last box is closed by finishing
             
             # Delete autosave after successful completion
             self.delete_autosave()
             
+            # Shift report next to the result; a failure here must not hide the result
+            try:
+                shift_report_path = await self.run_blocking(self.write_shift_report)
+            except Exception as ex:
+                print(f"Shift report error: {ex}")
+                shift_report_path = None
+            
+            self.end_busy(cancel)
             self.page.clean()
             
             content = [
                 ft.Icon(ft.Icons.CHECK_CIRCLE, size=100, color=self.COLOR_SUCCESS),
                 ft.Text("Сборка завершена!", size=30, weight=ft.FontWeight.BOLD, color=self.COLOR_TEXT),
                 ft.Text(f"Файл сохранен:\n{self.output_file_path}", size=16, color=self.COLOR_TEXT_SEC, text_align=ft.TextAlign.CENTER),
+                ft.Text(f"Отчет смены: {Path(shift_report_path).name}" if shift_report_path else "", size=12, color=self.COLOR_TEXT_SEC),
                 ft.Container(height=20),
                 ft.ElevatedButton(
                     "Поделиться файлом",
@@ -782,6 +1557,233 @@ class AssemblyApp:
         except Exception as e:
             self.show_error(f"Ошибка сохранения: {e}")
 
+        finally:
+            self.end_busy(cancel)  # No-op when the completion screen already closed it
+
+    # --- Wave put wall ---
+    
+    def start_put_wall(self):
+        """Distribute the picked wave into per-shipment boxes, one wall slot per shipment"""
+        if not self.wave.allocated:
+            self.wave.allocate(self.assembly_items)
+            self.autosave_session()
+        self.page.clean()
+        self.is_review_mode = False
+        self.put_index = 0
+        self.build_put_wall_ui()
+        self.show_next_put()
+
+    def build_put_wall_ui(self):
+        self.put_progress_text = ft.Text("", size=16, weight=ft.FontWeight.BOLD, color=self.COLOR_PRIMARY)
+        self.put_slot_text = ft.Text("-", size=90, weight=ft.FontWeight.BOLD, color=self.COLOR_ACCENT)
+        self.put_shipment_text = ft.Text("", size=14, text_align=ft.TextAlign.CENTER, color=self.COLOR_TEXT_SEC)
+        self.put_box_text = ft.Text("", size=22, weight=ft.FontWeight.BOLD, color=self.COLOR_PRIMARY)
+        self.put_name_text = ft.Text("", size=16, text_align=ft.TextAlign.CENTER, color=self.COLOR_TEXT)
+        self.put_barcode_text = ft.Text("", size=40, weight=ft.FontWeight.BOLD, color=self.COLOR_PRIMARY)
+        self.put_quantity_text = ft.Text("", size=60, weight=ft.FontWeight.BOLD, color=self.COLOR_SUCCESS)
+        
+        top_bar = ft.Container(
+            content=ft.Row(
+                [ft.Text("Раскладка волны", size=18, weight=ft.FontWeight.BOLD, color=self.COLOR_TEXT), self.put_progress_text],
+                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+            ),
+            padding=ft.padding.only(left=20, right=20, top=50, bottom=10),
+            bgcolor=self.COLOR_SURFACE
+        )
+        
+        card = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text("ЯЧЕЙКА СТЕНЫ", size=12, color=self.COLOR_TEXT_SEC),
+                    self.put_slot_text,
+                    self.put_shipment_text,
+                    self.put_box_text,
+                    ft.Divider(color=self.COLOR_BG),
+                    self.put_name_text,
+                    ft.Text("ШТРИХКОД", size=12, color=self.COLOR_TEXT_SEC),
+                    self.put_barcode_text,
+                    ft.Text("ПОЛОЖИТЬ", size=12, color=self.COLOR_TEXT_SEC),
+                    self.put_quantity_text,
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                scroll=ft.ScrollMode.AUTO
+            ),
+            bgcolor=self.COLOR_SURFACE,
+            border_radius=20,
+            padding=20,
+            expand=True,
+            margin=20,
+            alignment=ft.alignment.center
+        )
+        
+        bottom_bar = ft.Container(
+            content=ft.Column(
+                [
+                    ft.ElevatedButton(
+                        style=ft.ButtonStyle(
+                            color=self.COLOR_BG,
+                            bgcolor=self.COLOR_SUCCESS,
+                            shape=ft.RoundedRectangleBorder(radius=15),
+                            padding=20,
+                        ),
+                        width=300,
+                        height=80,
+                        content=ft.Text("ПОЛОЖЕНО", size=24, weight=ft.FontWeight.BOLD),
+                        on_click=self.on_put
+                    ),
+                    ft.Row(
+                        [
+                            ft.TextButton("Следующая коробка", icon=ft.Icons.INVENTORY, on_click=self.on_wave_next_box),
+                            ft.TextButton("Завершить", icon=ft.Icons.CHECK_CIRCLE, on_click=self.on_finish_put_wall),
+                        ],
+                        alignment=ft.MainAxisAlignment.SPACE_EVENLY
+                    )
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER
+            ),
+            padding=20,
+            bgcolor=self.COLOR_SURFACE,
+            border_radius=ft.border_radius.only(top_left=20, top_right=20)
+        )
+        
+        self.page.add(ft.Column([top_bar, card, bottom_bar], expand=True, spacing=0))
+
+    def show_next_put(self, *extra_controls):
+        """Move to the next pending put task; when none is left write the shipment files"""
+        tasks = self.wave.put_tasks
+        while self.put_index < len(tasks) and tasks[self.put_index]['status'] != 'pending':
+            self.put_index += 1
+        if self.put_index >= len(tasks):
+            self.page.run_task(self.finish_wave)
+            return
+        
+        task = tasks[self.put_index]
+        shipment = self.wave.shipments[task['shipment']]
+        display = project_item(shipment['orders'][task['order']])
+        
+        changed = list(extra_controls)
+        for control, value in (
+            (self.put_progress_text, f"{self.put_index + 1} / {len(tasks)}"),
+            (self.put_slot_text, str(shipment['slot'])),
+            (self.put_shipment_text, shipment['shipment_info']),
+            (self.put_box_text, f"Коробка №{shipment['box']}"),
+            (self.put_name_text, display.name),
+            (self.put_barcode_text, display.short_barcode),
+            (self.put_quantity_text, str(task['quantity'])),
+        ):
+            if control.value != value:
+                control.value = value
+                changed.append(control)
+        if changed:
+            self.refresh('show_next_put', *changed)
+
+    def on_put(self, e):
+        if self.put_index >= len(self.wave.put_tasks):
+            return
+        self.wave.put(self.put_index)
+        self.autosave_session()
+        self.put_index += 1
+        self.show_next_put()
+
+    def on_wave_next_box(self, e):
+        if self.put_index >= len(self.wave.put_tasks):
+            return
+        shipment_index = self.wave.put_tasks[self.put_index]['shipment']
+        box = self.wave.next_box(shipment_index)
+        self.autosave_session()
+        slot = self.wave.shipments[shipment_index]['slot']
+        self.show_next_put(self.snack_message(f"Ячейка {slot}: начата коробка №{box}"))
+
+    def on_finish_put_wall(self, e):
+        async def confirm_finish(e):
+            self.page.close(confirm_dialog)
+            await self.finish_wave()
+        
+        def cancel_finish(e):
+            self.page.close(confirm_dialog)
+        
+        confirm_dialog = ft.AlertDialog(
+            title=ft.Text("Завершить раскладку?"),
+            content=ft.Text("Неразложенный товар будет указан в расхождениях своих отгрузок."),
+            actions=[
+                ft.TextButton("Отмена", on_click=cancel_finish),
+                ft.TextButton("Да, завершить", on_click=confirm_finish),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(confirm_dialog)
+
+    async def finish_wave(self):
+        """
+        Write one result file per shipment of the wave and show them all.
+        The wave and its autosave are kept until every shipment has a file, so failed ones can be retried
+        """
+        cancel = self.begin_busy("Сохранение файлов отгрузок...")
+        try:
+            results = await self.run_blocking(self.wave.write_results, self.output_directory)
+            written = [r['path'] for r in results if r['path']]
+            complete = len(written) == len(results)
+            shift_report_path = None
+            if written:
+                self.output_file_path = str(Path(written[0]).absolute())
+            if complete:
+                self.delete_autosave()
+                try:
+                    shift_report_path = await self.run_blocking(self.write_shift_report)
+                except Exception as ex:
+                    print(f"Shift report error: {ex}")
+            else:
+                self.autosave_session()  # Keeps the paths of the files already written
+        except Exception as ex:
+            self.show_error(f"Ошибка сохранения: {ex}")
+            return
+        finally:
+            self.end_busy(cancel)
+        
+        content = [
+            ft.Icon(ft.Icons.CHECK_CIRCLE if complete else ft.Icons.ERROR, size=100,
+                    color=self.COLOR_SUCCESS if complete else ft.Colors.RED),
+            ft.Text("Волна разложена!" if complete else "Не все файлы сохранены", size=30, weight=ft.FontWeight.BOLD, color=self.COLOR_TEXT),
+            ft.Text(f"Отчет смены: {Path(shift_report_path).name}" if shift_report_path else "", size=12, color=self.COLOR_TEXT_SEC),
+        ]
+        for result in results:
+            content.append(ft.Container(height=10))
+            content.append(ft.Text(result['shipment_info'], size=16, weight=ft.FontWeight.BOLD, color=self.COLOR_TEXT))
+            if result['path']:
+                content.append(ft.Text(Path(result['path']).name, size=12, color=self.COLOR_TEXT_SEC))
+            else:
+                content.append(ft.Text(f"Ошибка: {result['error']}", size=12, color=ft.Colors.RED))
+            for d in result['discrepancies']:
+                content.append(ft.Text(d, color=self.COLOR_TEXT_SEC, size=12))
+        
+        content.append(ft.Container(height=20))
+        if not complete:
+            content.append(ft.ElevatedButton(
+                f"Повторить запись ({len(results) - len(written)})", icon=ft.Icons.REFRESH,
+                on_click=lambda _: self.page.run_task(self.finish_wave)
+            ))
+        if written:
+            content.append(ft.ElevatedButton("Показать расположение", icon=ft.Icons.FOLDER_OPEN,
+                                             on_click=lambda _: self.show_file_location()))
+        content.append(ft.ElevatedButton("В главное меню", on_click=lambda _: self.init_ui()))
+        
+        if complete:
+            self.wave = None
+        self.page.clean()
+        self.page.add(
+            ft.Container(
+                content=ft.Column(
+                    content,
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                    scroll=ft.ScrollMode.AUTO
+                ),
+                alignment=ft.alignment.center,
+                expand=True,
+                padding=20
+            )
+        )
+
     def share_file_native(self):
         """Share file using native share dialog (Android/iOS)"""
         if not self.output_file_path:
@@ -843,9 +1845,7 @@ class AssemblyApp:
             
             def copy_path(e):
                 self.page.set_clipboard(self.output_file_path)
-                self.page.snack_bar = ft.SnackBar(ft.Text("Путь скопирован в буфер обмена"))
-                self.page.snack_bar.open = True
-                self.page.update()
+                self.show_snack("Путь скопирован в буфер обмена")
                 self.page.close(share_dialog)
             
             def open_folder(e):
@@ -879,65 +1879,66 @@ class AssemblyApp:
             self.show_error("Файл не найден")
     
     def show_error(self, message):
-        self.page.snack_bar = ft.SnackBar(ft.Text(message, color=ft.Colors.WHITE), bgcolor=ft.Colors.RED)
-        self.page.snack_bar.open = True
-        self.page.update()
+        self.show_snack(message, bgcolor=ft.Colors.RED)
 
     def show_not_implemented(self, feature):
-        self.page.snack_bar = ft.SnackBar(ft.Text(f"{feature} еще не реализовано"))
-        self.page.snack_bar.open = True
-        self.page.update()
+        self.show_snack(f"{feature} еще не реализовано")
     
+    @profiled("AssemblyApp.autosave_session")
     def autosave_session(self):
         """Automatically save session to client_storage"""
+        if self.manifest_loading is not None:
+            return  # A partial list would resume without the rest of the file; saved once loading ends
         try:
-            session_data = {
-                "assembly_items": self.assembly_items,
-                "current_item_index": self.current_item_index,
-                "current_box": self.current_box,
+            session_data = self.session_data()
+            summary = {
                 "shipment_info": self.shipment_info,
-                "input_file_path": self.input_file_path,
-                "output_directory": self.output_directory,
+                "total": len(self.assembly_items),
+                "done": sum(1 for item in self.assembly_items if item['status'] != 'pending'),
+                "current_box": self.current_box,
             }
             # Serialize to JSON and save to client_storage
             json_data = json.dumps(session_data, ensure_ascii=False)
             self.page.client_storage.set(self.AUTOSAVE_KEY, json_data)
+            self.page.client_storage.set(self.AUTOSAVE_SUMMARY_KEY, json.dumps(summary, ensure_ascii=False))
         except Exception as ex:
             print(f"Autosave error: {ex}")  # Log for debugging
     
-    def try_load_autosave(self):
-        """Try to load autosaved session from client_storage on startup"""
+    def offer_autosave_resume(self):
+        """Ask whether to resume an autosaved session; only the small summary is decoded here"""
         try:
-            json_data = self.page.client_storage.get(self.AUTOSAVE_KEY)
-            if not json_data:
+            summary_json = self.page.client_storage.get(self.AUTOSAVE_SUMMARY_KEY)
+            if summary_json:
+                summary = json.loads(summary_json)
+            elif self.page.client_storage.contains_key(self.AUTOSAVE_KEY):
+                summary = {}  # Autosave written before summaries existed
+            else:
                 return  # No autosave found
             
-            session_data = json.loads(json_data)
-            
-            self.assembly_items = session_data["assembly_items"]
-            self.current_item_index = session_data["current_item_index"]
-            self.current_box = session_data["current_box"]
-            self.shipment_info = session_data["shipment_info"]
-            self.input_file_path = session_data["input_file_path"]
-            self.output_directory = session_data.get("output_directory", "")
-            
             # Show dialog to ask if user wants to continue
             def continue_session(e):
                 self.page.close(resume_dialog)
-                if self.output_directory:
-                    self.start_assembly()
-                else:
-                    self.show_folder_selection_dialog()
+                if self.restore_autosave():
+                    if self.output_directory:
+                        self.start_assembly()
+                    else:
+                        self.show_folder_selection_dialog()
             
             def start_new(e):
                 self.page.close(resume_dialog)
                 self.delete_autosave()
-                self.assembly_items = []
-                self.init_ui()
+            
+            message = "Найдена незавершенная сборка. Продолжить?"
+            if summary:
+                message = (
+                    f"Найдена незавершенная сборка:\n{summary.get('shipment_info', '')}\n"
+                    f"Обработано {summary.get('done', 0)} из {summary.get('total', 0)}, "
+                    f"коробка №{summary.get('current_box', 1)}.\nПродолжить?"
+                )
             
             resume_dialog = ft.AlertDialog(
                 title=ft.Text("Восстановить сборку?"),
-                content=ft.Text("Найдена незавершенная сборка. Продолжить?"),
+                content=ft.Text(message),
                 actions=[
                     ft.TextButton("Начать новую", on_click=start_new),
                     ft.TextButton("Продолжить", on_click=continue_session),
@@ -950,26 +1951,56 @@ class AssemblyApp:
             print(f"Load autosave error: {ex}")  # Log for debugging
             self.delete_autosave()
     
+    def restore_autosave(self):
+        """Decode the full autosave; returns False if it is missing or broken"""
+        try:
+            json_data = self.page.client_storage.get(self.AUTOSAVE_KEY)
+            session_data = json.loads(json_data)
+            
+            self.assembly_items = session_data["assembly_items"]
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.return_index = None
+            self.current_item_index = session_data["current_item_index"]
+            self.current_box = session_data["current_box"]
+            self.shipment_info = session_data["shipment_info"]
+            self.input_file_path = session_data["input_file_path"]
+            self.output_directory = session_data.get("output_directory", "")
+            self.restore_wave(session_data)
+            self.start_session_clock(session_data)
+            self.open_telemetry()
+            return True
+        except Exception as ex:
+            print(f"Load autosave error: {ex}")  # Log for debugging
+            self.delete_autosave()
+            self.show_error("Не удалось восстановить сборку")
+            return False
+    
+    def restore_wave(self, session_data):
+        wave_data = session_data.get("wave")
+        self.wave = Wave.from_dict(wave_data, self.assembly_items) if wave_data else None
+        self.put_index = 0
+
     def delete_autosave(self):
         """Delete autosave from client_storage"""
-        try:
-            self.page.client_storage.remove(self.AUTOSAVE_KEY)
-        except Exception:
-            pass
+        for key in (self.AUTOSAVE_KEY, self.AUTOSAVE_SUMMARY_KEY):
+            try:
+                self.page.client_storage.remove(key)
+            except Exception:
+                pass
     
     def open_top_menu(self, e):
         """Open top menu with additional options"""
         self.top_menu_bs.open = True
-        self.top_menu_bs.update()
+        self.refresh('open_top_menu', self.top_menu_bs)
     
     def on_generate_intermediate(self, e):
         """Generate intermediate Excel file with current progress"""
         self.top_menu_bs.open = False
-        self.top_menu_bs.update()
+        self.refresh('on_generate_intermediate', self.top_menu_bs)
         
-        def confirm_generate(e):
+        async def confirm_generate(e):
             self.page.close(confirm_dialog)
-            self.generate_excel_file(mark_uncollected=True, finish=False)
+            await self.generate_excel_file(mark_uncollected=True, finish=False)
         
         def cancel_generate(e):
             self.page.close(confirm_dialog)
@@ -985,14 +2016,150 @@ class AssemblyApp:
         )
         self.page.open(confirm_dialog)
     
+    async def on_shift_report(self, e):
+        """Export pick rate statistics of the current shipment"""
+        self.top_menu_bs.open = False
+        self.refresh('on_shift_report', self.top_menu_bs)
+        try:
+            report_path = await self.run_blocking(self.write_shift_report)
+            if report_path:
+                self.show_snack(f"Отчет сохранен: {Path(report_path).name}", bgcolor=self.COLOR_SUCCESS)
+        except Exception as ex:
+            self.show_error(f"Ошибка отчета: {ex}")
+
+    def on_merge_session(self, e):
+        self.top_menu_bs.open = False
+        self.refresh('on_merge_session', self.top_menu_bs)
+        if self.wave is not None:
+            self.show_error("Объединение сессий недоступно в режиме волны")
+            return
+        if self.still_loading():
+            return
+        self.merge_file_picker.pick_files(allow_multiple=False, allowed_extensions=["assm-save"])
+
+    async def on_merge_file_picked(self, e: ft.FilePickerResultEvent):
+        if not e.files or not e.files[0].path:
+            return
+        try:
+            other_session = await self.run_blocking(self.read_session_file, e.files[0].path)
+            await self.merge_with(other_session)
+        except Exception as ex:
+            self.show_error(f"Ошибка объединения: {ex}")
+
+    async def merge_with(self, other_session):
+        """Merge another device's session into this one and show what had to be decided"""
+        cancel = self.begin_busy("Объединение сессий...")
+        try:
+            result = await self.run_blocking(merge_sessions, self.session_data(), other_session)
+        finally:
+            self.end_busy(cancel)
+        
+        self.assembly_items = result.session_data["assembly_items"]
+        self.assembly_index = AssemblyIndex(self.assembly_items)
+        self.return_index = None
+        self.current_item_index = result.session_data["current_item_index"]
+        self.current_box = result.session_data["current_box"]
+        self.start_session_clock(result.session_data)
+        self.autosave_session()
+        self.start_assembly()
+        
+        notes = result.box_notes() + [conflict.describe() for conflict in result.conflicts]
+        if not notes:
+            self.show_snack("Сессии объединены", bgcolor=self.COLOR_SUCCESS)
+            return
+        self.show_notes(f"Сессии объединены. Конфликтов: {len(result.conflicts)}", notes)
+
+    def show_notes(self, title, notes):
+        """Dialog with a list of lines the picker has to act on (merge conflicts, manifest changes)"""
+        if len(notes) > 50:
+            notes = notes[:50] + [f"... и еще {len(notes) - 50}"]
+        
+        def close_dlg(e):
+            self.page.close(notes_dialog)
+        
+        notes_dialog = ft.AlertDialog(
+            title=ft.Text(title),
+            content=ft.Column(
+                [ft.Text(note, size=13) for note in notes],
+                tight=True,
+                scroll=ft.ScrollMode.AUTO,
+                height=min(400, 30 * len(notes) + 20)
+            ),
+            actions=[ft.TextButton("OK", on_click=close_dlg)],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(notes_dialog)
+
+    def on_reimport_manifest(self, e):
+        self.top_menu_bs.open = False
+        self.refresh('on_reimport_manifest', self.top_menu_bs)
+        if self.wave is not None:
+            self.show_error("Обновление отгрузки недоступно в режиме волны")
+            return
+        if self.still_loading():
+            return
+        self.reimport_file_picker.pick_files(allow_multiple=False, allowed_extensions=["xlsx", "xls"])
+
+    async def on_reimport_file_picked(self, e: ft.FilePickerResultEvent):
+        if e.files and e.files[0].path:
+            await self.reimport_from(e.files[0].path)
+
+    async def reimport_from(self, filepath):
+        """Move the session onto a revised manifest of the same shipment, keeping progress of unchanged lines"""
+        cancel = self.begin_busy("Чтение обновленного файла...", cancellable=True)
+        try:
+            orders, shipment_info = await self.run_blocking(self.read_manifest, filepath, cancel, self.busy_reporter())
+            if cancel.is_set():
+                return
+            result = await self.run_blocking(reimport_manifest, self.session_data(), orders, shipment_info)
+        except Exception as ex:
+            if not cancel.is_set():
+                self.end_busy(cancel)
+                self.show_error(f"Ошибка обновления: {ex}")
+            return
+        self.end_busy(cancel)
+        
+        self.assembly_items = result.session_data["assembly_items"]
+        self.assembly_index = AssemblyIndex(self.assembly_items)
+        self.return_index = None
+        self.input_file_path = filepath
+        self.current_item_index = result.session_data["current_item_index"]
+        self.start_session_clock(result.session_data)
+        self.autosave_session()
+        self.start_assembly()
+        
+        notes = result.notes()
+        if not notes:
+            self.show_snack(f"Отгрузка обновлена. {result.summary()}", bgcolor=self.COLOR_SUCCESS)
+            return
+        self.show_notes(f"Отгрузка обновлена. {result.summary()}", notes)
+
+    def write_shift_report(self):
+        if self.telemetry is None or not self.telemetry.events:
+            return None
+        output_directory = self.output_directory or str(Path(self.input_file_path).parent)
+        return self.telemetry.write_report(self.shipment_info, output_directory, Path(self.input_file_path).stem)
+
+    def on_toggle_profiling(self, e):
+        if e.control.value:
+            log_path = profiling.enable()
+            self.show_snack(f"Журнал профилирования: {log_path}")
+        else:
+            profiling.disable()
+            self.show_snack("Профилирование выключено")
+        try:
+            self.page.client_storage.set(self.PROFILING_KEY, bool(e.control.value))
+        except Exception as ex:
+            print(f"Profiling settings error: {ex}")
+
     def on_finish_early(self, e):
         """Finish assembly early"""
         self.top_menu_bs.open = False
-        self.top_menu_bs.update()
+        self.refresh('on_finish_early', self.top_menu_bs)
         
-        def confirm_finish(e):
+        async def confirm_finish(e):
             self.page.close(confirm_dialog)
-            self.generate_excel_file(mark_uncollected=True, finish=True)
+            await self.generate_excel_file(mark_uncollected=True, finish=True)
         
         def cancel_finish(e):
             self.page.close(confirm_dialog)
@@ -1008,70 +2175,49 @@ class AssemblyApp:
         )
         self.page.open(confirm_dialog)
     
-    def generate_excel_file(self, mark_uncollected=False, finish=False):
+    async def generate_excel_file(self, mark_uncollected=False, finish=False):
         """Generate Excel file with current state"""
-        # Mark all pending items as skipped if requested
-        if mark_uncollected:
-            for item in self.assembly_items:
-                if item['status'] == 'pending':
-                    item['status'] = 'skipped'
-                    item['collected_quantity'] = 0
-                    item['box'] = 0
-        
-        collected_data = [
-            {
-                'box': item['box'],
-                'article': item['article'],
-                'name': item['name'],
-                'quantity': item['collected_quantity'],
-                'barcode': item.get('barcode', '')
-            }
-            for item in self.assembly_items if item['status'] in ['collected', 'quantity_changed'] and item['collected_quantity'] > 0
-        ]
-
-        discrepancies = []
-        for item in self.assembly_items:
-            identifier = item.get('barcode') or f"Арт: {item['article']}"
-            if item['status'] == 'skipped':
-                discrepancies.append(f"Пропущено: {identifier} - {item['quantity']} шт.")
-            elif item['status'] == 'quantity_changed' and item['collected_quantity'] != item['quantity']:
-                 discrepancies.append(f"Изменено: {identifier} было {item['quantity']}, стало {item['collected_quantity']}")
+        if self.still_loading():
+            return
+        if self.wave is not None and not finish:
+            self.show_snack("В режиме волны файлы отгрузок сохраняются после раскладки")
+            return
+        
+        if finish:
+            # Early finish: lines left pending are really skipped
+            if mark_uncollected:
+                for item in self.assembly_items:
+                    if item['status'] == 'pending':
+                        item['status'] = 'skipped'
+                        item['collected_quantity'] = 0
+                        item['box'] = 0
+                        self.item_changed(item)
+            # The completion screen writes the file (and the wave goes to its put wall)
+            await self.finish_assembly()
+            return
+        
+        # An intermediate file shows pending lines as skipped without changing them
+        items = skip_uncollected(self.assembly_items) if mark_uncollected else self.assembly_items
+        collected_data = collected_records(items)
+        discrepancies = discrepancy_notes(items)
 
         if not collected_data and not discrepancies:
             self.show_error("Нет данных для сохранения")
             return
 
+        cancel = self.begin_busy("Сохранение файла...")
         try:
-            writer = ExcelWriter(
-                collected_data=collected_data,
-                shipment_info=self.shipment_info,
-                discrepancies=discrepancies,
-                original_file_path=self.input_file_path,
-                output_directory=self.output_directory
+            output_filename = await self.run_blocking(
+                write_result, items, self.shipment_info, self.input_file_path, self.output_directory
             )
-            output_filename = writer.generate_final_file()
             self.output_file_path = str(Path(output_filename).absolute())
+            self.end_busy(cancel)
             
-            if finish:
-                # Delete autosave and go to completion screen
-                self.delete_autosave()
-                self.finish_assembly()
-            else:
-                # Show success message and continue
-                self.page.snack_bar = ft.SnackBar(
-                    ft.Text(f"Файл сохранен: {Path(output_filename).name}"),
-                    bgcolor=self.COLOR_SUCCESS
-                )
-                self.page.snack_bar.open = True
-                self.page.update()
-                
-                # Reset pending items back to pending if we marked them
-                if mark_uncollected:
-                    for item in self.assembly_items:
-                        if item['status'] == 'skipped' and item['collected_quantity'] == 0:
-                            item['status'] = 'pending'
+            # Show success message and continue
+            self.show_snack(f"Файл сохранен: {Path(output_filename).name}", bgcolor=self.COLOR_SUCCESS)
         
         except Exception as ex:
+            self.end_busy(cancel)
             self.show_error(f"Ошибка сохранения: {ex}")
 
 def main(page: ft.Page):
@@ -2,9 +2,19 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog, ttk
 import pickle
-from excel_processor import ExcelProcessor, ExcelWriter
+from concurrent.futures import ThreadPoolExecutor
+from excel_processor import ExcelProcessor, print_box_label
+from assembly_state import AssemblyIndex, collected_records, discrepancy_notes, search_items, write_result
+from telemetry import PickTelemetry, session_log_path
+from scan_input import ScanPipeline
+from session_merge import SessionClock, merge_sessions, reimport_manifest
+import profiling
+from profiling import profiled
+from pathlib import Path
 
 class AssemblyApp:
+    SCAN_POLL_MS = 20
+
     def __init__(self, root):
         self.root = root
         self.root.title("Сборщик Заказов")
@@ -66,10 +76,21 @@ class AssemblyApp:
 
         # Инициализация состояния
         self.assembly_items = []
+        self.assembly_index = AssemblyIndex(self.assembly_items)  # line_id, фильтры и поиск обзора
+        self.changed_lines = set()  # line_id позиций, измененных после обновления обзора
         self.current_item_index = 0
+        self.return_index = None  # Куда вернется сборка после позиции, найденной поиском
         self.current_box = 1
         self.shipment_info = ""
         self.input_file_path = ""
+        self.telemetry = None  # Журнал действий сборщика по текущей отгрузке
+        self.session_clock = None  # Часы изменений для слияния сессий с других устройств
+        # Сканер в режиме клавиатуры: коды собираются из нажатий и обрабатываются по очереди в pump()
+        self.scanner = ScanPipeline(self.on_scan)
+        self.root.bind("<Key>", self.on_key)
+        self.root.after(self.SCAN_POLL_MS, self.poll_scanner)
+        # Этикетки коробок печатаются по очереди в своем потоке: недоступный принтер не держит окно
+        self.label_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="labels")
 
         # --- UI Элементы ---
         self.main_frame = ttk.Frame(root, padding="20")
@@ -130,10 +151,17 @@ class AssemblyApp:
         self.actions_menu = tk.Menu(self.actions_menubutton, tearoff=0)
         self.actions_menubutton.config(menu=self.actions_menu)
         
+        self.actions_menu.add_command(label="Найти позицию...", command=self.open_item_search)
         self.actions_menu.add_command(label="Нету товара", command=self.on_skip)
         self.actions_menu.add_command(label="Изменить количество", command=self.on_change_quantity)
         self.actions_menu.add_separator()
         self.actions_menu.add_command(label="След. коробка", command=self.on_next_box)
+        self.actions_menu.add_separator()
+        self.actions_menu.add_command(label="Отчет смены", command=self.on_shift_report)
+        self.actions_menu.add_command(label="Объединить с другой сессией...", command=self.on_merge_session)
+        self.actions_menu.add_command(label="Обновить отгрузку из файла...", command=self.on_reimport_manifest)
+        self.profiling_var = tk.BooleanVar(value=profiling.is_enabled())
+        self.actions_menu.add_checkbutton(label="Профилирование", variable=self.profiling_var, command=self.on_toggle_profiling)
         
         self.actions_menubutton.pack(fill=tk.X)
 
@@ -146,12 +174,30 @@ class AssemblyApp:
 
     def reset_state(self):
         self.assembly_items = []
+        self.assembly_index = AssemblyIndex(self.assembly_items)
+        self.changed_lines.clear()
         self.current_item_index = 0
+        self.return_index = None
         self.current_box = 1
         self.shipment_info = ""
         self.input_file_path = ""
+        self.telemetry = None
+        self.session_clock = None
         self.update_ui_for_new_file()
 
+    def open_telemetry(self, fresh=False):
+        """Открывает журнал действий для текущей отгрузки; при загрузке сборки дописывает в него."""
+        try:
+            self.telemetry = PickTelemetry(session_log_path(self.shipment_info, self.input_file_path), fresh=fresh)
+        except Exception as e:
+            print(f"Telemetry error: {e}")  # Только в памяти
+            self.telemetry = PickTelemetry()
+        self.telemetry.record('start')
+
+    def track(self, action, item=None, box=0, quantity=0):
+        if self.telemetry is not None:
+            self.telemetry.record(action, item, box=box, quantity=quantity)
+
     def load_file(self):
         filepath = filedialog.askopenfilename(
             title="Выберите Excel файл",
@@ -175,6 +221,9 @@ class AssemblyApp:
                     'box': 0
                 } for item in items_to_collect
             ]
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.session_clock = SessionClock.for_session({})
+            self.session_clock.open_box(self.current_box)
 
             if not self.assembly_items:
                 messagebox.showerror("Ошибка", "Не удалось найти товары в файле. Проверьте формат.")
@@ -184,26 +233,37 @@ class AssemblyApp:
             messagebox.showerror("Ошибка при чтении файла", f"Не удалось обработать файл:\n{e}")
             return
             
+        self.open_telemetry(fresh=True)
         self.update_ui_for_new_file()
         self.display_current_item()
 
+        if processor.report.has_issues():
+            lines = processor.report.lines()
+            if len(lines) > 30:
+                lines = lines[:30] + [f"... и еще {len(lines) - 30}"]
+            messagebox.showwarning("Замечания к файлу", processor.report.summary() + "\n\n" + "\n".join(lines))
+
+    @profiled("AssemblyApp.display_current_item")
     def display_current_item(self):
         if 0 <= self.current_item_index < len(self.assembly_items):
-            item = self.assembly_items[self.current_item_index]
+            # Строки позиции посчитаны заранее: имя без штрихкода, хвост штрихкода
+            display = self.assembly_index.display.get(self.current_item_index)
             
-            name = item['name']
-            location = item.get('location', '---')
-            barcode = item.get('barcode', '')
-            quantity = item['quantity']
+            self.name_label.config(text=display.name)
+            self.location_label.config(text=display.location)
+            self.barcode_label.config(text=f"...{display.short_barcode}")
+            self.quantity_label.config(text=f"{display.quantity} шт.")
             
-            short_barcode = barcode[-4:] if len(barcode) >= 4 else barcode
-            
-            self.name_label.config(text=name)
-            self.location_label.config(text=location)
-            self.barcode_label.config(text=f"...{short_barcode}")
-            self.quantity_label.config(text=f"{quantity} шт.")
-            
-            self.progress_label.config(text=f"Позиция {self.current_item_index + 1} из {len(self.assembly_items)}")
+            progress = f"Позиция {self.current_item_index + 1} из {len(self.assembly_items)}"
+            if self.telemetry is not None:
+                eta = self.telemetry.eta_text(len(self.assembly_index.by_status['pending']))
+                if eta:
+                    progress += f"  ·  осталось {eta}"
+            recheck = self.assembly_items[self.current_item_index].get('recheck')
+            if recheck:
+                progress += f"\nПерепроверить: {recheck}"
+            self.progress_label.config(text=progress)
+            self.assembly_index.display.prefetch(self.current_item_index)
         else:
             self.finish_assembly()
 
@@ -234,6 +294,10 @@ class AssemblyApp:
             self.box_label.config(text="")
 
     def next_item(self):
+        if self.return_index is not None:
+            # Позиция, найденная поиском, обработана: сборка продолжается с прежнего места маршрута
+            self.current_item_index = self.return_index - 1
+            self.return_index = None
         self.current_item_index += 1
         while 0 <= self.current_item_index < len(self.assembly_items) and self.assembly_items[self.current_item_index]['status'] != 'pending':
             self.current_item_index += 1
@@ -247,9 +311,57 @@ class AssemblyApp:
         item['status'] = 'collected'
         item['collected_quantity'] = item['quantity']
         item['box'] = self.current_box
+        self.item_changed(item)
+        self.track('collect', item, box=self.current_box, quantity=item['quantity'])
         
         self.next_item()
 
+    def open_item_search(self):
+        dialog = ItemSearchDialog(self.root, self)
+        if dialog.result is not None:
+            self.jump_to_item(dialog.result)
+
+    def jump_to_item(self, pos):
+        if self.assembly_items[pos]['status'] != 'pending':
+            self.progress_label.config(text="Позиция уже обработана. Изменить ее можно в обзоре")
+            return
+        if pos == self.current_item_index:
+            return
+        if self.return_index is None:
+            self.return_index = self.current_item_index
+        self.current_item_index = pos
+        self.display_current_item()
+        self.progress_label.config(
+            text=self.progress_label.cget("text") + f"\nПосле этой позиции сборка вернется к №{self.return_index + 1}"
+        )
+
+    def on_key(self, event):
+        self.scanner.feed(event.char or event.keysym)
+
+    def poll_scanner(self):
+        self.scanner.pump()
+        self.root.after(self.SCAN_POLL_MS, self.poll_scanner)
+
+    def on_scan(self, code):
+        """Штрихкод со сканера: подтверждает текущую позицию или подсказывает, где отсканированный товар."""
+        if not 0 <= self.current_item_index < len(self.assembly_items):
+            return
+        item = self.assembly_items[self.current_item_index]
+        if item.get('barcode') == code and item['status'] == 'pending':
+            self.on_collect()
+            return
+        positions = self.assembly_index.find_barcode(code)
+        pending = [pos for pos in positions if self.assembly_items[pos]['status'] == 'pending']
+        if pending:
+            other = self.assembly_items[pending[0]]
+            message = f"Это не текущий товар: {other['name']}, ячейка {other.get('location') or '-'}"
+        elif positions:
+            message = f"Товар {code} уже обработан"
+        else:
+            message = f"Штрихкода {code} нет в отгрузке"
+        self.root.bell()
+        self.progress_label.config(text=message)
+
     def on_skip(self):
         if self.current_item_index >= len(self.assembly_items): return
 
@@ -257,6 +369,8 @@ class AssemblyApp:
         item['status'] = 'skipped'
         item['collected_quantity'] = 0
         item['box'] = 0
+        self.item_changed(item)
+        self.track('skip', item)
         
         self.next_item()
 
@@ -276,13 +390,42 @@ class AssemblyApp:
             item['status'] = 'quantity_changed'
             item['collected_quantity'] = new_quantity
             item['box'] = self.current_box
+            self.item_changed(item)
+            self.track('quantity', item, box=self.current_box, quantity=new_quantity)
             self.next_item()
 
+    def item_changed(self, item):
+        """Отмечает позицию как измененную и обновляет открытое окно обзора."""
+        self.assembly_index.touch(item)
+        item.pop('recheck', None)  # Позиция перепроверена после обновления отгрузки
+        if self.session_clock is not None:
+            self.session_clock.stamp(item)
+        self.changed_lines.add(item['line_id'])
+        if hasattr(self, 'review_window') and self.review_window.winfo_exists() and self.review_window.winfo_viewable():
+            self.review_window.refresh_tree()
+
     def on_next_box(self):
-        self.current_box += 1
+        closed_box = self.current_box
+        self.current_box = self.session_clock.next_box(self.current_box)
+        self.track('box', box=closed_box)
+        self.print_box_label(closed_box)
         self.box_label.config(text=f"Коробка №{self.current_box}")
         messagebox.showinfo("Новая коробка", f"Начата сборка в коробку №{self.current_box}")
 
+    def print_box_label(self, box):
+        """Этикетка закрытой коробки на принтер из OFFLINE_ASSEMBLER_LABELS, в фоновом потоке."""
+        records = collected_records(self.assembly_index.box_items(box))
+        if records:
+            self.label_executor.submit(self.write_box_label, self.shipment_info, box, records)
+
+    def write_box_label(self, shipment_info, box, records):
+        try:
+            print_box_label(shipment_info, box, records)
+        except Exception as e:
+            # Без принтера сборка продолжается; сообщение показывается из потока интерфейса
+            message = f"Этикетка коробки №{box} не напечатана: {e}"
+            self.root.after(0, lambda: self.progress_label.config(text=message))
+
     def save_session(self):
         filepath = filedialog.asksaveasfilename(
             title="Сохранить прогресс сборки",
@@ -298,6 +441,7 @@ class AssemblyApp:
             "current_box": self.current_box,
             "shipment_info": self.shipment_info,
             "input_file_path": self.input_file_path,
+            "clock": self.session_clock.to_dict() if self.session_clock is not None else None,
         }
         
         try:
@@ -320,10 +464,15 @@ class AssemblyApp:
                 session_data = pickle.load(f)
             
             self.assembly_items = session_data["assembly_items"]
+            self.assembly_index = AssemblyIndex(self.assembly_items)
+            self.changed_lines.clear()
             self.current_item_index = session_data["current_item_index"]
+            self.return_index = None
             self.current_box = session_data["current_box"]
             self.shipment_info = session_data["shipment_info"]
             self.input_file_path = session_data["input_file_path"]
+            self.session_clock = SessionClock.for_session(session_data)
+            self.open_telemetry()
             
             self.update_ui_for_new_file()
             self.display_current_item()
@@ -333,34 +482,128 @@ class AssemblyApp:
             messagebox.showerror("Ошибка загрузки", f"Не удалось загрузить сессию:\n{e}")
             self.reset_state()
             
+    def on_merge_session(self):
+        filepath = filedialog.askopenfilename(
+            title="Сессия другого устройства",
+            filetypes=(("Файлы сборки", "*.assm-save"), ("All files", "*.*"))
+        )
+        if not filepath:
+            return
+
+        try:
+            with open(filepath, "rb") as f:
+                other_session = pickle.load(f)
+            result = merge_sessions({
+                "assembly_items": self.assembly_items,
+                "current_item_index": self.current_item_index,
+                "current_box": self.current_box,
+                "shipment_info": self.shipment_info,
+                "input_file_path": self.input_file_path,
+                "clock": self.session_clock.to_dict() if self.session_clock is not None else None,
+            }, other_session)
+        except Exception as e:
+            messagebox.showerror("Ошибка объединения", f"Не удалось объединить сессии:\n{e}")
+            return
+
+        self.assembly_items = result.session_data["assembly_items"]
+        self.assembly_index = AssemblyIndex(self.assembly_items)
+        self.changed_lines.clear()
+        self.current_item_index = result.session_data["current_item_index"]
+        self.return_index = None
+        self.current_box = result.session_data["current_box"]
+        self.session_clock = SessionClock.for_session(result.session_data)
+        if hasattr(self, 'review_window') and self.review_window.winfo_exists():
+            self.review_window.populate_tree()
+
+        self.box_label.config(text=f"Коробка №{self.current_box}")
+        self.display_current_item()
+
+        notes = result.box_notes() + [conflict.describe() for conflict in result.conflicts]
+        message = f"Сессии объединены. Конфликтов: {len(result.conflicts)}"
+        if notes:
+            shown = notes[:30]
+            if len(notes) > len(shown):
+                shown.append(f"... и еще {len(notes) - len(shown)}")
+            message += "\n\n" + "\n".join(shown)
+        messagebox.showinfo("Объединение", message)
+
+    def on_reimport_manifest(self):
+        filepath = filedialog.askopenfilename(
+            title="Обновленный файл отгрузки",
+            filetypes=(("Excel files", "*.xlsx *.xls"), ("All files", "*.*"))
+        )
+        if not filepath:
+            return
+
+        try:
+            orders, shipment_info = ExcelProcessor(filepath).process_file()
+            result = reimport_manifest({
+                "assembly_items": self.assembly_items,
+                "current_item_index": self.current_item_index,
+                "current_box": self.current_box,
+                "shipment_info": self.shipment_info,
+                "input_file_path": self.input_file_path,
+                "clock": self.session_clock.to_dict() if self.session_clock is not None else None,
+            }, orders, shipment_info)
+        except Exception as e:
+            messagebox.showerror("Ошибка обновления", f"Не удалось обновить отгрузку:\n{e}")
+            return
+
+        self.assembly_items = result.session_data["assembly_items"]
+        self.assembly_index = AssemblyIndex(self.assembly_items)
+        self.changed_lines.clear()
+        self.input_file_path = filepath
+        self.current_item_index = result.session_data["current_item_index"]
+        self.return_index = None
+        self.session_clock = SessionClock.for_session(result.session_data)
+        if hasattr(self, 'review_window') and self.review_window.winfo_exists():
+            self.review_window.populate_tree()
+        self.display_current_item()
+
+        message = f"Отгрузка обновлена.\n{result.summary()}"
+        notes = result.notes()
+        if notes:
+            shown = notes[:30]
+            if len(notes) > len(shown):
+                shown.append(f"... и еще {len(notes) - len(shown)}")
+            message += "\n\n" + "\n".join(shown)
+        messagebox.showinfo("Обновление отгрузки", message)
+
+    def write_shift_report(self):
+        if self.telemetry is None or not self.telemetry.events:
+            return None
+        return self.telemetry.write_report(
+            self.shipment_info, str(Path(self.input_file_path).parent), Path(self.input_file_path).stem
+        )
+
+    def on_shift_report(self):
+        try:
+            report_path = self.write_shift_report()
+            if report_path:
+                messagebox.showinfo("Отчет смены", f"Отчет сохранен в файл:\n{report_path}")
+        except Exception as e:
+            messagebox.showerror("Ошибка сохранения", f"Не удалось сохранить отчет:\n{e}")
+
+    def on_toggle_profiling(self):
+        if self.profiling_var.get():
+            log_path = profiling.enable()
+            messagebox.showinfo("Профилирование", f"Журнал профилирования:\n{log_path}")
+        else:
+            profiling.disable()
+
     def open_review_window(self):
         if not hasattr(self, 'review_window') or not self.review_window.winfo_exists():
             self.review_window = ReviewWindow(self)
+        else:
+            self.review_window.refresh_tree()
         self.review_window.deiconify()
 
     def finish_assembly(self):
         if hasattr(self, 'review_window') and self.review_window.winfo_exists():
             self.review_window.destroy()
 
-        collected_data = [
-            {
-                'box': item['box'],
-                'article': item['article'],
-                'name': item['name'],
-                'quantity': item['collected_quantity'],
-                'barcode': item.get('barcode', '')
-            }
-            for item in self.assembly_items if item['status'] in ['collected', 'quantity_changed'] and item['collected_quantity'] > 0
-        ]
-
-        discrepancies = []
-        for item in self.assembly_items:
-            identifier = item.get('barcode') or f"Арт: {item['article']}"
-            
-            if item['status'] == 'skipped':
-                discrepancies.append(f"Пропущено: {identifier} - {item['quantity']} шт.")
-            elif item['status'] == 'quantity_changed' and item['collected_quantity'] != item['quantity']:
-                 discrepancies.append(f"Изменено: {identifier} было {item['quantity']}, стало {item['collected_quantity']}")
+        collected_data = collected_records(self.assembly_items)
+        discrepancies = discrepancy_notes(self.assembly_items)
 
         if not collected_data and not discrepancies:
             messagebox.showwarning("Сборка пуста", "Нет данных для сохранения.")
@@ -368,15 +611,16 @@ class AssemblyApp:
             return
             
         try:
-            writer = ExcelWriter(
-                collected_data=collected_data,
-                shipment_info=self.shipment_info,
-                discrepancies=discrepancies,
-                original_file_path=self.input_file_path
-            )
-            output_filename = writer.generate_final_file()
+            output_filename = write_result(self.assembly_items, self.shipment_info, self.input_file_path)
+            self.print_box_label(self.current_box)  # Последняя коробка закрывается завершением
             
             summary_message = f"Сборка завершена!\n\nФайл сохранен как:\n{output_filename}"
+            try:
+                report_path = self.write_shift_report()
+                if report_path:
+                    summary_message += f"\n\nОтчет смены:\n{report_path}"
+            except Exception as e:
+                print(f"Shift report error: {e}")  # Отчет не должен мешать сохранению результата
             if discrepancies:
                 summary_message += "\n\nОбнаружены расхождения:\n" + "\n".join(discrepancies)
             
@@ -390,6 +634,15 @@ class AssemblyApp:
 
 
 class ReviewWindow(tk.Toplevel):
+    ALL_LABEL = "Все"
+
+    STATUS_MAP = {
+        'pending': 'В ожидании',
+        'collected': 'Собрано',
+        'skipped': 'Пропущено',
+        'quantity_changed': 'Кол-во изменено'
+    }
+
     def __init__(self, master):
         super().__init__(master.root)
         self.master_app = master
@@ -402,10 +655,44 @@ class ReviewWindow(tk.Toplevel):
 
         self.protocol("WM_DELETE_WINDOW", self.withdraw)
 
+        self.rendered = {}  # iid -> значения, показанные в таблице
+        self.visible = []  # iid строк, прошедших фильтр, в порядке сборки
         self.create_widgets()
         self.populate_tree()
 
     def create_widgets(self):
+        filter_frame = ttk.Frame(self, padding=(10, 10, 10, 0))
+        filter_frame.pack(fill="x")
+
+        self.status_filter_var = tk.StringVar(value=self.ALL_LABEL)
+        self.box_filter_var = tk.StringVar(value=self.ALL_LABEL)
+        self.location_filter_var = tk.StringVar()
+        self.search_var = tk.StringVar()
+
+        ttk.Label(filter_frame, text="Статус:").pack(side="left")
+        status_filter = ttk.Combobox(
+            filter_frame, textvariable=self.status_filter_var, state="readonly", width=16,
+            values=[self.ALL_LABEL] + list(self.STATUS_MAP.values())
+        )
+        status_filter.pack(side="left", padx=(2, 10))
+
+        ttk.Label(filter_frame, text="Коробка:").pack(side="left")
+        self.box_filter = ttk.Combobox(
+            filter_frame, textvariable=self.box_filter_var, state="readonly", width=6,
+            postcommand=self.update_box_choices
+        )
+        self.box_filter.pack(side="left", padx=(2, 10))
+
+        ttk.Label(filter_frame, text="Ячейка:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.location_filter_var, width=10).pack(side="left", padx=(2, 10))
+
+        ttk.Label(filter_frame, text="Артикул / ШК:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.search_var, width=14).pack(side="left", padx=(2, 0))
+
+        # Фильтр пересчитывается по индексам на каждое изменение поля
+        for var in (self.status_filter_var, self.box_filter_var, self.location_filter_var, self.search_var):
+            var.trace_add("write", lambda *_: self.apply_filter())
+
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(fill="both", expand=True)
 
@@ -438,62 +725,162 @@ class ReviewWindow(tk.Toplevel):
         edit_button = ttk.Button(button_frame, text="Редактировать выбранное", command=self.edit_selected_item)
         edit_button.pack(side="left", padx=5)
 
-        refresh_button = ttk.Button(button_frame, text="Обновить", command=self.populate_tree)
+        refresh_button = ttk.Button(button_frame, text="Обновить", command=self.refresh_tree)
         refresh_button.pack(side="left", padx=5)
         
         close_button = ttk.Button(button_frame, text="Закрыть", command=self.withdraw)
         close_button.pack(side="right", padx=5)
 
+    def row_values(self, item):
+        status = self.STATUS_MAP.get(item['status'], 'Неизвестно')
+        box = item['box'] if item['box'] > 0 else "-"
+        return (
+            status,
+            item['article'],
+            item['name'],
+            item['quantity'],
+            item['collected_quantity'],
+            box
+        )
+
+    @profiled("ReviewWindow.populate_tree")
     def populate_tree(self):
+        """Полностью перестраивает таблицу. Нужно только при смене списка позиций."""
         selected_item = self.tree.focus()
         
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
-        status_map = {
-            'pending': 'В ожидании',
-            'collected': 'Собрано',
-            'skipped': 'Пропущено',
-            'quantity_changed': 'Кол-во изменено'
-        }
-
-        for item in self.master_app.assembly_items:
-            status = status_map.get(item['status'], 'Неизвестно')
-            box = item['box'] if item['box'] > 0 else "-"
-            values = (
-                status,
-                item['article'],
-                item['name'],
-                item['quantity'],
-                item['collected_quantity'],
-                box
-            )
-            self.tree.insert("", "end", values=values, iid=item['article'])
+        # Скрытые фильтром строки не входят в get_children, удаляем по списку отрисованных
+        if self.rendered:
+            self.tree.delete(*self.rendered)
+        self.rendered = {}
+        self.source_items = self.master_app.assembly_items
+        self.master_app.changed_lines.clear()
+
+        for item in self.source_items:
+            iid = str(item['line_id'])
+            values = self.row_values(item)
+            self.tree.insert("", "end", values=values, iid=iid)
+            self.rendered[iid] = values
+        self.visible = list(self.rendered)
+        self.apply_filter()
         
         if selected_item and self.tree.exists(selected_item):
             self.tree.focus(selected_item)
             self.tree.selection_set(selected_item)
 
+    def refresh_tree(self):
+        """Применяет к таблице только строки, измененные с прошлого обновления."""
+        if self.source_items is not self.master_app.assembly_items:
+            self.populate_tree()
+            return
+
+        changed_lines = self.master_app.changed_lines
+        items_by_line = self.master_app.assembly_index.by_line
+        while changed_lines:
+            line_id = changed_lines.pop()
+            item = items_by_line.get(line_id)
+            if item is None:
+                continue
+            iid = str(line_id)
+            values = self.row_values(item)
+            if self.rendered.get(iid) != values:
+                self.tree.item(iid, values=values)
+                self.rendered[iid] = values
+        # Статус или коробка могли выйти за пределы фильтра
+        self.apply_filter()
+
+    def update_box_choices(self):
+        boxes = self.master_app.assembly_index.boxes()
+        self.box_filter.configure(values=[self.ALL_LABEL] + [str(box) for box in boxes])
+
+    def apply_filter(self):
+        """Показывает только подходящие строки, переставляя лишь те, что изменили видимость."""
+        if self.source_items is not self.master_app.assembly_items:
+            return
+
+        status_by_label = {label: status for status, label in self.STATUS_MAP.items()}
+        box_label = self.box_filter_var.get()
+        positions = self.master_app.assembly_index.query(
+            status=status_by_label.get(self.status_filter_var.get()),
+            box=int(box_label) if box_label.isdigit() else None,
+            location=self.location_filter_var.get(),
+            text=self.search_var.get()
+        )
+        visible = [str(self.source_items[pos]['line_id']) for pos in positions]
+
+        shown = set(visible)
+        hidden = [iid for iid in self.visible if iid not in shown]
+        if hidden:
+            self.tree.detach(*hidden)
+        previously_shown = set(self.visible)
+        for index, iid in enumerate(visible):
+            if iid not in previously_shown:
+                self.tree.move(iid, "", index)
+        self.visible = visible
+
     def edit_selected_item(self):
         selected_iid = self.tree.focus()
         if not selected_iid:
             messagebox.showwarning("Нет выбора", "Пожалуйста, выберите товар для редактирования.")
             return
         
-        selected_item_data = None
-        for item in self.master_app.assembly_items:
-            if item['article'] == selected_iid:
-                selected_item_data = item
-                break
+        selected_item_data = self.master_app.assembly_index.by_line.get(int(selected_iid))
         
         if selected_item_data:
             dialog = EditItemDialog(self, "Редактировать позицию", selected_item_data)
             if dialog.result:
-                self.master_app.assembly_items[self.master_app.assembly_items.index(selected_item_data)] = dialog.result
-                self.populate_tree()
+                selected_item_data.update(dialog.result)
+                self.master_app.item_changed(selected_item_data)
+                self.refresh_tree()
                 self.master_app.display_current_item()
 
 
+class ItemSearchDialog(simpledialog.Dialog):
+    """Поиск позиции для перехода на экране сборки; result - индекс выбранной позиции."""
+
+    def __init__(self, parent, app):
+        self.app = app
+        super().__init__(parent, "Найти позицию")
+
+    def body(self, master):
+        self.result = None
+
+        style = ttk.Style()
+        dark_bg = style.lookup("TFrame", "background")
+        master.configure(bg=dark_bg)
+
+        ttk.Label(master, text="Наименование, артикул или последние цифры штрихкода:").grid(row=0, sticky="w")
+        self.query_var = tk.StringVar()
+        query_entry = ttk.Entry(master, textvariable=self.query_var, width=60)
+        query_entry.grid(row=1, sticky="ew")
+        # Индексы слов и штрихкодов построены при загрузке, поэтому поиск идет на каждое нажатие
+        self.query_var.trace_add("write", lambda *_: self.on_search())
+
+        self.results = ttk.Treeview(master, columns=("#1", "#2", "#3", "#4"), show="headings", height=12)
+        for column, text, width in (("#1", "Наименование", 260), ("#2", "Ячейка", 80),
+                                    ("#3", "Артикул", 100), ("#4", "Штрихкод", 90)):
+            self.results.heading(column, text=text)
+            self.results.column(column, width=width, anchor="w")
+        self.results.grid(row=2, sticky="nsew", pady=(5, 0))
+        self.results.bind("<Double-1>", lambda _: self.ok())
+
+        return query_entry
+
+    def on_search(self):
+        self.results.delete(*self.results.get_children())
+        for pos in search_items(self.app.assembly_index, self.query_var.get()):
+            item = self.app.assembly_items[pos]
+            display = self.app.assembly_index.display.get(pos)
+            name = display.name
+            if item['status'] != 'pending':
+                name += f" ({ReviewWindow.STATUS_MAP.get(item['status'], item['status'])})"
+            values = (name, display.location or '-', item['article'], f"...{display.short_barcode}")
+            self.results.insert("", "end", values=values, iid=str(pos))
+
+    def apply(self):
+        selected = self.results.focus() or next(iter(self.results.get_children()), "")
+        self.result = int(selected) if selected else None
+
+
 class EditItemDialog(simpledialog.Dialog):
     def __init__(self, parent, title, item_data):
         self.item = item_data.copy()
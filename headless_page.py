@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from ui_metrics import count_controls
+
+
+class HeadlessClientStorage:
+    """Замена page.client_storage, хранящая значения в памяти."""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.data.get(key)
+
+    def set(self, key: str, value: Any) -> bool:
+        self.data[key] = value
+        return True
+
+    def contains_key(self, key: str) -> bool:
+        return key in self.data
+
+    def remove(self, key: str) -> bool:
+        return self.data.pop(key, None) is not None
+
+    def clear(self) -> bool:
+        self.data.clear()
+        return True
+
+
+class HeadlessPage:
+    """
+    Минимальная замена ft.Page для запуска AssemblyApp без клиента Flet.
+    Вместо отправки изменений считает, сколько контролов попало в каждое
+    обновление - это приблизительная стоимость диффа на реальной странице.
+    """
+
+    def __init__(self):
+        self.controls: List[Any] = []
+        self.overlay: List[Any] = []
+        self.dialogs: List[Any] = []
+        self.client_storage = HeadlessClientStorage()
+        self.snack_bar = None
+        self.update_log: List[Dict[str, Any]] = []
+        self.tasks: List[Any] = []  # Задачи run_task, запущенные внутри цикла событий
+
+    def _record(self, kind: str, *controls):
+        started = time.perf_counter()
+        size = count_controls(*controls)
+        self.update_log.append({
+            "kind": kind,
+            "controls": size,
+            "seconds": time.perf_counter() - started,
+        })
+
+    def update(self, *controls):
+        if not controls:
+            controls = tuple(self.controls) + tuple(self.overlay) + (self.snack_bar,)
+        self._record("update", *controls)
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+        self._record("add", *controls)
+
+    def clean(self):
+        self.controls.clear()
+
+    def open(self, control):
+        control.open = True
+        self.dialogs.append(control)
+        self._record("open", control)
+
+    def close(self, control):
+        control.open = False
+        self._record("close", control)
+
+    def run_task(self, handler, *args, **kwargs):
+        """Как page.run_task: внутри цикла событий ставит задачу, вне его выполняет сразу."""
+        coroutine = handler(*args, **kwargs)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        task = loop.create_task(coroutine)
+        self.tasks.append(task)
+        return task
+
+    def run_thread(self, handler, *args):
+        handler(*args)
+
+    def share(self, **kwargs):
+        pass
+
+    def set_clipboard(self, value: str):
+        pass
+
+    def launch_url(self, url: str, **kwargs):
+        pass
+
+    @property
+    def last_dialog(self):
+        return self.dialogs[-1] if self.dialogs else None
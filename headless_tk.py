@@ -0,0 +1,249 @@
+"""
+Замена tkinter для запуска gui_app без дисплея (нагрузочный прогон,
+проверки в CI). install() подменяет модули tkinter в sys.modules и
+возвращает функцию, которая возвращает настоящие; gui_app после install()
+импортируется заново, уже с заглушками.
+
+Виджеты ничего не рисуют: config() и изменения таблицы записываются в
+render_log с числом затронутых виджетов или строк, как HeadlessPage
+делает для Flet. Диалоги не ждут пользователя: ответы берутся из очереди
+answers (файловые диалоги, askinteger), а simpledialog.Dialog вызывает
+dialog_hook(dialog) перед apply().
+"""
+import sys
+import types
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+render_log: List[Dict[str, Any]] = []
+answers = deque()  # Ответы диалогов по порядку вызова
+messages: List[tuple] = []  # (вид, заголовок, текст) из messagebox
+dialog_hook: Optional[Callable[[Any], None]] = None
+
+
+def _record(kind: str, size: int = 1):
+    render_log.append({"kind": kind, "controls": size, "seconds": 0.0})
+
+
+def _answer(default=None):
+    return answers.popleft() if answers else default
+
+
+class Variable:
+    def __init__(self, master=None, value=None):
+        self.value = value
+        self.traces = []
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+        for callback in self.traces:
+            callback()
+
+    def trace_add(self, mode, callback):
+        self.traces.append(callback)
+
+
+class StringVar(Variable):
+    def __init__(self, master=None, value=""):
+        super().__init__(master, value)
+
+
+class IntVar(Variable):
+    def __init__(self, master=None, value=0):
+        super().__init__(master, value)
+
+
+class BooleanVar(Variable):
+    def __init__(self, master=None, value=False):
+        super().__init__(master, value)
+
+
+class Widget:
+    """Любой виджет: хранит параметры, геометрия и привязки ничего не делают."""
+
+    def __init__(self, master=None, *args, **kwargs):
+        self.master = master
+        self.options = dict(kwargs)
+        self.alive = True
+        self.viewable = True
+
+    def config(self, *args, **kwargs):
+        if kwargs:
+            self.options.update(kwargs)
+            _record("config")
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key)
+
+    def __getattr__(self, name):
+        # pack, grid, bind, title, geometry, protocol, add_command и прочее
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+    def after(self, ms, func=None, *args):
+        return None  # Без цикла событий отложенные вызовы не выполняются
+
+    def winfo_exists(self):
+        return self.alive
+
+    def winfo_viewable(self):
+        return self.alive and self.viewable
+
+    def destroy(self):
+        self.alive = False
+
+    def withdraw(self):
+        self.viewable = False
+
+    def deiconify(self):
+        self.viewable = True
+
+    def lookup(self, *args):
+        return ""
+
+
+class Tk(Widget):
+    pass
+
+
+class Toplevel(Widget):
+    pass
+
+
+class Treeview(Widget):
+    """Таблица со строками в памяти: сколько строк изменено каждым вызовом, видно в render_log."""
+
+    def __init__(self, master=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.rows: Dict[str, tuple] = {}
+        self.order: List[str] = []  # Прикрепленные строки по порядку
+        self.focused = ""
+
+    def insert(self, parent, index, values=(), iid=None):
+        self.rows[iid] = tuple(values)
+        self.order.append(iid)
+        _record("tree.insert")
+        return iid
+
+    def item(self, iid, values=None):
+        if values is None:
+            return {"values": self.rows[iid]}
+        self.rows[iid] = tuple(values)
+        _record("tree.item")
+
+    def delete(self, *iids):
+        gone = set(iids)
+        for iid in iids:
+            self.rows.pop(iid, None)
+        self.order = [iid for iid in self.order if iid not in gone]
+        _record("tree.delete", len(iids))
+
+    def detach(self, *iids):
+        gone = set(iids)
+        self.order = [iid for iid in self.order if iid not in gone]
+        _record("tree.detach", len(iids))
+
+    def move(self, iid, parent, index):
+        if iid in self.order:
+            self.order.remove(iid)
+        self.order.insert(index, iid)
+        _record("tree.move")
+
+    def exists(self, iid):
+        return iid in self.rows
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+    def selection_set(self, *iids):
+        pass
+
+
+class Dialog(Widget):
+    """simpledialog.Dialog: body(), затем dialog_hook вместо пользователя, затем apply()."""
+
+    def __init__(self, parent, title=None):
+        super().__init__(parent)
+        self.result = None
+        self.body(Widget(self))
+        if dialog_hook is not None:
+            dialog_hook(self)
+            self.apply()
+
+
+def _message(kind):
+    def show(title="", message="", **kwargs):
+        messages.append((kind, title, message))
+        return _answer(True) if kind.startswith("ask") else "ok"
+    return show
+
+
+def _module(name: str, **attributes) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+# gui_app, импортированный с заглушками, держит ссылки на них и выгружается вместе с ними
+MODULES = ("tkinter", "tkinter.ttk", "tkinter.messagebox", "tkinter.filedialog", "tkinter.simpledialog", "gui_app")
+
+
+def install() -> Callable[[], None]:
+    """
+    Подменяет tkinter и его подмодули. Возвращает функцию отмены: она
+    возвращает прежние модули в sys.modules. Повторный вызов ничего не
+    меняет, его отмена тоже.
+    """
+    if getattr(sys.modules.get("tkinter"), "HEADLESS", False):
+        return lambda: None
+    saved = {name: sys.modules.pop(name, None) for name in MODULES}
+    widgets = {name: type(name, (Widget,), {}) for name in (
+        "Frame", "Label", "Button", "Entry", "Combobox", "Spinbox", "Scrollbar", "Separator",
+        "Menubutton", "Menu", "Style",
+    )}
+    ttk = _module("tkinter.ttk", Treeview=Treeview, **widgets)
+    messagebox = _module("tkinter.messagebox", **{kind: _message(kind) for kind in (
+        "showinfo", "showwarning", "showerror", "askyesno", "askokcancel",
+    )})
+    filedialog = _module(
+        "tkinter.filedialog",
+        askopenfilename=lambda **kwargs: _answer(""),
+        asksaveasfilename=lambda **kwargs: _answer(""),
+        askdirectory=lambda **kwargs: _answer(""),
+    )
+    simpledialog = _module(
+        "tkinter.simpledialog",
+        Dialog=Dialog,
+        askinteger=lambda *args, **kwargs: _answer(None),
+        askstring=lambda *args, **kwargs: _answer(None),
+    )
+    tkinter = _module(
+        "tkinter", HEADLESS=True, Tk=Tk, Toplevel=Toplevel, Menu=widgets["Menu"],
+        StringVar=StringVar, IntVar=IntVar, BooleanVar=BooleanVar,
+        BOTH="both", X="x", Y="y", LEFT="left", RIGHT="right", TOP="top", BOTTOM="bottom",
+        ttk=ttk, messagebox=messagebox, filedialog=filedialog, simpledialog=simpledialog,
+    )
+    sys.modules.update({
+        "tkinter": tkinter, "tkinter.ttk": ttk, "tkinter.messagebox": messagebox,
+        "tkinter.filedialog": filedialog, "tkinter.simpledialog": simpledialog,
+    })
+
+    def uninstall():
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    return uninstall
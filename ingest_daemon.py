@@ -0,0 +1,334 @@
+"""
+Фоновый разбор отгрузок, попадающих в папку "входящие" (почта, выгрузка из 1С).
+
+Запуск: python ingest_daemon.py ПАПКА [--workers 2] [--settle 2] [--interval 1] [--polling]
+
+Новые .xlsx/.xlsm/.xls файлы разбираются ExcelProcessor в пуле процессов,
+рядом с каждым пишется готовая к сборке сессия <имя>.assm-save: ее можно
+сразу открыть в приложении без разбора на устройстве.
+
+- Недописанные файлы: файл берется в работу, только когда его размер и время
+  изменения не менялись --settle секунд; если разбор все же не удался, а файл
+  за это время изменился, он ставится в очередь снова.
+- Повторные события об одном файле склеиваются тем же ожиданием.
+- Файлы с уже разобранным содержимым (по SHA-256) пропускаются; журнал
+  хранится в папке в .ingest_index.json.
+- Сессия перезаписывается только такой, какой ее записал демон (хэш
+  записанного файла есть в журнале); сессия с прогрессом сборки остается,
+  новая пишется рядом под именем с частью хэша отгрузки.
+- Изменения отслеживаются через inotify (Linux), иначе - опросом папки
+  раз в --interval секунд.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import pickle
+import select
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+MANIFEST_SUFFIXES = ('.xlsx', '.xlsm', '.xls')
+SESSION_SUFFIX = '.assm-save'
+INDEX_NAME = '.ingest_index.json'
+HASH_CHUNK = 1024 * 1024
+
+Signature = Tuple[int, int]  # (размер, время изменения в нс)
+
+
+def is_manifest(path: Path) -> bool:
+    # ~$файл.xlsx - файл блокировки Excel, скрытые и временные файлы тоже не отгрузки
+    return path.suffix.lower() in MANIFEST_SUFFIXES and not path.name.startswith(('~$', '.'))
+
+
+def signature(path: Path) -> Optional[Signature]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- Источники изменений ---
+
+class PollingSource:
+    """Опрос папки: сравнивает размер и время изменения файлов с прошлым проходом."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.snapshot: Dict[Path, Signature] = {}
+
+    def changes(self, timeout: float) -> Set[Path]:
+        if self.snapshot:
+            time.sleep(timeout)
+        current = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_file() and is_manifest(path):
+                    stat = entry.stat()
+                    current[path] = (stat.st_size, stat.st_mtime_ns)
+        changed = {path for path, sig in current.items() if self.snapshot.get(path) != sig}
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """
+    Изменения от inotify через ctypes, без сторонних пакетов. Первый вызов
+    changes() возвращает файлы, которые уже лежали в папке.
+    """
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch")
+        self.directory = directory
+        self.started = False
+
+    def changes(self, timeout: float) -> Set[Path]:
+        if not self.started:
+            self.started = True
+            return {path for path in self.directory.iterdir() if path.is_file() and is_manifest(path)}
+
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                path = self.directory / os.fsdecode(name)
+                if name and is_manifest(path):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_source(directory: Path, polling: bool = False):
+    if not polling:
+        try:
+            return InotifySource(directory)
+        except (OSError, AttributeError):
+            pass  # Не Linux или inotify недоступен
+    return PollingSource(directory)
+
+
+# --- Задание пула ---
+
+def ingest_manifest(manifest_path: str, session_path: str, device: str) -> Dict[str, Any]:
+    """Разбирает отгрузку и пишет сессию, какую приложение создает при открытии файла."""
+    from assembly_state import ensure_line_ids
+    from excel_processor import ExcelProcessor
+    from session_merge import SessionClock
+
+    processor = ExcelProcessor(manifest_path)
+    orders, shipment_info = processor.process_file()
+    items = [{**order, 'status': 'pending', 'collected_quantity': 0, 'box': 0} for order in orders]
+    ensure_line_ids(items)
+    # Коробка 1 открыта одной отметкой, поэтому копии сессии на разных устройствах считают ее общей
+    clock = SessionClock.for_session({}, device)
+    clock.open_box(1)
+
+    session_data = {
+        "assembly_items": items,
+        "current_item_index": 0,
+        "current_box": 1,
+        "shipment_info": shipment_info,
+        "input_file_path": manifest_path,
+        "output_directory": "",
+        "wave": None,
+        "clock": clock.to_dict(),
+    }
+    tmp_path = session_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(session_data, f)
+    os.replace(tmp_path, session_path)
+    return {"items": len(items), "shipment_info": shipment_info, "report": processor.report.summary()}
+
+
+# --- Демон ---
+
+class IngestIndex:
+    """Журнал разобранных файлов: хэш содержимого -> итог разбора."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            self.entries: Dict[str, Dict[str, Any]] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(digest)
+
+    def written(self, session: str) -> Set[str]:
+        """Хэши, с которыми демон записывал сессию с этим именем."""
+        return {entry['session_hash'] for entry in self.entries.values()
+                if entry.get('session') == session and entry.get('session_hash')}
+
+    def record(self, digest: str, entry: Dict[str, Any]):
+        self.entries[digest] = {**entry, "time": datetime.now().isoformat(timespec="seconds")}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class IngestDaemon:
+    """
+    Следит за папкой и разбирает новые отгрузки в пуле процессов. step()
+    делает один проход (события, запуск готовых файлов, сбор результатов),
+    run() повторяет его до остановки.
+    """
+
+    def __init__(self, inbox: str, workers: int = 2, settle: float = 2.0, interval: float = 1.0,
+                 polling: bool = False, log: Callable[[str], None] = print):
+        from session_merge import device_id
+
+        self.inbox = Path(inbox)
+        self.settle = settle
+        self.interval = interval
+        self.log = log
+        self.device = f"ingest-{device_id()}"
+        self.source = open_source(self.inbox, polling)
+        self.index = IngestIndex(self.inbox / INDEX_NAME)
+        self.pool = ProcessPoolExecutor(max_workers=max(1, workers))
+        self.pending: Dict[Path, Tuple[float, Optional[Signature]]] = {}  # файл -> (последнее изменение, подпись)
+        self.running: Dict[Future, Tuple[Path, str, Signature, Path]] = {}  # задание -> (файл, хэш, подпись, сессия)
+
+    def step(self, timeout: Optional[float] = None):
+        now = time.monotonic()
+        for path in self.source.changes(self.interval if timeout is None else timeout):
+            self.pending[path] = (now, signature(path))
+        now = time.monotonic()
+
+        busy = {path for path, _, _, _ in self.running.values()}
+        for path, (changed_at, sig) in list(self.pending.items()):
+            current = signature(path)
+            if current is None:
+                del self.pending[path]  # Файл удален или переименован
+            elif current != sig:
+                self.pending[path] = (now, current)  # Еще пишется: ждем заново
+            elif now - changed_at >= self.settle and path not in busy:
+                del self.pending[path]
+                self.submit(path, current)
+
+        for future in [f for f in self.running if f.done()]:
+            self.finish(future, *self.running.pop(future))
+
+    def submit(self, path: Path, sig: Signature):
+        try:
+            digest = content_hash(path)
+        except OSError as e:
+            self.log(f"{path.name}: не удалось прочитать ({e})")
+            return
+        known = self.index.get(digest)
+        if known is not None and (known.get('error') or (self.inbox / known['session']).exists()):
+            self.log(f"{path.name}: уже разобран ({known.get('source')}), пропуск")
+            return
+
+        session_path = path.with_suffix(SESSION_SUFFIX)
+        if session_path.exists() and not self.untouched(session_path):
+            # Рядом лежит сессия, записанная или сохраненная не демоном (например, с прогрессом сборки)
+            session_path = path.with_name(f"{path.stem}_{digest[:8]}{SESSION_SUFFIX}")
+        future = self.pool.submit(ingest_manifest, str(path), str(session_path), self.device)
+        self.running[future] = (path, digest, sig, session_path)
+
+    def untouched(self, session_path: Path) -> bool:
+        """Сессия лежит в том виде, в каком ее записал демон."""
+        try:
+            return content_hash(session_path) in self.index.written(session_path.name)
+        except OSError:
+            return False
+
+    def finish(self, future: Future, path: Path, digest: str, sig: Signature, session_path: Path):
+        try:
+            result = future.result()
+        except Exception as e:
+            if signature(path) not in (None, sig):
+                self.pending[path] = (time.monotonic(), signature(path))  # Файл дописывался во время разбора
+                return
+            self.index.record(digest, {"source": path.name, "error": str(e)})
+            self.log(f"{path.name}: ошибка разбора: {e}")
+            return
+        try:
+            session_hash = content_hash(session_path)
+        except OSError:
+            session_hash = ""  # Без хэша сессия не будет перезаписана
+        self.index.record(digest, {"source": path.name, "session": session_path.name, "session_hash": session_hash,
+                                   "items": result["items"]})
+        self.log(f"{path.name} -> {session_path.name}: {result['shipment_info']}, позиций {result['items']}. "
+                 f"{result['report']}")
+
+    def idle(self) -> bool:
+        return not self.pending and not self.running
+
+    def run(self, stop: Optional[threading.Event] = None):
+        self.log(f"Слежу за {self.inbox} ({type(self.source).__name__})")
+        while stop is None or not stop.is_set():
+            self.step()
+
+    def close(self):
+        self.source.close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фоновый разбор отгрузок из папки входящих")
+    parser.add_argument("inbox", help="папка, куда приходят файлы отгрузок")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    parser.add_argument("--settle", type=float, default=2.0, help="сколько секунд файл не должен меняться")
+    parser.add_argument("--interval", type=float, default=1.0, help="период опроса папки, секунд")
+    parser.add_argument("--polling", action="store_true", help="не использовать inotify")
+    args = parser.parse_args()
+
+    daemon = IngestDaemon(args.inbox, args.workers, args.settle, args.interval, args.polling)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Нагрузочный прогон AssemblyApp без интерфейса: сборщик по сценарию
+собирает, пропускает, меняет количество, открывает новые коробки, правит
+строки в обзоре и выгружает промежуточный файл на отгрузках от 1000 до
+100000 позиций. Для каждого действия печатаются перцентили времени, а
+также время автосохранения и отрисовки внутри действий.
+
+Запуск: python load_test.py [кол-во позиций ...] [--app flet|tk] [--actions 300] [--seed 1]
+По умолчанию 1000, 10000 и 100000 позиций в flet_app.
+
+flet_app работает на HeadlessPage (client_storage в памяти), gui_app - на
+заглушках tkinter из headless_tk. В gui_app нет автосохранения и
+промежуточного файла: вместо выгрузки там сохраняется файл сборки
+(save_session), и его время идет в автосохранение.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from assembly_state import AssemblyIndex
+from telemetry import PickTelemetry
+
+ACTIONS = ("collect", "skip", "quantity", "box", "review_edit", "export")
+WEIGHTS = (80, 6, 6, 3, 5, 0)  # Выгрузка - не случайно, а каждые export_every действий
+PARTS = ("autosave", "render")
+
+
+def make_items(count: int):
+    return [
+        {
+            "name": f"Товар {i} 46000000{i:05d}",
+            "quantity": 1 + i % 5,
+            "article": f"ART-{i}",
+            "location": f"A-{i // 100:03d}-{i % 100:02d}",
+            "barcode": f"46000000{i:05d}",
+            "sheet": "Лист1",
+            "status": "pending",
+            "collected_quantity": 0,
+            "box": 0,
+            "line_id": i,
+        }
+        for i in range(count)
+    ]
+
+
+def make_script(actions: int, seed: int = 1, export_every: int = 100) -> List[str]:
+    """Одинаковый для обоих приложений порядок действий сборщика."""
+    rng = random.Random(seed)
+    script = rng.choices(ACTIONS, weights=WEIGHTS, k=actions)
+    for n in range(export_every - 1, actions, export_every):
+        script[n] = "export"
+    return script
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+class LatencyRecorder:
+    """Время действий и их частей; вложенные вызовы одной части считаются один раз."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.parts: Dict[str, float] = {}
+        self.depth: Dict[str, int] = defaultdict(int)
+
+    def wrap(self, obj, name: str, part: str):
+        original = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            self.depth[part] += 1
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.depth[part] -= 1
+                if not self.depth[part]:
+                    self.parts[part] = self.parts.get(part, 0.0) + time.perf_counter() - started
+
+        setattr(obj, name, timed)
+
+    def measure(self, action: str, func: Callable[[], None]):
+        self.parts = {}
+        started = time.perf_counter()
+        func()
+        self.samples[action].append(time.perf_counter() - started)
+        for part, seconds in self.parts.items():
+            self.samples[f"{action}.{part}"].append(seconds)
+            self.samples[part].append(seconds)
+
+    def rows(self):
+        for name in ACTIONS + PARTS:
+            values = self.samples.get(name)
+            if not values:
+                continue
+            row = {
+                "name": name,
+                "count": len(values),
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+            for part in PARTS:
+                row[f"{part}_p95_ms"] = percentile(self.samples.get(f"{name}.{part}", []), 0.95) * 1000
+            yield row
+
+
+class FletDriver:
+    """flet_app.AssemblyApp на HeadlessPage."""
+
+    def __init__(self, items, recorder: LatencyRecorder, output_directory: str):
+        from flet_app import AssemblyApp
+        from headless_page import HeadlessPage
+
+        self.page = HeadlessPage()
+        self.app = app = AssemblyApp(self.page)
+        app.assembly_items = items
+        app.assembly_index = AssemblyIndex(items)
+        app.shipment_info = "Отгрузка №1 от 01-01-2025"
+        app.input_file_path = str(Path(output_directory) / "load test.xlsx")
+        app.output_directory = output_directory
+        app.start_session_clock()
+        app.telemetry = PickTelemetry()  # Журнал в памяти, без файла
+        app.start_assembly()
+
+        recorder.wrap(app, "autosave_session", "autosave")
+        for name in ("update_item_display", "refresh_review_row", "build_review_ui"):
+            recorder.wrap(app, name, "render")
+        self.rng = random.Random(len(items))
+
+    def close(self):
+        self.app.scanner.stop()
+        self.app.executor.shutdown()
+
+    def collect(self):
+        self.app.on_collect(None)
+
+    def skip(self):
+        self.app.on_skip(None)
+
+    def quantity(self):
+        app = self.app
+        app.on_change_qty(None)
+        qty_field, box_field = app.qty_dialog.content.controls
+        qty_field.value = str(max(0, app.assembly_items[app.current_item_index]["quantity"] - 1))
+        box_field.value = str(app.current_box)  # У несобранной строки в поле коробка 0
+        app.qty_dialog.actions[1].on_click(None)
+
+    def box(self):
+        self.app.on_next_box(None)
+
+    def review_edit(self):
+        app = self.app
+        app.build_review_ui()
+        app.on_edit_quantity_only(self.rng.randrange(min(len(app.assembly_items), app.REVIEW_CHUNK_SIZE)))
+        dialog = self.page.last_dialog
+        dialog.content.value = "1"
+        dialog.actions[1].on_click(None)
+        app.start_assembly()
+
+    def export(self):
+        asyncio.run(self.app.generate_excel_file(mark_uncollected=True))
+
+
+class TkDriver:
+    """gui_app.AssemblyApp на заглушках tkinter."""
+
+    def __init__(self, items, recorder: LatencyRecorder, output_directory: str):
+        import headless_tk
+        self.uninstall = headless_tk.install()
+        import gui_app
+
+        self.headless = headless_tk
+        self.recorder = recorder
+        self.output_directory = output_directory
+        self.app = app = gui_app.AssemblyApp(gui_app.tk.Tk())
+        app.assembly_items = items
+        app.assembly_index = AssemblyIndex(items)
+        app.shipment_info = "Отгрузка №1 от 01-01-2025"
+        app.input_file_path = str(Path(output_directory) / "load test.xlsx")
+        app.session_clock = gui_app.SessionClock.for_session({})
+        app.session_clock.open_box(app.current_box)
+        app.telemetry = PickTelemetry()
+        app.update_ui_for_new_file()
+        app.display_current_item()
+
+        recorder.wrap(app, "save_session", "autosave")
+        recorder.wrap(app, "display_current_item", "render")
+        self.rng = random.Random(len(items))
+
+    def close(self):
+        self.headless.dialog_hook = None
+        self.app.label_executor.shutdown()
+        self.uninstall()  # Настоящий tkinter для остального процесса (например, других тестов)
+
+    def collect(self):
+        self.app.on_collect()
+
+    def skip(self):
+        self.app.on_skip()
+
+    def quantity(self):
+        app = self.app
+        self.headless.answers.append(max(0, app.assembly_items[app.current_item_index]["quantity"] - 1))
+        app.on_change_quantity()
+
+    def box(self):
+        self.app.on_next_box()
+
+    def review_edit(self):
+        app = self.app
+        first = not hasattr(app, "review_window")
+        app.open_review_window()
+        window = app.review_window
+        if first:
+            for name in ("refresh_tree", "populate_tree"):
+                self.recorder.wrap(window, name, "render")
+        window.tree.focus(str(self.rng.randrange(len(app.assembly_items))))
+        self.headless.dialog_hook = lambda dialog: dialog.quantity_var.set(1)
+        window.edit_selected_item()
+        window.withdraw()
+
+    def export(self):
+        self.headless.answers.append(str(Path(self.output_directory) / "load test.assm-save"))
+        self.app.save_session()
+
+
+DRIVERS = {"flet": FletDriver, "tk": TkDriver}
+
+
+def run(count: int, app: str = "flet", actions: int = 300, seed: int = 1, export_every: int = 100) -> LatencyRecorder:
+    recorder = LatencyRecorder()
+    with tempfile.TemporaryDirectory() as output_directory:
+        driver = DRIVERS[app](make_items(count), recorder, output_directory)
+        try:
+            for action in make_script(actions, seed, export_every):
+                recorder.measure(action, getattr(driver, action))
+        finally:
+            driver.close()
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон сборки без интерфейса")
+    parser.add_argument("counts", nargs="*", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--app", choices=sorted(DRIVERS), default="flet")
+    parser.add_argument("--actions", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for count in args.counts:
+        print(f"\n{args.app}: {count} позиций, {args.actions} действий")
+        print(f"{'действие':<12} {'раз':>5} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}"
+              f" {'автосохр. p95':>14} {'отрисовка p95':>14}")
+        for r in run(count, args.app, args.actions, args.seed).rows():
+            print(f"{r['name']:<12} {r['count']:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}"
+                  f" {r['max_ms']:>9.2f} {r['autosave_p95_ms']:>14.2f} {r['render_p95_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Файлы отгрузок для тестов и замеров: заголовок отгрузки в первой строке,
+названия колонок в пятой, позиции с шестой - как в выгрузках, которые
+разбирает ExcelProcessor.
+"""
+import io
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import openpyxl
+
+SHIPMENT = "Отгрузка № 77 от 01.02.2025"
+COLUMNS = ("Наименование товара", "Количество", "Артикул", "Ячейка", "Штрихкод")
+
+
+def fill_sheet(ws, rows: Iterable[Sequence] = (), shipment_info: Optional[str] = SHIPMENT,
+               columns: Sequence[str] = COLUMNS):
+    """Заполняет пустой лист (в том числе write_only): строки 1-4, колонки в 5-й, позиции дальше."""
+    ws.append([shipment_info] if shipment_info else [])
+    for _ in range(3):
+        ws.append([])
+    ws.append(list(columns))
+    for row in rows:
+        ws.append(list(row))
+
+
+def manifest_workbook(rows: Iterable[Sequence] = (), shipment_info: Optional[str] = SHIPMENT,
+                      write_only: bool = False) -> openpyxl.Workbook:
+    wb = openpyxl.Workbook(write_only=write_only)
+    fill_sheet(wb.create_sheet() if write_only else wb.active, rows, shipment_info)
+    return wb
+
+
+def manifest_bytes(rows: Iterable[Sequence] = (), shipment_info: Optional[str] = SHIPMENT) -> bytes:
+    buffer = io.BytesIO()
+    manifest_workbook(rows, shipment_info).save(buffer)
+    return buffer.getvalue()
+
+
+def write_manifest(path, rows: Iterable[Sequence] = (), shipment_info: Optional[str] = SHIPMENT) -> str:
+    """Пишет отгрузку в path; большие отгрузки пишутся потоково (write_only)."""
+    manifest_workbook(rows, shipment_info, write_only=True).save(path)
+    return str(Path(path))
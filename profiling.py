@@ -0,0 +1,197 @@
+"""
+Профилирование горячих путей по запросу. Переменная окружения
+OFFLINE_ASSEMBLER_PROFILE (или переключатель в приложении) включает запись
+интервалов времени в ротируемый журнал, который можно приложить к отчету
+об ошибке. Значение - список режимов через запятую:
+    spans        - только интервалы (по умолчанию, также "1")
+    cprofile     - дамп cProfile для каждого интервала верхнего уровня
+    tracemalloc  - прирост и пик памяти в каждом интервале
+Пока профилирование выключено, обертка стоит один вызов функции.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from telemetry import app_data_dir
+
+ENV_FLAG = "OFFLINE_ASSEMBLER_PROFILE"
+MODES = ("spans", "cprofile", "tracemalloc")
+MAX_LOG_BYTES = 1_000_000
+BACKUP_COUNT = 3
+MAX_PROFILE_DUMPS = 5
+
+_enabled = False
+_modes = frozenset()
+_logger: Optional[logging.Logger] = None
+_log_dir: Optional[Path] = None
+_local = threading.local()  # Глубина вложенности интервалов в текущем потоке
+
+
+def default_profile_dir() -> Path:
+    return app_data_dir() / "profile"
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def log_files() -> List[Path]:
+    """Файлы журнала и дампы cProfile, которые стоит приложить к отчету."""
+    if _log_dir is None or not _log_dir.exists():
+        return []
+    return sorted(p for p in _log_dir.iterdir() if p.name.startswith("profile.log") or p.suffix == ".prof")
+
+
+def enable(modes: Iterable[str] = ("spans",), log_dir: Optional[Path] = None) -> Path:
+    """Включает профилирование и возвращает путь к журналу."""
+    global _enabled, _modes, _logger, _log_dir
+
+    _modes = frozenset(m for m in modes if m in MODES) | {"spans"}
+    _log_dir = Path(log_dir or default_profile_dir())
+    _log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = _log_dir / "profile.log"
+
+    if _logger is None:
+        _logger = logging.getLogger("offline_assembler.profile")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    handler = RotatingFileHandler(log_path, maxBytes=MAX_LOG_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+
+    if "tracemalloc" in _modes:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    _enabled = True
+    _write({"event": "enabled", "modes": sorted(_modes)})
+    return log_path
+
+
+def disable():
+    global _enabled
+    if not _enabled:
+        return
+    _write({"event": "disabled"})
+    _enabled = False
+    if "tracemalloc" in _modes:
+        import tracemalloc
+        tracemalloc.stop()
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+
+
+def configure_from_env():
+    value = os.environ.get(ENV_FLAG, "").strip().lower()
+    if not value or value in ("0", "false", "no"):
+        return
+    modes = [m.strip() for m in value.split(",")]
+    enable(modes)
+
+
+def _write(record: dict):
+    record.setdefault("ts", datetime.now().isoformat(timespec="milliseconds"))
+    _logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def _dump_cprofile(profiler, name: str):
+    path = _log_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{name.replace('.', '_')}.prof"
+    profiler.dump_stats(path)
+    dumps = sorted(_log_dir.glob("*.prof"))
+    for old in dumps[:-MAX_PROFILE_DUMPS]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+class span:
+    """Интервал времени с именем; используется как with span("имя"): ..."""
+
+    __slots__ = ("name", "started", "profiler", "memory")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        if not _enabled:
+            return self
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+
+        self.profiler = None
+        self.memory = None
+        if depth == 0 and "cprofile" in _modes:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if "tracemalloc" in _modes:
+            import tracemalloc
+            if depth == 0:
+                tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.started is None:
+            return False
+        elapsed = time.perf_counter() - self.started
+        _local.depth = getattr(_local, "depth", 1) - 1
+        if self.profiler is not None:
+            self.profiler.disable()
+        if not _enabled:
+            return False
+
+        record = {
+            "span": self.name,
+            "ms": round(elapsed * 1000, 3),
+            "depth": _local.depth,
+            "thread": threading.current_thread().name,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if self.memory is not None:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            record["alloc_kb"] = round((current - self.memory) / 1024, 1)
+            record["peak_kb"] = round(peak / 1024, 1)
+        if self.profiler is not None:
+            record["cprofile"] = _dump_cprofile(self.profiler, self.name).name
+        _write(record)
+        return False
+
+
+def note(name: str, **fields):
+    """Отдельная запись в журнал (например, задержка события ввода), если профилирование включено."""
+    if _enabled:
+        _write({"note": name, **fields})
+
+
+def profiled(name: Optional[str] = None):
+    """Декоратор: оборачивает функцию в span с ее именем (или заданным)."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+configure_from_env()
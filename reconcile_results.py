@@ -0,0 +1,150 @@
+"""
+Сверка файла результата сборки (_сборка_) с исходной заявкой.
+
+Запуск: python reconcile_results.py РЕЗУЛЬТАТ ЗАЯВКА [--out ФАЙЛ.xlsx|ФАЙЛ.csv]
+
+Результат читается по раскладке ExcelWriter: блоки «КОРОБКА №N» по
+четыре колонки (Кол-во, Артикул, Штрихкод). Заявка разбирается тем же
+ExcelProcessor, что и при загрузке в приложение, а штрихкоды результата
+проходят ту же нормализацию (в результатах старых сессий бывают коды с
+".0" или точкой в начале). Строки сопоставляются по штрихкоду и артикулу
+операциями над таблицами целиком (группировка и внешнее соединение), без
+цикла по позициям. В отчет попадают строки, где собрано меньше заявки,
+больше заявки и чего в заявке нет, с номерами коробок. По умолчанию
+отчет пишется рядом с результатом в «<имя>_сверка.xlsx».
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from excel_processor import ExcelProcessor, normalize_barcodes, read_rows
+
+BOX_HEADER = re.compile(r'КОРОБКА №(\d+)')
+KEY = ["barcode", "article"]
+
+MISSING = "Не хватает"
+OVER = "Лишнее"
+UNEXPECTED = "Нет в заявке"
+REPORT_COLUMNS = {
+    "kind": "Расхождение",
+    "barcode": "Штрихкод",
+    "article": "Артикул",
+    "name": "Наименование",
+    "expected": "По заявке",
+    "picked": "Собрано",
+    "difference": "Разница",
+    "boxes": "Коробки",
+}
+
+
+def read_result(path: str) -> Tuple[str, pd.DataFrame]:
+    """Отгрузка из первой строки и собранные строки: box, quantity, article, barcode."""
+    frame = pd.DataFrame(list(read_rows(Path(path))), dtype=object)
+    if frame.empty:
+        raise ValueError("Файл результата пуст")
+    shipment_info = frame.iat[0, 0] or ""
+
+    first_column = frame[0].fillna("")
+    starts = frame.index[first_column.str.fullmatch(BOX_HEADER.pattern)]
+    if not len(starts):
+        raise ValueError("Не найдены коробки: это не файл результата сборки")
+    header_row = starts[0]
+    boxes = frame.iloc[header_row].fillna("").str.extract(f"^{BOX_HEADER.pattern}$")[0].dropna()
+
+    blocks = []
+    data = frame.iloc[header_row + 2:]
+    for column, box in boxes.items():
+        block = data.iloc[:, column:column + 3].set_axis(["quantity", "article", "barcode"], axis=1)
+        block = block[block["quantity"].notna()].assign(box=int(box))
+        blocks.append(block)
+    picked = pd.concat(blocks, ignore_index=True)
+    picked["quantity"] = pd.to_numeric(picked["quantity"]).astype(int)
+    picked[KEY] = picked[KEY].fillna("")
+    # В результатах старых сессий коды бывают вида "4600000000017.0" и ".4600000000017"
+    picked["barcode"] = normalize_barcodes(picked["barcode"])
+    return shipment_info, picked
+
+
+def read_manifest(path: str) -> Tuple[str, pd.DataFrame]:
+    orders, shipment_info = ExcelProcessor(path).process_file()
+    return shipment_info, pd.DataFrame(orders, columns=["name", "quantity", "article", "barcode"])
+
+
+def reconcile(manifest: pd.DataFrame, picked: pd.DataFrame) -> pd.DataFrame:
+    """
+    Расхождения заявки и результата по ключу (штрихкод, артикул). Повторы
+    ключа в заявке и в коробках суммируются. Строки идут в порядке заявки,
+    строки не из заявки - в конце.
+    """
+    expected = manifest.groupby(KEY, sort=False).agg(name=("name", "first"), expected=("quantity", "sum"))
+    expected["order"] = np.arange(len(expected))
+    collected = picked.groupby(KEY, sort=False).agg(picked=("quantity", "sum"))
+    collected["extra_order"] = np.arange(len(collected))
+
+    joined = expected.join(collected, how="outer")
+    in_manifest = joined["expected"].notna()
+    joined["order"] = joined["order"].fillna(len(expected) + joined["extra_order"])
+    joined[["expected", "picked"]] = joined[["expected", "picked"]].fillna(0).astype(int)
+    joined["name"] = joined["name"].fillna("")
+    joined["difference"] = joined["picked"] - joined["expected"]
+    joined["kind"] = np.select(
+        [~in_manifest, joined["difference"] < 0, joined["difference"] > 0],
+        [UNEXPECTED, MISSING, OVER],
+        default="",
+    )
+    report = joined[joined["kind"] != ""].sort_values("order").reset_index()
+
+    # Коробки только для строк отчета
+    pairs = picked[KEY + ["box"]].drop_duplicates().merge(report[KEY], on=KEY).sort_values("box")
+    boxes = pairs.assign(box=pairs["box"].astype(str)).groupby(KEY)["box"].agg(", ".join).rename("boxes")
+    report = report.merge(boxes, left_on=KEY, right_index=True, how="left")
+    report["boxes"] = report["boxes"].fillna("")
+    return report[list(REPORT_COLUMNS)]
+
+
+def summary(report: pd.DataFrame) -> str:
+    parts = []
+    for kind in (MISSING, OVER, UNEXPECTED):
+        rows = report[report["kind"] == kind]
+        if len(rows):
+            parts.append(f"{kind.lower()}: {len(rows)} строк, {rows['difference'].abs().sum()} шт.")
+    return "; ".join(parts) if parts else "расхождений нет"
+
+
+def write_report(report: pd.DataFrame, path: str) -> str:
+    """Отчет в .csv (разделитель «;», открывается в Excel) или листом «Сверка» в .xlsx."""
+    table = report.rename(columns=REPORT_COLUMNS)
+    if Path(path).suffix.lower() == ".csv":
+        table.to_csv(path, sep=";", index=False, encoding="utf-8-sig")
+    else:
+        table.to_excel(path, sheet_name="Сверка", index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка файла результата сборки с исходной заявкой")
+    parser.add_argument("result", help="файл результата (_сборка_)")
+    parser.add_argument("manifest", help="исходный файл заявки")
+    parser.add_argument("--out", help="файл отчета .xlsx или .csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result_shipment, picked = read_result(args.result)
+    manifest_shipment, manifest = read_manifest(args.manifest)
+    if result_shipment != manifest_shipment:
+        print(f"Внимание: в результате «{result_shipment}», в заявке «{manifest_shipment}»")
+    report = reconcile(manifest, picked)
+    result_path = Path(args.result)
+    out = args.out or str(result_path.with_name(f"{result_path.stem}_сверка.xlsx"))
+    write_report(report, out)
+    print(f"Сверка: {summary(report)}")
+    print(f"Отчет: {out} ({time.perf_counter() - started:.1f} с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Пересоздание итоговых файлов из сохраненных сессий сборки: после смены
+шаблона результата или если файл результата потерян.
+
+Запуск: python regenerate_results.py СЕССИЯ_ИЛИ_ПАПКА ... [--out ПАПКА] [--workers 2]
+
+Принимает файлы .assm-save (сохранение из приложений и ingest_daemon) и
+.json (выгрузка автосохранения); для папок берутся все такие файлы в ней.
+Каждая сессия обрабатывается в пуле процессов тем же write_result, что и
+завершение сборки в приложении (волна - как после раскладки), поэтому
+листы результата совпадают с файлом, записанным приложением. Оставшиеся
+необработанными позиции попадают в файл пропущенными, как при досрочном
+завершении. Папка результата - --out, иначе папка из сессии, иначе папка
+исходного файла.
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SESSION_SUFFIXES = ('.assm-save', '.json')
+
+
+def read_session(path: str) -> Dict[str, Any]:
+    if Path(path).suffix.lower() == '.json':
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def session_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(str(p) for p in path.iterdir() if p.is_file() and p.suffix.lower() in SESSION_SUFFIXES)
+        else:
+            files.append(str(path))
+    return files
+
+
+def write_session_results(session_data: Dict[str, Any], output_directory: Optional[str] = None) -> List[str]:
+    """Итоговые файлы сессии, как их пишет приложение при завершении сборки."""
+    from assembly_state import skip_uncollected, write_result
+    from wave_picking import Wave
+
+    output_directory = output_directory or session_data.get("output_directory") or None
+    if session_data.get("wave"):
+        wave = Wave.from_dict(session_data["wave"], session_data["assembly_items"])
+        if not wave.allocated:
+            raise ValueError("Волна еще не разложена по отгрузкам")
+        results = wave.write_results(output_directory)
+        errors = [f"{r['shipment_info']}: {r['error']}" for r in results if r['error']]
+        if errors:
+            raise ValueError("; ".join(errors))
+        return [r['path'] for r in results]
+    # Незавершенную сессию приложение закрывает досрочным завершением: необработанное - пропущено
+    return [write_result(skip_uncollected(session_data["assembly_items"]), session_data["shipment_info"],
+                         session_data["input_file_path"], output_directory)]
+
+
+def warm_up():
+    """Инициализатор пула: импорт pandas/openpyxl не входит во время первого файла."""
+    import excel_processor  # noqa: F401
+
+
+def regenerate(session_path: str, output_directory: Optional[str] = None) -> Dict[str, Any]:
+    """Задание пула: одна сессия, с временем чтения и записи."""
+    started = time.perf_counter()
+    result = {"session": session_path, "paths": [], "error": None, "read_ms": 0.0, "write_ms": 0.0}
+    try:
+        session_data = read_session(session_path)
+        read_done = time.perf_counter()
+        result["read_ms"] = (read_done - started) * 1000
+        result["paths"] = write_session_results(session_data, output_directory)
+        result["write_ms"] = (time.perf_counter() - read_done) * 1000
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересоздание итоговых файлов из сохраненных сессий")
+    parser.add_argument("sessions", nargs="+", help="файлы .assm-save/.json или папки с ними")
+    parser.add_argument("--out", help="папка для итоговых файлов")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    files = session_files(args.sessions)
+    if not files:
+        parser.error("не найдено файлов сессий")
+
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=warm_up) as pool:
+        futures = [pool.submit(regenerate, path, args.out) for path in files]
+        for future in as_completed(futures):
+            result = future.result()
+            name = Path(result["session"]).name
+            if result["error"]:
+                failed += 1
+                print(f"{name}: ошибка: {result['error']}")
+                continue
+            outputs = ", ".join(Path(p).name for p in result["paths"])
+            print(f"{name}: чтение {result['read_ms']:.0f} мс, запись {result['write_ms']:.0f} мс -> {outputs}")
+    print(f"Сессий: {len(files)}, ошибок: {failed}, всего {time.perf_counter() - started:.1f} с")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Ввод со сканера штрихкодов, подключенного как клавиатура.
+
+Сканер присылает символы кода очередью нажатий и завершает код клавишей
+Enter (или Tab), быстрее, чем приложение успевает собрать позицию. Поэтому
+нажатия не обрабатываются сразу: ScanPipeline.feed() складывает символы в
+код, готовые коды встают в ограниченную очередь, а обработчик забирает их
+по одному, по порядку и не чаще раза в min_interval секунд.
+
+- Код без терминатора заканчивается паузой длиннее gap секунд.
+- Когда очередь полна, feed() не отбрасывает код: поток, который его
+  передал, ждет места (при отдельном потоке обработки) или сам
+  обрабатывает старые коды (при обработке через pump()).
+- stats() и report() показывают глубину очереди, число ожиданий и задержку
+  от первого символа до конца обработки кода.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from statistics import median
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import profiling
+
+TERMINATORS = frozenset(("Enter", "Return", "Tab", "\r", "\n", "\t"))
+SCAN_GAP = 0.08  # Символы одного кода идут с интервалом в единицы миллисекунд
+SCAN_INTERVAL = 0.05
+MAX_PENDING = 32
+LATENCY_WINDOW = 500
+
+
+class Scan(NamedTuple):
+    code: str
+    started: float  # время первого символа
+
+
+class ScanPipeline:
+    """
+    Буфер между нажатиями клавиш и логикой сборки. handle(code) вызывается
+    либо из своего потока (start()), либо из pump() в потоке интерфейса
+    (Tk, где обращаться к виджетам из других потоков нельзя).
+    """
+
+    def __init__(self, handle: Callable[[str], None], gap: float = SCAN_GAP, min_interval: float = SCAN_INTERVAL,
+                 max_pending: int = MAX_PENDING, clock: Callable[[], float] = time.monotonic):
+        self.handle = handle
+        self.gap = gap
+        self.min_interval = min_interval
+        self.clock = clock
+        self.queue: "queue.Queue[Scan]" = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()  # Символы текущего кода
+        self.chars: List[str] = []
+        self.first = self.last = 0.0
+        self.put_lock = threading.RLock()  # Порядок кодов в очереди, даже если feed() ждет места
+
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.handled = 0
+        self.max_depth = 0
+        self.waits = 0  # сколько раз очередь была полна и источник ждал
+        self.last_handled = 0.0
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    # --- Источник: нажатия ---
+
+    def feed(self, key: str, t: Optional[float] = None):
+        """Нажатие клавиши от обработчика интерфейса: символ кода, терминатор или служебная клавиша."""
+        if key.startswith("Numpad "):
+            key = key[len("Numpad "):]
+        t = self.clock() if t is None else t
+        with self.lock:
+            ready = self.take_expired(t)
+            if key in TERMINATORS:
+                if self.chars:
+                    ready.append(self.take())
+            elif len(key) == 1:
+                if not self.chars:
+                    self.first = t
+                self.chars.append(key)
+                self.last = t
+            # Shift, стрелки и прочие клавиши не входят в код
+            if not ready:
+                return
+            self.put_lock.acquire()  # До выхода из lock: следующий код не обгонит этот
+        try:
+            for scan in ready:
+                self.put(scan)
+        finally:
+            self.put_lock.release()
+
+    def take(self) -> Scan:
+        scan = Scan("".join(self.chars), self.first)
+        self.chars = []
+        return scan
+
+    def take_expired(self, now: float) -> List[Scan]:
+        """Код без терминатора, после которого была пауза длиннее gap."""
+        if self.chars and now - self.last > self.gap:
+            return [self.take()]
+        return []
+
+    def put(self, scan: Scan):
+        try:
+            self.queue.put_nowait(scan)
+        except queue.Full:
+            self.waits += 1
+            if self.thread is None:
+                self.pump(limit=1, paced=False)  # Обработка в потоке источника вместо потери кода
+                self.queue.put_nowait(scan)
+            else:
+                self.queue.put(scan)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def flush(self):
+        """Отдает в очередь недописанный код, если пауза после него уже истекла."""
+        if not self.put_lock.acquire(blocking=False):
+            return  # Источник сам кладет код в очередь; пауза будет проверена в следующий раз
+        try:
+            with self.lock:
+                ready = self.take_expired(self.clock())
+            for scan in ready:
+                self.put(scan)
+        finally:
+            self.put_lock.release()
+
+    # --- Обработка ---
+
+    def process(self, scan: Scan):
+        try:
+            self.handle(scan.code)
+        except Exception as ex:
+            print(f"Scan handler error: {ex}")  # Ошибка одного кода не останавливает ввод
+        self.last_handled = self.clock()
+        latency = self.last_handled - scan.started
+        self.latencies.append(latency)
+        self.handled += 1
+        profiling.note("scan", depth=self.queue.qsize(), latency_ms=round(latency * 1000, 1))
+
+    def pump(self, limit: Optional[int] = None, paced: bool = True) -> int:
+        """Обрабатывает готовые коды в текущем потоке; с paced=True - не чаще min_interval."""
+        self.flush()
+        done = 0
+        while limit is None or done < limit:
+            if paced and self.clock() - self.last_handled < self.min_interval:
+                break
+            try:
+                scan = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.process(scan)
+            done += 1
+        return done
+
+    def start(self):
+        """Обработка в отдельном потоке (Flet: обработчики событий и так идут не в главном потоке)."""
+        self.thread = threading.Thread(target=self.run, name="scan-input", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            wait = self.min_interval - (self.clock() - self.last_handled)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                scan = self.queue.get(timeout=self.gap)
+            except queue.Empty:
+                self.flush()
+                continue
+            self.process(scan)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    # --- Отчет ---
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "handled": self.handled,
+            "waits": self.waits,
+            "median_ms": median(latencies) * 1000 if latencies else 0.0,
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"Сканер: обработано {s['handled']}, в очереди {s['depth']} (макс. {s['max_depth']}), "
+                f"ожиданий {s['waits']}, задержка медиана {s['median_ms']:.0f} мс, "
+                f"95% {s['p95_ms']:.0f} мс, макс. {s['max_ms']:.0f} мс")
@@ -0,0 +1,322 @@
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from telemetry import app_data_dir
+
+# Поля позиции, которые меняются во время сборки и участвуют в слиянии
+MERGE_FIELDS = ('status', 'collected_quantity', 'box')
+NO_CLOCK = (0, '')
+
+
+def device_id() -> str:
+    """Постоянный идентификатор устройства; создается при первом обращении."""
+    path = app_data_dir() / "device_id"
+    try:
+        value = path.read_text(encoding="utf-8").strip()
+        if value:
+            return value
+    except OSError:
+        pass
+    value = uuid.uuid4().hex[:8]
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(value, encoding="utf-8")
+    except OSError:
+        pass  # Без записи идентификатор живет до перезапуска
+    return value
+
+
+def clock_of(stamp) -> Tuple[int, str]:
+    return (int(stamp[0]), str(stamp[1])) if stamp else NO_CLOCK
+
+
+class SessionClock:
+    """
+    Часы Лэмпорта сессии сборки. Каждое изменение позиции получает отметку
+    [счетчик, устройство], открытие коробки - тоже. В seen хранится вектор
+    версий: до какого счетчика известны изменения каждого устройства.
+    По нему слияние отличает одновременные правки от последовательных.
+    """
+
+    def __init__(self, device: str, counter: int = 0, seen: Optional[Dict[str, int]] = None,
+                 boxes: Optional[Dict[str, list]] = None):
+        self.device = device
+        self.counter = counter
+        self.seen = dict(seen or {})
+        self.boxes = dict(boxes or {})  # номер коробки (строкой, для JSON) -> отметка открытия
+
+    @classmethod
+    def for_session(cls, session_data: Dict[str, Any], device: Optional[str] = None) -> "SessionClock":
+        """Часы загруженной сессии; сессии без часов (старые файлы) начинают с нуля."""
+        data = session_data.get("clock") or {}
+        stamps = (item.get('clock') for item in session_data.get("assembly_items", []))
+        counter = max(data.get("counter", 0), max((stamp[0] for stamp in stamps if stamp), default=0))
+        return cls(device or device_id(), counter, data.get("seen"), data.get("boxes"))
+
+    def tick(self) -> List[Any]:
+        self.counter += 1
+        self.seen[self.device] = self.counter
+        return [self.counter, self.device]
+
+    def stamp(self, item: Dict[str, Any]):
+        item['clock'] = self.tick()
+
+    def open_box(self, box: int):
+        self.boxes[str(box)] = self.tick()
+
+    def next_box(self, current_box: int) -> int:
+        """Номер следующей коробки: после слияния он не совпадает с коробками других устройств."""
+        box = max([current_box] + [int(b) for b in self.boxes]) + 1
+        self.open_box(box)
+        return box
+
+    def knows(self, stamp) -> bool:
+        """Известно ли изменение с этой отметкой (было ли оно видно этой сессии)."""
+        counter, device = clock_of(stamp)
+        return counter == 0 or self.seen.get(device, 0) >= counter
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counter": self.counter, "seen": self.seen, "boxes": self.boxes}
+
+
+class MergeConflict(NamedTuple):
+    line_id: int
+    article: str
+    location: str
+    kept: str
+    dropped: str
+
+    def describe(self) -> str:
+        return f"{self.location or '-'} · Арт: {self.article}: оставлено «{self.kept}», отброшено «{self.dropped}»"
+
+
+class MergeResult(NamedTuple):
+    session_data: Dict[str, Any]
+    conflicts: List[MergeConflict]
+    our_boxes: Dict[int, int]  # перенумерованные коробки текущей сессии: старый номер -> новый
+    their_boxes: Dict[int, int]  # то же для второй сессии
+
+    def box_notes(self) -> List[str]:
+        notes = [f"Коробка №{old} этого устройства теперь №{new}" for old, new in sorted(self.our_boxes.items())]
+        notes += [f"Коробка №{old} другого устройства теперь №{new}" for old, new in sorted(self.their_boxes.items())]
+        return notes
+
+
+STATUS_TEXT = {
+    'pending': 'не обработано',
+    'collected': 'собрано',
+    'skipped': 'пропущено',
+    'quantity_changed': 'изменено',
+}
+
+
+def describe_state(item: Dict[str, Any]) -> str:
+    text = STATUS_TEXT.get(item['status'], item['status'])
+    if item['status'] in ('collected', 'quantity_changed'):
+        text += f" {item['collected_quantity']} шт., коробка {item['box']}"
+    return text
+
+
+def reconcile_boxes(ours: SessionClock, theirs: SessionClock,
+                    our_items: List[Dict[str, Any]], their_items: List[Dict[str, Any]]) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """
+    Коробки с одинаковым номером, открытые на разных устройствах одновременно,
+    - это разные коробки. Коробка, открытая раньше (по отметке), сохраняет номер,
+    другая получает следующий свободный. Возвращает перенумерацию коробок
+    текущей и второй сессии; правило симметрично, поэтому порядок слияния не важен.
+    """
+    used = {int(box) for box in ours.boxes} | {int(box) for box in theirs.boxes}
+    used |= {item['box'] for item in our_items} | {item['box'] for item in their_items}
+    next_free = max(used, default=0) + 1
+
+    renumber_ours, renumber_theirs = {}, {}
+    for box in sorted(set(ours.boxes) & set(theirs.boxes), key=int):
+        our_stamp, their_stamp = clock_of(ours.boxes[box]), clock_of(theirs.boxes[box])
+        if our_stamp == their_stamp or ours.knows(their_stamp) or theirs.knows(our_stamp):
+            continue  # Одна сессия продолжила другую: это та же коробка
+        target = renumber_theirs if our_stamp < their_stamp else renumber_ours
+        target[int(box)] = next_free
+        next_free += 1
+    return renumber_ours, renumber_theirs
+
+
+def merge_sessions(ours_data: Dict[str, Any], theirs_data: Dict[str, Any],
+                   device: Optional[str] = None) -> MergeResult:
+    """
+    Сливает сессию другого устройства в текущую. Для каждой позиции
+    побеждает более позднее изменение по часам Лэмпорта (при равенстве -
+    по идентификатору устройства), поэтому результат не зависит от порядка
+    и повторное слияние ничего не меняет. Если обе сессии изменили позицию,
+    не видя изменений друг друга, и результаты различаются, это конфликт:
+    он решается тем же правилом и возвращается для показа пользователю.
+    Копии без отметок (файлы старых версий) сравниваются по значениям
+    полей, и если обе обработаны по-разному, это тоже конфликт.
+    """
+    if ours_data.get("shipment_info") != theirs_data.get("shipment_info"):
+        raise ValueError(
+            f"Сессии относятся к разным отгрузкам: {ours_data.get('shipment_info')} и {theirs_data.get('shipment_info')}"
+        )
+
+    ours = SessionClock.for_session(ours_data, device)
+    theirs = SessionClock.for_session(theirs_data, ours.device)
+    our_items, their_items = ours_data["assembly_items"], theirs_data["assembly_items"]
+
+    renumber_ours, renumber_theirs = reconcile_boxes(ours, theirs, our_items, their_items)
+    their_by_line = {item['line_id']: item for item in their_items if 'line_id' in item}
+
+    merged_items = []
+    conflicts = []
+    for item in our_items:
+        if item['box'] in renumber_ours:
+            item = {**item, 'box': renumber_ours[item['box']]}
+        other = their_by_line.pop(item.get('line_id'), None)
+        if other is None:
+            merged_items.append(dict(item))
+            continue
+        if other['box'] in renumber_theirs:
+            other = {**other, 'box': renumber_theirs[other['box']]}
+
+        our_stamp, their_stamp = item.get('clock'), other.get('clock')
+        if our_stamp == their_stamp and (our_stamp or item['status'] == other['status']):
+            merged_items.append(dict(item))  # Одна и та же версия позиции
+            continue
+
+        our_clock, their_clock = clock_of(our_stamp), clock_of(their_stamp)
+        # Файлы без часов: из двух копий без отметок берется обработанная, затем - по значениям полей,
+        # чтобы результат не зависел от того, какая сессия текущая
+        our_key = (our_clock, item['status'] != 'pending', tuple(item.get(f) for f in MERGE_FIELDS))
+        their_key = (their_clock, other['status'] != 'pending', tuple(other.get(f) for f in MERGE_FIELDS))
+        winner, loser = (item, other) if our_key >= their_key else (other, item)
+        merged_items.append(dict(winner))
+
+        if our_clock != their_clock:
+            concurrent = not ours.knows(their_clock) and not theirs.knows(our_clock)
+        else:  # Обе копии без отметок
+            concurrent = item['status'] != 'pending' and other['status'] != 'pending'
+        if concurrent and any(item.get(f) != other.get(f) for f in MERGE_FIELDS):
+            conflicts.append(MergeConflict(
+                line_id=item['line_id'],
+                article=str(item.get('article', '')),
+                location=str(item.get('location', '')),
+                kept=describe_state(winner),
+                dropped=describe_state(loser),
+            ))
+    for other in their_by_line.values():
+        merged_items.append({**other, 'box': renumber_theirs.get(other['box'], other['box'])})
+
+    # Вектор версий и коробки объединенной сессии
+    merged_clock = SessionClock(ours.device, max(ours.counter, theirs.counter))
+    for clock, renumber in ((ours, renumber_ours), (theirs, renumber_theirs)):
+        for device_name, counter in clock.seen.items():
+            merged_clock.seen[device_name] = max(merged_clock.seen.get(device_name, 0), counter)
+        for box, stamp in clock.boxes.items():
+            target = str(renumber.get(int(box), int(box)))
+            if target not in merged_clock.boxes or clock_of(stamp) > clock_of(merged_clock.boxes[target]):
+                merged_clock.boxes[target] = stamp
+
+    current_box = ours_data.get("current_box", 1)
+    pending = [pos for pos, item in enumerate(merged_items) if item['status'] == 'pending']
+    session_data = {
+        **ours_data,
+        "assembly_items": merged_items,
+        "current_item_index": pending[0] if pending else len(merged_items),
+        "current_box": renumber_ours.get(current_box, current_box),
+        "clock": merged_clock.to_dict(),
+    }
+    return MergeResult(session_data, conflicts, renumber_ours, renumber_theirs)
+
+
+# --- Обновление отгрузки ---
+
+def manifest_key(item: Dict[str, Any]) -> Tuple[str, str]:
+    return item.get('barcode') or '', str(item['article'])
+
+
+class ReimportResult(NamedTuple):
+    session_data: Dict[str, Any]
+    added: int
+    updated: int  # необработанные позиции с новым количеством
+    recheck: List[Dict[str, Any]]  # обработанные позиции с новым количеством, снова в маршруте
+    removed: List[Dict[str, Any]]  # удаленные из отгрузки позиции, которые уже лежат в коробках
+    dropped: int  # удаленные необработанные позиции
+
+    def summary(self) -> str:
+        return (f"Добавлено: {self.added}, изменено: {self.updated + len(self.recheck)}, "
+                f"на перепроверку: {len(self.recheck)}, удалено: {self.dropped + len(self.removed)}")
+
+    def notes(self) -> List[str]:
+        notes = [f"{item.get('location') or '-'} · Арт: {item['article']}: {item['recheck']}" for item in self.recheck]
+        notes += [
+            f"{item.get('location') or '-'} · Арт: {item['article']}: позиции нет в отгрузке, "
+            f"вынуть {item['collected_quantity']} шт. из коробки №{item['box']}"
+            for item in self.removed
+        ]
+        return notes
+
+
+def recheck_note(old: Dict[str, Any], quantity: int) -> str:
+    note = f"количество изменено с {old['quantity']} на {quantity}"
+    if old['status'] == 'skipped':
+        return note + ", ранее пропущено"
+    return note + f", уже собрано {old['collected_quantity']} шт. в коробке №{old['box']}"
+
+
+def reimport_manifest(session_data: Dict[str, Any], orders: List[Dict[str, Any]], shipment_info: str,
+                      device: Optional[str] = None) -> ReimportResult:
+    """
+    Переносит сессию сборки на новую версию файла той же отгрузки.
+    Позиции сопоставляются хэш-соединением по (штрихкод, артикул); если ключ
+    повторяется, повторы сопоставляются по порядку. Порядок позиций берется
+    из нового файла (маршрут), прогресс совпавших позиций сохраняется.
+    Обработанная позиция с новым количеством возвращается в маршрут с
+    пометкой recheck; новые позиции добавляются необработанными.
+    """
+    if shipment_info != session_data.get("shipment_info"):
+        raise ValueError(f"Файл относится к другой отгрузке: {shipment_info}, а собирается {session_data.get('shipment_info')}")
+
+    clock = SessionClock.for_session(session_data, device)
+    old_items = session_data["assembly_items"]
+    by_key: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for item in reversed(old_items):
+        by_key.setdefault(manifest_key(item), []).append(item)  # pop() отдает повторы в исходном порядке
+    next_line = max((item.get('line_id', -1) for item in old_items), default=-1) + 1
+
+    items = []
+    added = updated = 0
+    recheck = []
+    for order in orders:
+        bucket = by_key.get(manifest_key(order))
+        if not bucket:
+            item = {**order, 'status': 'pending', 'collected_quantity': 0, 'box': 0, 'line_id': next_line}
+            next_line += 1
+            clock.stamp(item)
+            added += 1
+        else:
+            old = bucket.pop()
+            item = {**old, **order}  # Наименование, ячейка и количество - из нового файла
+            if old['quantity'] != item['quantity']:
+                if old['status'] == 'pending':
+                    updated += 1
+                else:
+                    item['status'] = 'pending'
+                    item['recheck'] = recheck_note(old, item['quantity'])
+                    recheck.append(item)
+                clock.stamp(item)
+        items.append(item)
+
+    removed, dropped = [], 0
+    for bucket in by_key.values():
+        for item in bucket:
+            if item['status'] in ('collected', 'quantity_changed') and item['collected_quantity'] > 0:
+                removed.append(item)
+            else:
+                dropped += 1
+
+    pending = [pos for pos, item in enumerate(items) if item['status'] == 'pending']
+    session_data = {
+        **session_data,
+        "assembly_items": items,
+        "current_item_index": pending[0] if pending else len(items),
+        "clock": clock.to_dict(),
+    }
+    return ReimportResult(session_data, added, updated, recheck, removed, dropped)
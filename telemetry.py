@@ -0,0 +1,270 @@
+import hashlib
+import os
+import re
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+# Однобуквенные коды действий в журнале
+ACTION_CODES = {
+    'start': 'O',      # экран сборки открыт (в том числе после обзора или перезапуска)
+    'collect': 'C',
+    'skip': 'S',
+    'quantity': 'Q',
+    'box': 'B',        # коробка закрыта; в поле коробки - номер закрытой
+}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+ITEM_ACTIONS = ('collect', 'skip', 'quantity')
+
+# Паузы длиннее этого считаются перерывом и не входят во время сборки
+IDLE_LIMIT = 300.0
+# Сколько последних позиций берется для текущего темпа
+RATE_WINDOW = 30
+
+
+class PickEvent(NamedTuple):
+    t: float
+    action: str
+    line_id: int
+    box: int
+    quantity: int
+    location: str
+
+
+def app_data_dir() -> Path:
+    """Папка данных приложения: хранилище приложения Flet, иначе ~/.offline_assembler."""
+    storage = os.environ.get("FLET_APP_STORAGE_DATA")
+    return Path(storage) if storage else Path.home() / ".offline_assembler"
+
+
+def default_log_dir() -> Path:
+    return app_data_dir() / "telemetry"
+
+
+def session_log_path(shipment_info: str, input_file_path: str, log_dir: Optional[Path] = None) -> Path:
+    """Путь журнала для сборки: один файл на пару (исходный файл, отгрузка)."""
+    key = hashlib.sha1(f"{input_file_path}\n{shipment_info}".encode("utf-8")).hexdigest()[:10]
+    slug = re.sub(r'[^\w.-]+', '_', Path(input_file_path).stem)[:40] or "session"
+    return Path(log_dir or default_log_dir()) / f"{slug}_{key}.picklog"
+
+
+def format_duration(seconds: float) -> str:
+    minutes = int(round(seconds / 60))
+    if minutes >= 60:
+        return f"{minutes // 60} ч {minutes % 60:02d} мин"
+    return f"{max(minutes, 1)} мин"
+
+
+class PickTelemetry:
+    """
+    Журнал действий сборщика. Каждое действие дописывается в файл одной
+    строкой с разделителями-табуляциями, поэтому журнал переживает
+    перезапуск и продолжается при загрузке сохраненной сборки.
+    Из него считаются время на позицию, позиции и единицы в час,
+    время по ячейкам и коробкам и оценка оставшегося времени.
+    """
+
+    def __init__(self, log_path: Optional[Path] = None, fresh: bool = False,
+                 clock: Callable[[], float] = time.time):
+        self.log_path = Path(log_path) if log_path else None
+        self.clock = clock
+        self.events: List[PickEvent] = []
+
+        if self.log_path is not None:
+            if fresh and self.log_path.exists():
+                self.log_path.unlink()
+            elif self.log_path.exists():
+                self.events = self.read_log(self.log_path)
+                self.terminate_last_line()
+
+        # Время последних позиций для оценки оставшегося времени, без пересчета всего журнала
+        self.recent = deque(
+            (gap for event, gap in self.dwell_times() if event.action in ITEM_ACTIONS),
+            maxlen=RATE_WINDOW
+        )
+
+    @staticmethod
+    def read_log(path: Path) -> List[PickEvent]:
+        events = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 6 or parts[1] not in CODE_ACTIONS:
+                    continue  # Недописанная строка после сбоя
+                try:
+                    events.append(PickEvent(float(parts[0]), CODE_ACTIONS[parts[1]], int(parts[2]),
+                                            int(parts[3]), int(parts[4]), parts[5]))
+                except ValueError:
+                    continue
+        return events
+
+    def terminate_last_line(self):
+        """Завершает строку, оборванную при сбое, чтобы следующая запись не склеилась с ней."""
+        with open(self.log_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def record(self, action: str, item: Optional[Dict[str, Any]] = None, box: int = 0, quantity: int = 0):
+        self.append([self.event(action, self.clock(), item, box, quantity)])
+
+    def record_many(self, action: str, items: List[Dict[str, Any]], box: int = 0):
+        """Одно действие над несколькими позициями (вся ячейка): события с общим временем, одна запись в файл."""
+        t = self.clock()
+        self.append([self.event(action, t, item, box, item['collected_quantity']) for item in items])
+
+    @staticmethod
+    def event(action: str, t: float, item: Optional[Dict[str, Any]], box: int, quantity: int) -> PickEvent:
+        return PickEvent(
+            t=t,
+            action=action,
+            line_id=item.get('line_id', -1) if item else -1,
+            box=box,
+            quantity=quantity,
+            location=str(item.get('location', '')).replace("\t", " ").replace("\n", " ") if item else ''
+        )
+
+    def append(self, events: List[PickEvent]):
+        for event in events:
+            if event.action in ITEM_ACTIONS and self.events:
+                gap = event.t - self.events[-1].t
+                if 0 <= gap <= IDLE_LIMIT:
+                    self.recent.append(gap)
+            self.events.append(event)
+
+        if self.log_path is not None:
+            try:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(
+                        f"{event.t:.3f}\t{ACTION_CODES[event.action]}\t{event.line_id}\t{event.box}"
+                        f"\t{event.quantity}\t{event.location}\n"
+                        for event in events
+                    ))
+            except OSError as ex:
+                print(f"Telemetry write error: {ex}")  # Журнал не должен мешать сборке
+
+    def dwell_times(self) -> List[tuple]:
+        """Пары (событие, секунды с предыдущего события) без перерывов длиннее IDLE_LIMIT."""
+        result = []
+        previous = None
+        for event in self.events:
+            if previous is not None and event.action != 'start':
+                gap = event.t - previous.t
+                if 0 <= gap <= IDLE_LIMIT:
+                    result.append((event, gap))
+            previous = event
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        dwell = self.dwell_times()
+        item_dwell = [(e, gap) for e, gap in dwell if e.action in ITEM_ACTIONS]
+        active = sum(gap for _, gap in dwell)
+        lines = sum(1 for e in self.events if e.action in ITEM_ACTIONS)
+        units = sum(e.quantity for e in self.events if e.action in ITEM_ACTIONS)
+        hours = active / 3600
+
+        return {
+            "started": self.events[0].t if self.events else None,
+            "finished": self.events[-1].t if self.events else None,
+            "active_seconds": active,
+            "lines": lines,
+            "units": units,
+            "boxes": sum(1 for e in self.events if e.action == 'box'),
+            "lines_per_hour": lines / hours if hours else 0.0,
+            "units_per_hour": units / hours if hours else 0.0,
+            "seconds_per_line": sum(gap for _, gap in item_dwell) / len(item_dwell) if item_dwell else 0.0,
+        }
+
+    def per_location(self) -> Dict[str, Dict[str, float]]:
+        """Время по ячейкам: число позиций, сумма и среднее время."""
+        grouped = defaultdict(lambda: {"lines": 0, "seconds": 0.0})
+        for event, gap in self.dwell_times():
+            if event.action in ITEM_ACTIONS:
+                row = grouped[event.location or "-"]
+                row["lines"] += 1
+                row["seconds"] += gap
+        return dict(grouped)
+
+    def per_box(self) -> Dict[int, Dict[str, float]]:
+        """
+        Время по коробкам; закрытие коробки относится к закрытой коробке. Ее
+        номер записан в событии: после объединения сессий следующая коробка
+        не обязательно идет сразу за ней.
+        """
+        grouped = defaultdict(lambda: {"lines": 0, "units": 0, "seconds": 0.0})
+        for event, gap in self.dwell_times():
+            if event.action == 'box':
+                grouped[event.box]["seconds"] += gap
+            elif event.action in ITEM_ACTIONS and event.box > 0:
+                row = grouped[event.box]
+                row["lines"] += 1
+                row["units"] += event.quantity
+                row["seconds"] += gap
+        return dict(grouped)
+
+    def remaining_seconds(self, pending: int) -> Optional[float]:
+        """Оценка оставшегося времени по темпу последних позиций; None, пока данных мало."""
+        if len(self.recent) < 3:
+            return None
+        return pending * sum(self.recent) / len(self.recent)
+
+    def eta_text(self, pending: int) -> str:
+        remaining = self.remaining_seconds(pending)
+        if remaining is None or pending <= 0:
+            return ""
+        return f"≈ {format_duration(remaining)}"
+
+    def write_report(self, shipment_info: str, output_directory: str, file_stem: str) -> str:
+        """Сохраняет отчет смены отдельным Excel-файлом рядом с результатом сборки."""
+        import openpyxl  # Тяжелый импорт только при экспорте
+
+        stats = self.stats()
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Отчет смены"
+
+        def when(ts):
+            return datetime.fromtimestamp(ts).strftime("%d.%m.%Y %H:%M") if ts else "-"
+
+        ws.append([shipment_info])
+        ws.append([])
+        for label, value in (
+            ("Начало", when(stats["started"])),
+            ("Окончание", when(stats["finished"])),
+            ("Время сборки, мин", round(stats["active_seconds"] / 60, 1)),
+            ("Позиций", stats["lines"]),
+            ("Единиц", stats["units"]),
+            ("Коробок закрыто", stats["boxes"]),
+            ("Позиций в час", round(stats["lines_per_hour"], 1)),
+            ("Единиц в час", round(stats["units_per_hour"], 1)),
+            ("Секунд на позицию", round(stats["seconds_per_line"], 1)),
+        ):
+            ws.append([label, value])
+
+        ws.append([])
+        ws.append(["Ячейка", "Позиций", "Время, с", "Среднее, с"])
+        for location, row in sorted(self.per_location().items()):
+            ws.append([location, row["lines"], round(row["seconds"], 1), round(row["seconds"] / row["lines"], 1)])
+
+        ws.append([])
+        ws.append(["Коробка", "Позиций", "Единиц", "Время, мин"])
+        for box, row in sorted(self.per_box().items()):
+            ws.append([box, row["lines"], row["units"], round(row["seconds"] / 60, 1)])
+
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+        output_dir = Path(output_directory)
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            output_path = output_dir / f"{file_stem}_смена_{timestamp}.xlsx"
+            wb.save(output_path)
+            return str(output_path)
+        except PermissionError:
+            raise ValueError(f"Нет доступа к папке: {output_dir}")
+        except Exception as e:
+            raise ValueError(f"Ошибка сохранения файла: {e}")
@@ -0,0 +1,158 @@
+import unittest
+from assembly_state import (AssemblyIndex, cell_group, clean_name, collect_positions, ensure_line_ids, search_items,
+                            undo_change)
+
+
+class TestLineIds(unittest.TestCase):
+    def test_duplicate_articles_get_distinct_ids(self):
+        items = [
+            {'article': 'A1', 'status': 'pending'},
+            {'article': 'A1', 'status': 'pending'},
+            {'article': 'A2', 'status': 'pending'},
+        ]
+        by_line = ensure_line_ids(items)
+
+        self.assertEqual(len(by_line), 3)
+        self.assertEqual(len({item['line_id'] for item in items}), 3)
+        for item in items:
+            self.assertIs(by_line[item['line_id']], item)
+
+    def test_existing_ids_are_kept(self):
+        items = [{'line_id': 5}, {'line_id': 2}, {}, {'line_id': 5}]
+        ensure_line_ids(items)
+
+        self.assertEqual(items[0]['line_id'], 5)
+        self.assertEqual(items[1]['line_id'], 2)
+        self.assertEqual(sorted(item['line_id'] for item in items), [2, 5, 6, 7])
+
+
+def make_items():
+    return [
+        {'article': 'KR-100', 'barcode': '4601234561234', 'location': 'A-01-02', 'status': 'pending', 'box': 0},
+        {'article': 'KR-200', 'barcode': '4601234565678', 'location': 'A-01-03', 'status': 'pending', 'box': 0},
+        {'article': 'MX-300', 'barcode': '4601234561299', 'location': 'B-07-01', 'status': 'pending', 'box': 0},
+        {'article': 'kr-100', 'barcode': '.1234', 'location': 'A-02-01', 'status': 'pending', 'box': 0},
+    ]
+
+
+class TestAssemblyIndex(unittest.TestCase):
+    def test_location_prefix_and_search(self):
+        index = AssemblyIndex(make_items())
+
+        self.assertEqual(index.query(location='a-01'), [0, 1])
+        self.assertEqual(index.query(text='kr-1'), [0, 3])
+        self.assertEqual(index.query(text='12'), [0, 2, 3])
+        self.assertEqual(index.query(location='A', text='1234'), [0, 3])
+        self.assertEqual(index.query(), [0, 1, 2, 3])
+
+    def test_status_and_box_follow_touch(self):
+        items = make_items()
+        index = AssemblyIndex(items)
+
+        items[1].update(status='skipped')
+        index.touch(items[1])
+        items[2].update(status='collected', box=2)
+        index.touch(items[2])
+
+        self.assertEqual(index.query(status='skipped'), [1])
+        self.assertEqual(index.query(status='pending'), [0, 3])
+        self.assertEqual(index.query(box=2), [2])
+        self.assertEqual(index.boxes(), [2])
+
+        items[2].update(box=3)
+        index.touch(items[2])
+        self.assertEqual(index.query(box=2), [])
+        self.assertEqual(index.boxes(), [3])
+
+        items[0].update(status='collected', box=3)
+        index.touch(items[0])
+        self.assertEqual(index.box_items(3), [items[0], items[2]])  # В порядке маршрута
+        self.assertEqual(index.box_items(9), [])
+
+    def test_extend_appends_to_indexes(self):
+        items = make_items()
+        index = AssemblyIndex(items[:2])
+        index.items[0].update(status='collected', box=1)
+        index.touch(index.items[0])
+
+        index.extend(items[2:])
+
+        self.assertEqual([item['line_id'] for item in index.items], [0, 1, 2, 3])
+        self.assertEqual(index.query(text='kr-1'), [0, 3])
+        self.assertEqual(index.query(location='b'), [2])
+        self.assertEqual(index.query(status='pending'), [1, 2, 3])
+
+    def test_search_by_name_article_and_barcode_tail(self):
+        items = [
+            {'name': 'Кружка белая', 'article': 'KR-10', 'barcode': '4600000000017', 'status': 'pending', 'box': 0},
+            {'name': 'Кружка синяя', 'article': 'KR-11', 'barcode': '4600000000024', 'status': 'collected', 'box': 1},
+            {'name': 'Тарелка синяя', 'article': 'TR-1', 'barcode': '4600000000031', 'status': 'pending', 'box': 0},
+        ]
+        index = AssemblyIndex(items[:2])
+        index.extend(items[2:])
+
+        self.assertEqual(search_items(index, 'синя'), [2, 1])  # Необработанные впереди
+        self.assertEqual(search_items(index, 'ИНЯ КРУЖ'), [1])
+        self.assertEqual(search_items(index, 'kr-1'), [0, 1])
+        self.assertEqual(search_items(index, '0031'), [2])
+        self.assertEqual(search_items(index, 'белая 0031'), [])
+        self.assertEqual(search_items(index, '  '), [])
+        self.assertEqual(index.find_barcode('4600000000031'), [2])
+        self.assertEqual(index.find_barcode('0000031'), [])  # Сканер дает код целиком
+
+
+class TestCellGroup(unittest.TestCase):
+    def make_items(self):
+        return [
+            {'location': location, 'quantity': 2, 'status': status, 'collected_quantity': 0, 'box': 0}
+            for location, status in [('A-1', 'pending'), ('A-1', 'skipped'), ('A-1', 'pending'), ('B-2', 'pending'),
+                                     ('A-1', 'pending'), ('', 'pending'), ('', 'pending')]
+        ]
+
+    def test_group_is_the_run_of_pending_lines_in_one_cell(self):
+        items = self.make_items()
+        self.assertEqual(cell_group(items, 0), [0, 2])
+        self.assertEqual(cell_group(items, 3), [3])
+        self.assertEqual(cell_group(items, 5), [5])  # Без ячейки не группируются
+        self.assertEqual(cell_group(items, 7), [])
+
+    def test_collect_and_undo_in_one_step(self):
+        items = self.make_items()
+        change = collect_positions(items, [0, 2], box=3, cursor=0)
+        self.assertEqual([(i['status'], i['collected_quantity'], i['box']) for i in items[:3]],
+                         [('collected', 2, 3), ('skipped', 0, 0), ('collected', 2, 3)])
+
+        restored = undo_change(items, change)
+
+        self.assertEqual(restored, [items[0], items[2]])
+        self.assertEqual(items, self.make_items())
+
+
+class TestDisplayProjection(unittest.TestCase):
+    def test_clean_name_strips_trailing_barcode(self):
+        self.assertEqual(clean_name('Брелок Hello Kitty 2041470920632', '2041470920632'), 'Брелок Hello Kitty')
+        self.assertEqual(clean_name('Брелок Hello Kitty, 2041470920632.0', '2041470920632'), 'Брелок Hello Kitty')
+        self.assertEqual(clean_name('Брелок Hello Kitty 2041470920632', '.2041470920632'), 'Брелок Hello Kitty')
+        self.assertEqual(clean_name('Наклейки 53 шт.'), 'Наклейки 53 шт.')
+        # Номер модели в конце - не штрихкод позиции
+        self.assertEqual(clean_name('Картридж HP 2041470920', '2041470920632'), 'Картридж HP 2041470920')
+        self.assertEqual(clean_name('Картридж HP 2041470920'), 'Картридж HP 2041470920')
+
+    def test_prefetch_fills_pending_items_ahead(self):
+        items = [
+            {'name': f'Товар {i}', 'quantity': 1, 'barcode': f'46000{i:04d}', 'status': 'pending', 'box': 0}
+            for i in range(10)
+        ]
+        items[2]['status'] = 'collected'
+        index = AssemblyIndex(items)
+        index.display.ahead = 3
+
+        index.display.prefetch(0)
+
+        cached = set(index.display.cache)
+        self.assertEqual(cached, {items[1]['line_id'], items[3]['line_id'], items[4]['line_id']})
+        self.assertEqual(index.display.get(3).short_barcode, '0003')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import http.client
+import io
+import json
+import threading
+import time
+import unittest
+
+import openpyxl
+
+from conversion_service import ConversionService, ServiceBusy, make_server
+from manifest_factory import manifest_bytes
+
+
+class TestConversionServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server(port=0, workers=1, queue_limit=4)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.server.service.shutdown()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.server_port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+
+    def test_parse_streams_orders(self):
+        rows = [(f"Товар {i}", 1 + i % 3, f"ART-{i}", f"A-{i}", f"46000{i:05d}") for i in range(1200)]
+        status, headers, body = self.request("POST", "/parse?name=ozon.xlsx", manifest_bytes(rows))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers.get("Transfer-Encoding"), "chunked")
+        data = json.loads(body)
+        self.assertEqual(data["shipment_info"], "Отгрузка №77 от 01-02-2025")
+        self.assertEqual(len(data["orders"]), 1200)
+        self.assertEqual(data["orders"][5]["article"], "ART-5")
+
+    def test_parse_error_is_reported(self):
+        status, _, body = self.request("POST", "/parse?name=bad.xlsx", b"not an excel file")
+
+        self.assertEqual(status, 422)
+        self.assertIn("error", json.loads(body))
+
+    def test_export_returns_workbook(self):
+        payload = {
+            "collected_data": [{"box": 1, "article": "A1", "name": "Item", "quantity": 2, "barcode": "123"}],
+            "shipment_info": "Отгрузка №77 от 01-02-2025",
+            "discrepancies": ["Пропущено: 555 - 1 шт."],
+            "file_name": "ozon.xlsx",
+        }
+        status, headers, body = self.request("POST", "/export", json.dumps(payload).encode("utf-8"),
+                                             {"Content-Type": "application/json"})
+
+        self.assertEqual(status, 200)
+        self.assertIn("ozon_", headers["Content-Disposition"])
+        ws = openpyxl.load_workbook(io.BytesIO(body)).active
+        self.assertEqual(ws.cell(row=1, column=1).value, "Отгрузка №77 от 01-02-2025")
+        self.assertEqual(ws.cell(row=4, column=1).value, "Пропущено: 555 - 1 шт.")
+
+    def test_stats_and_unknown_path(self):
+        self.request("POST", "/parse?name=a.xlsx", manifest_bytes([("Товар", 1, "A", "A-1", "1")]))
+        status, _, body = self.request("GET", "/stats")
+        stats = json.loads(body)
+
+        self.assertEqual(status, 200)
+        self.assertGreaterEqual(stats["completed"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertIn("p95", stats["latency_ms"])
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+
+
+class TestConversionService(unittest.TestCase):
+    def test_full_queue_rejects(self):
+        service = ConversionService(workers=1, queue_limit=1)
+        try:
+            running = service.submit(time.sleep, 0.5)
+            waiting = service.submit(time.sleep, 0)
+            with self.assertRaises(ServiceBusy):
+                service.submit(time.sleep, 0)
+
+            self.assertEqual(service.stats.summary()["queue_depth"], 1)
+            running.result()
+            waiting.result()
+            summary = service.stats.summary()
+            self.assertEqual((summary["completed"], summary["rejected"]), (2, 1))
+            self.assertGreater(summary["queue_wait_ms"]["max"], 0)
+            service.submit(time.sleep, 0).result()  # Места освободились
+        finally:
+            service.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,16 @@
 
 import unittest
 import os
-from excel_processor import ExcelProcessor, ExcelWriter
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+import openpyxl
+from manifest_factory import fill_sheet, write_manifest
+from excel_processor import (READERS, ExcelProcessor, ExcelWriter, LabelWriter, _shared_strings, barcode_problems,
+                             normalize_barcodes, print_box_label, select_readers, sheet_names)
 import pandas as pd
 
 class TestExcelProcessor(unittest.TestCase):
@@ -57,5 +66,206 @@ class TestExcelProcessor(unittest.TestCase):
         if os.path.exists(output_file):
             os.remove(output_file)
 
+
+class TestBarcodes(unittest.TestCase):
+    def test_float_artifacts_are_removed(self):
+        raw = pd.Series(["4006381333931.0", "4.006381333931E+12", " .96385074", None, "036000291452"], dtype=object)
+        self.assertEqual(list(normalize_barcodes(raw)),
+                         ["4006381333931", "4006381333931", "96385074", "", "036000291452"])
+
+    def test_check_digits(self):
+        barcodes = pd.Series(["4006381333931", "4006381333932", "96385074", "036000291452", "12345", "12AB", ""])
+        self.assertEqual(list(barcode_problems(barcodes)), [
+            "", "неверная контрольная цифра", "", "", "неизвестная длина (5 цифр)", "недопустимые символы", ""
+        ])
+
+    def test_non_ascii_digits_are_invalid(self):
+        raw = pd.Series(["４６０１２３４５６７８９３", "４.６E+12", "٤٦٠١٢٣٤٥٦٧٨٩٣.0", "4006381333931"], dtype=object)
+        barcodes = normalize_barcodes(raw)
+        self.assertEqual(list(barcodes)[:2], ["４６０１２３４５６７８９３", "４.６E+12"])
+        self.assertEqual(list(barcode_problems(barcodes)), ["недопустимые символы"] * 3 + [""])
+
+
+class TestProgressiveLoad(unittest.TestCase):
+    def make_manifest(self, rows):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return write_manifest(os.path.join(tmp.name, "manifest.xlsx"), rows)
+
+    def test_batches_match_full_parse(self):
+        rows = [(f"Товар {i}", 1 + i % 3, f"ART-{i}", f"A-{i}", f"46000{i:05d}") for i in range(25)]
+        rows[7] = ("Товар 7", "много", "ART-7", "A-7", "")
+        path = self.make_manifest(rows)
+
+        processor = ExcelProcessor(path)
+        batches = list(processor.iter_order_batches(batch_size=10))
+        orders, shipment_info = ExcelProcessor(path).process_file()
+
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 4])
+        self.assertEqual([order for batch in batches for order in batch], orders)
+        self.assertEqual(processor.shipment_info, shipment_info)
+        self.assertEqual(processor.report.row_errors, ["Строка 13: некорректное количество «много»"])
+
+    def test_report_flags_bad_and_repeated_barcodes(self):
+        path = self.make_manifest([
+            ("Товар 1", 1, "A1", "A-1", 4006381333931),
+            ("Товар 2", 1, "A2", "A-2", "4006381333932"),
+            ("Товар 3", 1, "A3", "A-3", "4006381333931.0"),
+            ("Товар 4", 1, "A4", "A-4", "４６０１２３４５６７８９３"),
+        ])
+        processor = ExcelProcessor(path)
+        orders = [order for batch in processor.iter_order_batches(batch_size=2) for order in batch]
+
+        self.assertEqual(orders[2]["barcode"], "4006381333931")
+        self.assertEqual(len(orders), 4)
+        self.assertEqual(processor.report.invalid_barcodes, [
+            ("строка 7", "4006381333932", "неверная контрольная цифра"),
+            ("строка 9", "４６０１２３４５６７８９３", "недопустимые символы"),
+        ])
+        self.assertEqual(processor.report.duplicate_barcodes(), {"4006381333931": ["строка 6", "строка 8"]})
+
+    def test_all_readers_agree(self):
+        rows = [(f"Товар {i}", 2.0 if i % 2 else 1, f"ART-{i}", None if i % 3 else f"A-{i}", 4006381333931)
+                for i in range(12)]
+        rows[4] = (None, None, None, None, None)  # Пустая строка внутри таблицы
+        path = self.make_manifest(rows)
+
+        results = {name: ExcelProcessor(path, reader=name).process_file() for name in READERS}
+
+        reference = results["pandas"]
+        for name, result in results.items():
+            self.assertEqual(result, reference, name)
+        self.assertEqual(reference[0][1]["quantity"], 2)
+
+    def test_reader_selection(self):
+        self.assertEqual(select_readers(Path("a.xlsx"))[0].name, "xml_stream")
+        self.assertEqual([b.name for b in select_readers(Path("a.XLS"))], ["pandas"])
+        with self.assertRaises(ValueError):
+            select_readers(Path("a.xls"), "xml_stream")
+        with self.assertRaises(ValueError):
+            select_readers(Path("a.xlsx"), "nothing")
+
+    def test_missing_columns_fail_before_first_batch(self):
+        path = self.make_manifest([])
+        wb = openpyxl.load_workbook(path)
+        wb.active.cell(row=5, column=2, value="Кол-во")
+        wb.save(path)
+
+        with self.assertRaises(ValueError):
+            next(ExcelProcessor(path).iter_order_batches())
+
+class TestMultiSheet(unittest.TestCase):
+    def make_workbook(self):
+        wb = openpyxl.Workbook()
+        cover = wb.active
+        cover.title = "Сводка"
+        cover.cell(row=1, column=1, value="Отгрузка № 91 от 03.04.2025")
+        for title, count, start in (("Склад 1", 3, 0), ("Пусто", 0, 0), ("Склад 2", 4, 100)):
+            ws = wb.create_sheet(title)
+            if title == "Пусто":
+                fill_sheet(ws, shipment_info=None, columns=["Примечание"])
+                continue
+            fill_sheet(ws, [(f"Товар {start + r}", 1, f"ART-{start + r}", f"B-{r}", "4006381333931") for r in range(count)],
+                       shipment_info=None)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "multi.xlsx")
+        wb.save(path)
+        return path
+
+    def test_data_sheets_are_merged_and_tagged(self):
+        processor = ExcelProcessor(self.make_workbook())
+        orders, shipment_info = processor.process_file()
+
+        self.assertEqual(shipment_info, "Отгрузка №91 от 03-04-2025")
+        self.assertEqual([o["sheet"] for o in orders], ["Склад 1"] * 3 + ["Склад 2"] * 4)
+        self.assertEqual(orders[3]["article"], "ART-100")
+        self.assertEqual(processor.report.duplicate_barcodes()["4006381333931"][3], "лист «Склад 2», строка 6")
+
+    def test_parallel_parse_matches_sequential(self):
+        path = self.make_workbook()
+        sequential = ExcelProcessor(path)
+        orders, _ = sequential.process_file()
+
+        parallel = ExcelProcessor(path)
+        # Заголовки листов читают процессы пула: основной процесс получает все листы
+        sheets = list(enumerate(sheet_names(Path(path))))
+        self.assertEqual(parallel._parse_sheets_parallel(sheets), orders)
+        self.assertEqual(parallel.shipment_info, "Отгрузка №91 от 03-04-2025")
+        self.assertEqual(parallel.report.lines(), sequential.report.lines())
+
+    def test_shared_strings_are_parsed_once_per_workbook(self):
+        path = self.make_workbook()
+        _shared_strings.cache_clear()
+        ExcelProcessor(path, reader="xml_stream").process_file()
+        self.assertEqual(_shared_strings.cache_info().misses, 1)
+
+    def test_xls_sheet_names_release_the_file(self):
+        book = mock.Mock()
+        book.sheet_names.return_value = ["Склад 1", "Склад 2"]
+        with mock.patch("xlrd.open_workbook", return_value=book):
+            self.assertEqual(sheet_names(Path("probe.xls")), ["Склад 1", "Склад 2"])
+        book.release_resources.assert_called_once_with()
+
+    def test_progressive_load_reads_sheets_in_turn(self):
+        processor = ExcelProcessor(self.make_workbook())
+        batches = list(processor.iter_order_batches(batch_size=2))
+
+        self.assertEqual([len(b) for b in batches], [2, 1, 2, 2])
+        self.assertEqual(processor.shipment_info, "Отгрузка №91 от 03-04-2025")
+
+
+class TestLabels(unittest.TestCase):
+    SHIPMENT = "Отгрузка №77 от 01-02-2025"
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def test_zpl_and_text_labels(self):
+        records = [{'box': 3, 'article': 'A1', 'name': 'Item 1', 'quantity': 5, 'barcode': '4600000000017'},
+                   {'box': 3, 'article': 'A2', 'name': 'Item 2', 'quantity': 2, 'barcode': ''}]
+        zpl = print_box_label(self.SHIPMENT, 3, records, target=os.path.join(self.root, "labels.zpl"))
+        self.assertTrue(zpl.startswith("^XA^CI28"))
+        self.assertIn("^FDКОРОБКА №3^FS", zpl)
+        self.assertIn("Строк: 2   Шт.: 7", zpl)
+        self.assertIn("^BCN,160,Y,N,N^FD77-003^FS", zpl)
+
+        path = os.path.join(self.root, "labels.txt")
+        print_box_label(self.SHIPMENT, 3, records, target=path)
+        print_box_label(self.SHIPMENT, 4, records[:1], target=path)
+        self.assertIsNone(print_box_label(self.SHIPMENT, 5, [], target=path))
+        text = Path(path).read_text(encoding="utf-8")
+        self.assertEqual(text.count("\f"), 2)
+        self.assertIn("Штрихкод: 77-004", text)
+
+    def test_hundreds_of_boxes_stream_to_a_socket(self):
+        server = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(server.close)
+        received = bytearray()
+
+        def accept():
+            connection, _ = server.accept()
+            with connection:
+                while chunk := connection.recv(65536):
+                    received.extend(chunk)
+        reader = threading.Thread(target=accept)
+        reader.start()
+
+        collected = [{'box': 1 + i // 4, 'article': f'A{i}', 'name': '', 'quantity': 1, 'barcode': ''} for i in range(2000)]
+        started = time.perf_counter()
+        writer = LabelWriter.open(f"127.0.0.1:{server.getsockname()[1]}", self.SHIPMENT)
+        try:
+            self.assertEqual(writer.write_all(collected), 500)
+        finally:
+            writer.close()
+        reader.join(timeout=5)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        labels = received.decode("utf-8").split("^XZ\n")[:-1]
+        self.assertEqual(len(labels), 500)
+        self.assertIn("^FD77-500^FS", labels[-1])
+
+
 if __name__ == '__main__':
     unittest.main()
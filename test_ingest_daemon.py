@@ -0,0 +1,135 @@
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from ingest_daemon import INDEX_NAME, IngestDaemon, InotifySource
+from manifest_factory import manifest_bytes
+
+
+def make_manifest(count=5) -> bytes:
+    return manifest_bytes([(f"Товар {r}", 1, f"ART-{r}", f"A-{r}", "4006381333931") for r in range(count)])
+
+
+class TestIngestDaemon(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.inbox = Path(tmp.name)
+        environ = mock.patch.dict(os.environ, {"FLET_APP_STORAGE_DATA": tmp.name})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.messages = []
+
+    def make_daemon(self, settle=0.0):
+        daemon = IngestDaemon(str(self.inbox), workers=1, settle=settle, interval=0.05, polling=True,
+                              log=self.messages.append)
+        self.addCleanup(daemon.close)
+        return daemon
+
+    def drain(self, daemon, limit=30.0):
+        deadline = time.monotonic() + limit
+        daemon.step(timeout=0)
+        while not daemon.idle() and time.monotonic() < deadline:
+            daemon.step(timeout=0.05)
+
+    def test_new_manifest_becomes_session(self):
+        (self.inbox / "ozon.xlsx").write_bytes(make_manifest(count=5))
+        daemon = self.make_daemon()
+        self.drain(daemon)
+
+        with open(self.inbox / "ozon.assm-save", "rb") as f:
+            session = pickle.load(f)
+        self.assertEqual(session["shipment_info"], "Отгрузка №77 от 01-02-2025")
+        self.assertEqual(len(session["assembly_items"]), 5)
+        self.assertEqual({item["status"] for item in session["assembly_items"]}, {"pending"})
+        self.assertIn("1", session["clock"]["boxes"])
+        self.assertTrue((self.inbox / INDEX_NAME).exists())
+
+    def test_duplicate_content_is_skipped(self):
+        data = make_manifest()
+        (self.inbox / "first.xlsx").write_bytes(data)
+        daemon = self.make_daemon()
+        self.drain(daemon)
+        (self.inbox / "copy.xlsx").write_bytes(data)
+        self.drain(daemon)
+
+        self.assertFalse((self.inbox / "copy.assm-save").exists())
+        self.assertTrue(any("уже разобран" in m for m in self.messages))
+
+    def test_file_is_taken_after_it_stops_changing(self):
+        data = make_manifest(count=50)
+        path = self.inbox / "slow.xlsx"
+        daemon = self.make_daemon(settle=0.3)
+        with open(path, "wb") as f:
+            f.write(data[:len(data) // 2])
+            f.flush()
+            daemon.step(timeout=0)
+            time.sleep(0.1)
+            daemon.step(timeout=0)
+            self.assertEqual(daemon.running, {})  # Файл еще пишется
+            f.write(data[len(data) // 2:])
+        self.drain(daemon)
+
+        with open(self.inbox / "slow.assm-save", "rb") as f:
+            self.assertEqual(len(pickle.load(f)["assembly_items"]), 50)
+        self.assertFalse(any("ошибка" in m for m in self.messages))
+
+    def test_session_with_progress_is_not_overwritten(self):
+        (self.inbox / "wb.assm-save").write_bytes(b"progress")
+        (self.inbox / "wb.xlsx").write_bytes(make_manifest())
+        self.drain(self.make_daemon())
+
+        self.assertEqual((self.inbox / "wb.assm-save").read_bytes(), b"progress")
+        self.assertEqual(len(list(self.inbox.glob("wb_*.assm-save"))), 1)
+
+    def test_saved_progress_survives_a_revised_manifest(self):
+        (self.inbox / "ozon.xlsx").write_bytes(make_manifest(count=3))
+        daemon = self.make_daemon()
+        self.drain(daemon)
+        session_path = self.inbox / "ozon.assm-save"
+        with open(session_path, "rb") as f:
+            session = pickle.load(f)
+        session["assembly_items"][0].update(status="collected", collected_quantity=1, box=1)
+        with open(session_path, "wb") as f:
+            pickle.dump(session, f)  # Сборщик сохранил сессию поверх разобранной
+
+        (self.inbox / "ozon.xlsx").write_bytes(make_manifest(count=4))
+        self.drain(daemon)
+
+        with open(session_path, "rb") as f:
+            self.assertEqual(pickle.load(f)["assembly_items"][0]["status"], "collected")
+        revised = list(self.inbox.glob("ozon_*.assm-save"))
+        self.assertEqual(len(revised), 1)
+        with open(revised[0], "rb") as f:
+            self.assertEqual(len(pickle.load(f)["assembly_items"]), 4)
+
+    def test_untouched_session_is_replaced_by_a_revised_manifest(self):
+        (self.inbox / "ozon.xlsx").write_bytes(make_manifest(count=3))
+        daemon = self.make_daemon()
+        self.drain(daemon)
+        (self.inbox / "ozon.xlsx").write_bytes(make_manifest(count=4))
+        self.drain(daemon)
+
+        with open(self.inbox / "ozon.assm-save", "rb") as f:
+            self.assertEqual(len(pickle.load(f)["assembly_items"]), 4)
+        self.assertEqual(list(self.inbox.glob("ozon_*.assm-save")), [])
+
+    def test_inotify_reports_new_files(self):
+        try:
+            source = InotifySource(self.inbox)
+        except OSError:
+            self.skipTest("inotify недоступен")
+        self.addCleanup(source.close)
+        self.assertEqual(source.changes(0), set())
+
+        (self.inbox / "new.xlsx").write_bytes(b"data")
+        (self.inbox / "notes.txt").write_bytes(b"data")
+        self.assertEqual(source.changes(1.0), {self.inbox / "new.xlsx"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import sys
+import unittest
+
+from load_test import ACTIONS, make_script, run
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_script_is_repeatable_and_exports_on_schedule(self):
+        script = make_script(250, seed=3, export_every=100)
+        self.assertEqual(script, make_script(250, seed=3, export_every=100))
+        self.assertEqual([n for n, action in enumerate(script) if action == "export"], [99, 199])
+
+    def test_both_apps_replay_the_script(self):
+        for app in ("flet", "tk"):
+            with self.subTest(app=app):
+                recorder = run(300, app, actions=120, seed=2, export_every=60)
+                rows = {row["name"]: row for row in recorder.rows()}
+                for action in ACTIONS:
+                    self.assertIn(action, rows)
+                self.assertEqual(rows["export"]["count"], 2)
+                self.assertEqual(sum(rows[action]["count"] for action in ACTIONS), 120)
+                self.assertIn("autosave", rows)
+                self.assertGreater(rows["render"]["count"], 0)
+                self.assertGreater(rows["review_edit"]["render_p95_ms"], 0)
+                self.assertLessEqual(rows["collect"]["p50_ms"], rows["collect"]["max_ms"])
+
+    def test_tk_stubs_are_removed_after_the_run(self):
+        before = {name: sys.modules.get(name) for name in ("tkinter", "gui_app")}
+        run(20, "tk", actions=5, seed=1, export_every=5)
+        self.assertFalse(getattr(sys.modules.get("tkinter"), "HEADLESS", False))
+        self.assertEqual({name: sys.modules.get(name) for name in before}, before)
+
+
+if __name__ == "__main__":
+    unittest.main()
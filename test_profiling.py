@@ -0,0 +1,66 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import profiling
+from profiling import profiled, span
+
+
+@profiled()
+def sample(x):
+    with span("sample.inner"):
+        return x * 2
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        profiling.disable()
+        self.tmp.cleanup()
+
+    def read_records(self):
+        with open(self.log_dir / "profile.log", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_disabled_writes_nothing(self):
+        self.assertFalse(profiling.is_enabled())
+        self.assertEqual(sample(2), 4)
+        self.assertFalse((self.log_dir / "profile.log").exists())
+
+    def test_spans_are_logged_with_nesting(self):
+        profiling.enable(log_dir=self.log_dir)
+        self.assertEqual(sample(3), 6)
+        profiling.disable()
+
+        spans = [r for r in self.read_records() if "span" in r]
+        self.assertEqual([r["span"] for r in spans], ["sample.inner", "sample"])
+        self.assertEqual(spans[0]["depth"], 1)
+        self.assertEqual(spans[1]["depth"], 0)
+
+    def test_error_is_recorded_and_reraised(self):
+        profiling.enable(log_dir=self.log_dir)
+        with self.assertRaises(KeyError):
+            with span("failing"):
+                raise KeyError("x")
+        profiling.disable()
+
+        record = [r for r in self.read_records() if r.get("span") == "failing"][0]
+        self.assertEqual(record["error"], "KeyError")
+
+    def test_cprofile_and_tracemalloc_modes(self):
+        profiling.enable(modes=("cprofile", "tracemalloc"), log_dir=self.log_dir)
+        sample(1)
+        profiling.disable()
+
+        record = [r for r in self.read_records() if r.get("span") == "sample"][0]
+        self.assertIn("peak_kb", record)
+        self.assertTrue((self.log_dir / record["cprofile"]).exists())
+        self.assertIn(self.log_dir / record["cprofile"], [Path(p) for p in profiling.log_files()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from assembly_state import write_result
+from excel_processor import ExcelProcessor
+from manifest_factory import write_manifest
+from reconcile_results import MISSING, OVER, UNEXPECTED, read_manifest, read_result, reconcile, write_report
+
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def test_result_file_is_reconciled_with_the_manifest(self):
+        rows = [
+            ("Товар 0", 2, "ART-0", "A-1", "4600000000017"),
+            ("Товар 1", 3, "ART-1", "A-2", "4600000000024"),
+            ("Товар 2", 1, "ART-2", "A-3", "4600000000031"),
+            ("Товар 3", 4, "ART-3", "A-4", ""),
+            ("Товар 1", 1, "ART-1", "A-5", "4600000000024"),  # Повтор: в заявке всего 4 шт.
+        ]
+        manifest_path = os.path.join(self.root, "manifest.xlsx")
+        write_manifest(manifest_path, rows)
+        orders, shipment_info = ExcelProcessor(manifest_path).process_file()
+        changes = [('collected', 2, 1), ('quantity_changed', 2, 1), ('skipped', 0, 0), ('quantity_changed', 6, 2),
+                   ('collected', 1, 2)]
+        items = [{**order, 'status': status, 'collected_quantity': collected, 'box': box, 'line_id': i}
+                 for i, (order, (status, collected, box)) in enumerate(zip(orders, changes))]
+        items.append({'name': "Чужой", 'quantity': 5, 'article': "ART-X", 'location': "", 'barcode': "4600000000048",
+                      'status': 'collected', 'collected_quantity': 5, 'box': 3, 'line_id': 9})
+        result_path = write_result(items, shipment_info, manifest_path, self.root)
+
+        result_shipment, picked = read_result(result_path)
+        self.assertEqual(result_shipment, shipment_info)
+        self.assertEqual(sorted(picked["box"].unique()), [1, 2, 3])
+
+        report = reconcile(read_manifest(manifest_path)[1], picked)
+        found = [(r.kind, r.barcode, r.article, r.expected, r.picked, r.boxes) for r in report.itertuples()]
+        self.assertEqual(found, [
+            (MISSING, "4600000000024", "ART-1", 4, 3, "1, 2"),
+            (MISSING, "4600000000031", "ART-2", 1, 0, ""),
+            (OVER, "", "ART-3", 4, 6, "2"),
+            (UNEXPECTED, "4600000000048", "ART-X", 0, 5, "3"),
+        ])
+
+        out = write_report(report, os.path.join(self.root, "report.csv"))
+        with open(out, encoding="utf-8-sig", newline="") as f:
+            table = list(csv.reader(f, delimiter=";"))
+        self.assertEqual(table[0][:3], ["Расхождение", "Штрихкод", "Артикул"])
+        self.assertEqual(len(table), 5)
+
+    def test_old_result_barcodes_are_normalized(self):
+        rows = [("Товар 0", 2, "ART-0", "A-1", "4600000000017"), ("Товар 1", 1, "ART-1", "A-2", "4600000000024")]
+        manifest_path = os.path.join(self.root, "manifest.xlsx")
+        write_manifest(manifest_path, rows)
+        orders, shipment_info = ExcelProcessor(manifest_path).process_file()
+        # Результат сессии, сохраненной до исправления штрихкодов
+        items = [{**order, 'barcode': barcode, 'status': 'collected', 'collected_quantity': order['quantity'],
+                  'box': 1, 'line_id': i}
+                 for i, (order, barcode) in enumerate(zip(orders, ["4600000000017.0", ".4600000000024"]))]
+        result_path = write_result(items, shipment_info, manifest_path, self.root)
+
+        report = reconcile(read_manifest(manifest_path)[1], read_result(result_path)[1])
+        self.assertEqual(len(report), 0)
+
+    def test_large_tables_are_joined_without_row_loops(self):
+        count = 200_000
+        manifest = pd.DataFrame({
+            "name": [f"Товар {i}" for i in range(count)],
+            "quantity": [1 + i % 5 for i in range(count)],
+            "article": [f"ART-{i}" for i in range(count)],
+            "barcode": [f"46{i:011d}" for i in range(count)],
+        })
+        picked = manifest[["quantity", "article", "barcode"]].assign(box=[1 + i // 50 for i in range(count)])
+        picked.loc[::100, "quantity"] -= 1
+
+        # Сопоставление идет операциями над таблицами: построчный обход был бы здесь узким местом
+        row_loops = [mock.patch.object(pd.DataFrame, name, side_effect=AssertionError(name))
+                     for name in ("iterrows", "itertuples", "apply")]
+        for patch in row_loops:
+            patch.start()
+            self.addCleanup(patch.stop)
+        report = reconcile(manifest, picked)
+        self.assertEqual(len(report), count // 100)
+        self.assertTrue((report["kind"] == MISSING).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
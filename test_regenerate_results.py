@@ -0,0 +1,86 @@
+import asyncio
+import copy
+import json
+import pickle
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+import openpyxl
+
+from regenerate_results import regenerate, session_files
+
+
+def make_session(input_file_path):
+    items = [
+        {'line_id': i, 'name': f"Товар {i}", 'article': f"A{i}", 'location': f"L-{i}", 'barcode': f"460{i:05d}",
+         'quantity': 2, 'status': status, 'collected_quantity': collected, 'box': box}
+        for i, (status, collected, box) in enumerate([
+            ('collected', 2, 1), ('quantity_changed', 1, 1), ('skipped', 0, 0), ('collected', 2, 2), ('pending', 0, 0),
+        ])
+    ]
+    return {"assembly_items": items, "current_item_index": 4, "current_box": 2,
+            "shipment_info": "Отгрузка №5 от 01-02-2025", "input_file_path": input_file_path,
+            "output_directory": "", "wave": None, "clock": None}
+
+
+def archive_parts(path):
+    """Части xlsx без docProps/core.xml: в нем время сохранения."""
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist() if name != "docProps/core.xml"}
+
+
+class TestRegenerateResults(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.session = make_session(str(self.root / "ozon 5.xlsx"))
+
+    def test_result_matches_the_app_finish(self):
+        from assembly_state import AssemblyIndex
+        from flet_app import AssemblyApp
+        from headless_page import HeadlessPage
+
+        app = AssemblyApp(HeadlessPage())
+        self.addCleanup(app.executor.shutdown)
+        self.addCleanup(app.scanner.stop)
+        app.assembly_items = copy.deepcopy(self.session["assembly_items"])
+        app.assembly_index = AssemblyIndex(app.assembly_items)
+        app.shipment_info = self.session["shipment_info"]
+        app.input_file_path = self.session["input_file_path"]
+        app.output_directory = str(self.root / "app")
+        asyncio.run(app.generate_excel_file(mark_uncollected=True, finish=True))  # Досрочное завершение
+        expected = app.output_file_path
+        notes = [row[0] for row in openpyxl.load_workbook(expected).active.iter_rows(values_only=True)]
+        self.assertIn("Пропущено: 46000004 - 2 шт.", notes)  # Строка, оставшаяся в ожидании
+
+        (self.root / "s.assm-save").write_bytes(pickle.dumps(self.session))
+        (self.root / "autosave.json").write_text(json.dumps(self.session, ensure_ascii=False), encoding="utf-8")
+
+        for name in ("s.assm-save", "autosave.json"):
+            result = regenerate(str(self.root / name), str(self.root / name.replace(".", "_")))
+            self.assertIsNone(result["error"])
+            # Отметка времени в имени может отличаться: записи могут прийтись на разные минуты
+            self.assertEqual(Path(result["paths"][0]).name.split("_сборка_")[0], Path(expected).stem.split("_сборка_")[0])
+            self.assertEqual(archive_parts(result["paths"][0]), archive_parts(expected))
+
+    def test_output_defaults_to_the_manifest_folder_and_errors_are_reported(self):
+        path = self.root / "s.assm-save"
+        path.write_bytes(pickle.dumps(self.session))
+        result = regenerate(str(path))
+        self.assertEqual(Path(result["paths"][0]).parent, self.root)
+
+        self.session["wave"] = {"shipments": [], "put_tasks": [], "allocated": False}
+        path.write_bytes(pickle.dumps(self.session))
+        self.assertIn("не разложена", regenerate(str(path))["error"])
+
+    def test_folders_are_expanded(self):
+        for name in ("b.assm-save", "a.json", "notes.txt"):
+            (self.root / name).write_bytes(b"")
+        self.assertEqual([Path(p).name for p in session_files([str(self.root)])], ["a.json", "b.assm-save"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+
+from scan_input import ScanPipeline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def type_code(pipeline, code, terminator="Enter"):
+    for char in code:
+        pipeline.feed(char)
+    if terminator:
+        pipeline.feed(terminator)
+
+
+class TestScanPipeline(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scans = []
+
+    def make(self, **kwargs):
+        return ScanPipeline(self.scans.append, clock=self.clock, **kwargs)
+
+    def test_codes_are_framed_by_terminator_and_pause(self):
+        pipeline = self.make(gap=0.05, min_interval=0)
+        type_code(pipeline, "4601234567890")
+        pipeline.feed("Shift")
+        type_code(pipeline, "AB-1", terminator="Numpad Enter")
+        type_code(pipeline, "123", terminator=None)
+        pipeline.pump()
+        self.assertEqual(self.scans, ["4601234567890", "AB-1"])  # Последний код еще может продолжиться
+
+        self.clock.advance(0.1)
+        pipeline.pump()
+        self.assertEqual(self.scans, ["4601234567890", "AB-1", "123"])
+
+    def test_pump_keeps_a_steady_rate(self):
+        pipeline = self.make(min_interval=0.05)
+        for i in range(3):
+            type_code(pipeline, f"code{i}")
+        self.assertEqual(pipeline.pump(), 1)
+        self.assertEqual(pipeline.pump(), 0)
+        self.clock.advance(0.06)
+        self.assertEqual(pipeline.pump(), 1)
+        self.assertEqual(pipeline.stats()["depth"], 1)
+
+    def test_full_queue_is_drained_in_place_without_losing_codes(self):
+        pipeline = self.make(max_pending=2, min_interval=1.0)
+        codes = [f"46000000{i:05d}" for i in range(10)]
+        for code in codes:
+            type_code(pipeline, code)
+        while pipeline.stats()["depth"]:
+            self.clock.advance(1.0)
+            pipeline.pump()
+
+        self.assertEqual(self.scans, codes)
+        stats = pipeline.stats()
+        self.assertEqual((stats["handled"], stats["max_depth"], stats["waits"]), (10, 2, 8))
+
+    def test_burst_from_another_thread_waits_for_a_slow_handler(self):
+        handled = []
+
+        def slow_handle(code):
+            time.sleep(0.005)  # Сборка позиции, автосохранение, обновление экрана
+            handled.append(code)
+
+        pipeline = ScanPipeline(slow_handle, min_interval=0, max_pending=4)
+        pipeline.start()
+        self.addCleanup(pipeline.stop)
+        codes = [f"46000000{i:05d}" for i in range(40)]
+        producer = threading.Thread(target=lambda: [type_code(pipeline, code) for code in codes])
+        producer.start()
+        producer.join(timeout=10)
+
+        deadline = time.monotonic() + 10
+        while len(handled) < len(codes) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(handled, codes)
+        stats = pipeline.stats()
+        self.assertGreater(stats["waits"], 0)
+        self.assertLessEqual(stats["max_depth"], 4)
+        self.assertGreater(stats["max_ms"], 0)
+        self.assertIn("обработано 40", pipeline.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
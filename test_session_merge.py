@@ -0,0 +1,291 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from session_merge import SessionClock, merge_sessions, reimport_manifest
+
+
+def make_session(count=4, shipment="Отгрузка №1 от 01-02-2025"):
+    items = [
+        {'line_id': i, 'article': f"A{i}", 'location': f"L-{i}", 'name': f"Товар {i}", 'quantity': 2,
+         'barcode': f"460{i:05d}", 'status': 'pending', 'collected_quantity': 0, 'box': 0}
+        for i in range(count)
+    ]
+    return {"assembly_items": items, "current_item_index": 0, "current_box": 1, "shipment_info": shipment}
+
+
+def copy_session(session):
+    return {**session, "assembly_items": [dict(item) for item in session["assembly_items"]],
+            "clock": dict(session.get("clock") or {})}
+
+
+class Device:
+    """Сборщик на одном устройстве: меняет позиции и ставит отметки, как item_changed в приложениях."""
+
+    def __init__(self, name, session, fresh=False):
+        self.session = copy_session(session)
+        self.items = self.session["assembly_items"]
+        self.clock = SessionClock.for_session(self.session, name)
+        if fresh:
+            self.clock.open_box(1)
+        self.save()
+
+    def collect(self, i, quantity=None):
+        item = self.items[i]
+        quantity = item['quantity'] if quantity is None else quantity
+        item['status'] = 'collected' if quantity == item['quantity'] else 'quantity_changed'
+        item['collected_quantity'] = quantity
+        item['box'] = self.session["current_box"]
+        self.clock.stamp(item)
+        self.save()
+
+    def skip(self, i):
+        item = self.items[i]
+        item.update(status='skipped', collected_quantity=0, box=0)
+        self.clock.stamp(item)
+        self.save()
+
+    def next_box(self):
+        self.session["current_box"] = self.clock.next_box(self.session["current_box"])
+        self.save()
+
+    def save(self):
+        self.session["clock"] = self.clock.to_dict()
+        return self.session
+
+
+def states(session):
+    return [(i['status'], i['collected_quantity'], i['box']) for i in session["assembly_items"]]
+
+
+class TestSessionMerge(unittest.TestCase):
+    def test_disjoint_work_merges_without_conflicts(self):
+        base = Device("a", make_session(), fresh=True).save()
+        a, b = Device("a", base), Device("b", base)
+        a.collect(0)
+        b.collect(2)
+
+        result = merge_sessions(a.save(), b.save(), "a")
+
+        self.assertEqual(result.conflicts, [])
+        self.assertEqual([s[0] for s in states(result.session_data)], ['collected', 'pending', 'collected', 'pending'])
+        self.assertEqual(result.session_data["current_item_index"], 1)
+
+    def test_sequential_edit_is_not_a_conflict(self):
+        a = Device("a", make_session(), fresh=True)
+        a.collect(0)
+        b = Device("b", a.save())  # b продолжил сессию a
+        b.skip(0)
+
+        result = merge_sessions(a.save(), b.save(), "a")
+
+        self.assertEqual(result.conflicts, [])
+        self.assertEqual(states(result.session_data)[0], ('skipped', 0, 0))
+
+    def test_concurrent_edit_is_reported_and_deterministic(self):
+        base = Device("a", make_session(), fresh=True).save()
+        a, b = Device("a", base), Device("b", base)
+        a.collect(1)
+        b.collect(1, quantity=1)
+
+        ab = merge_sessions(a.save(), b.save(), "a")
+        ba = merge_sessions(b.save(), a.save(), "b")
+
+        self.assertEqual(len(ab.conflicts), 1)
+        self.assertEqual(ab.conflicts[0].line_id, 1)
+        self.assertEqual(states(ab.session_data)[1], states(ba.session_data)[1])
+
+    def test_merge_is_idempotent(self):
+        base = Device("a", make_session(), fresh=True).save()
+        a, b = Device("a", base), Device("b", base)
+        a.collect(0)
+        b.collect(0, quantity=1)
+
+        once = merge_sessions(a.save(), b.save(), "a").session_data
+        twice = merge_sessions(once, b.save(), "a")
+
+        self.assertEqual(states(twice.session_data), states(once))
+        self.assertEqual(twice.conflicts, [])
+
+    def test_concurrent_boxes_are_renumbered(self):
+        a = Device("a", make_session(6), fresh=True)
+        a.collect(0)
+        b = Device("b", a.save())
+        a.next_box()      # a открыл коробку 2
+        a.collect(1)
+        b.next_box()      # b независимо тоже открыл коробку 2
+        b.collect(2)
+
+        result = merge_sessions(a.save(), b.save(), "a")
+        boxes = [s[2] for s in states(result.session_data)]
+
+        self.assertEqual(boxes[0], 1)  # Общая коробка 1 осталась одной
+        self.assertNotEqual(boxes[1], boxes[2])
+        self.assertEqual(sorted([boxes[1], boxes[2]]), [2, 3])
+        self.assertEqual(len(result.box_notes()), 1)
+
+        merged = Device("a", result.session_data)
+        merged.next_box()
+        self.assertEqual(merged.session["current_box"], 4)  # Новая коробка не совпадает с чужими
+
+    def test_intermediate_file_does_not_touch_pending_lines(self):
+        from assembly_state import AssemblyIndex
+        from flet_app import AssemblyApp
+        from headless_page import HeadlessPage
+
+        base = Device("a", make_session(), fresh=True).save()
+        b = Device("b", base)
+        b.collect(1)  # Строку 1 собрало другое устройство
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        app = AssemblyApp(HeadlessPage())
+        self.addCleanup(app.executor.shutdown)
+        self.addCleanup(app.scanner.stop)
+        a = Device("a", base)
+        a.collect(0)
+        a.items[2]['recheck'] = "было 1 шт., стало 2 шт."
+        app.assembly_items = a.items
+        app.assembly_index = AssemblyIndex(app.assembly_items)
+        app.session_clock = a.clock
+        app.shipment_info = a.session["shipment_info"]
+        app.input_file_path = str(Path(tmp.name) / "manifest.xlsx")
+        app.output_directory = tmp.name
+        asyncio.run(app.generate_excel_file(mark_uncollected=True))
+
+        self.assertTrue(Path(app.output_file_path).exists())
+        self.assertEqual([s[0] for s in states(app.session_data())], ['collected', 'pending', 'pending', 'pending'])
+        self.assertEqual(a.items[2]['recheck'], "было 1 шт., стало 2 шт.")
+        result = merge_sessions(app.session_data(), b.save(), "a")
+        self.assertEqual(result.conflicts, [])
+        self.assertEqual(states(result.session_data)[:2], [('collected', 2, 1), ('collected', 2, 1)])
+
+    def test_old_sessions_without_clocks(self):
+        ours, theirs = make_session(), make_session()
+        theirs["assembly_items"][3].update(status='collected', collected_quantity=2, box=1)
+
+        result = merge_sessions(ours, theirs, "a")
+
+        self.assertEqual(states(result.session_data)[3], ('collected', 2, 1))
+
+    def test_unstamped_concurrent_edit_does_not_depend_on_direction(self):
+        ours, theirs = make_session(), make_session()
+        ours["assembly_items"][2].update(status='collected', collected_quantity=2, box=1)
+        theirs["assembly_items"][2].update(status='quantity_changed', collected_quantity=1, box=2)
+
+        ab = merge_sessions(ours, theirs, "a")
+        ba = merge_sessions(theirs, ours, "b")
+
+        self.assertEqual(states(ab.session_data), states(ba.session_data))
+        self.assertEqual([c.line_id for c in ab.conflicts], [2])
+        self.assertEqual([c.line_id for c in ba.conflicts], [2])
+
+    def test_different_shipments_are_rejected(self):
+        with self.assertRaises(ValueError):
+            merge_sessions(make_session(), make_session(shipment="Отгрузка №2"), "a")
+
+    def test_large_merge_is_fast(self):
+        base = Device("a", make_session(50000), fresh=True).save()
+        a, b = Device("a", base), Device("b", base)
+        for i in range(0, 50000, 2):
+            a.collect(i)
+            b.collect(i + 1)
+        for i in range(0, 50000, 100):
+            b.skip(i)
+
+        started = time.perf_counter()
+        result = merge_sessions(a.save(), b.save(), "a")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(result.conflicts), 500)
+        self.assertLess(elapsed, 0.5)
+
+
+def manifest(session):
+    """Позиции отгрузки в виде, который возвращает ExcelProcessor."""
+    return [{field: item[field] for field in ('name', 'quantity', 'article', 'location', 'barcode')}
+            for item in session["assembly_items"]]
+
+
+class TestReimport(unittest.TestCase):
+    def test_progress_is_kept_and_changes_are_rechecked(self):
+        device = Device("a", make_session(5), fresh=True)
+        device.collect(0)
+        device.collect(1)
+        device.skip(2)
+        orders = manifest(device.session)
+        orders[1]['quantity'] = 5  # Собранная позиция изменилась
+        orders[2]['quantity'] = 3  # Пропущенная тоже
+        orders[4]['quantity'] = 7  # Необработанная
+        new_line = {'name': 'Новый', 'quantity': 1, 'article': 'N1', 'location': 'L-1a', 'barcode': '46099999'}
+        orders.insert(2, new_line)
+        del orders[4]  # A3: не обработана, просто исчезает
+
+        result = reimport_manifest(device.save(), orders, "Отгрузка №1 от 01-02-2025", "a")
+        items = result.session_data["assembly_items"]
+
+        self.assertEqual([item['article'] for item in items], ['A0', 'A1', 'N1', 'A2', 'A4'])
+        self.assertEqual(states(result.session_data),
+                         [('collected', 2, 1), ('pending', 2, 1), ('pending', 0, 0), ('pending', 0, 0), ('pending', 0, 0)])
+        self.assertEqual([item['line_id'] for item in items], [0, 1, 5, 2, 4])
+        self.assertEqual(items[1]['quantity'], 5)
+        self.assertIn("уже собрано 2 шт. в коробке №1", items[1]['recheck'])
+        self.assertNotIn('recheck', items[4])
+        self.assertEqual((result.added, result.updated, len(result.recheck), result.dropped), (1, 1, 2, 1))
+        self.assertEqual(result.session_data["current_item_index"], 1)
+        # Изменения отмечены часами, поэтому слияние с копией старой сессии их не потеряет
+        self.assertGreater(items[1]['clock'], device.items[1]['clock'])
+
+    def test_removed_collected_lines_are_reported(self):
+        device = Device("a", make_session(3), fresh=True)
+        device.collect(1)
+        orders = manifest(device.session)
+        del orders[1]
+
+        result = reimport_manifest(device.save(), orders, "Отгрузка №1 от 01-02-2025", "a")
+
+        self.assertEqual([item['article'] for item in result.removed], ['A1'])
+        self.assertEqual(result.notes(), ["L-1 · Арт: A1: позиции нет в отгрузке, вынуть 2 шт. из коробки №1"])
+
+    def test_repeated_keys_are_matched_in_order(self):
+        session = make_session(3)
+        for item in session["assembly_items"]:
+            item.update(article='A', barcode='460')
+        device = Device("a", session)
+        device.collect(0)
+        orders = manifest(device.session)
+        orders[2]['quantity'] = 9
+
+        result = reimport_manifest(device.save(), orders, session["shipment_info"], "a")
+
+        self.assertEqual([item['line_id'] for item in result.session_data["assembly_items"]], [0, 1, 2])
+        self.assertEqual(states(result.session_data)[0], ('collected', 2, 1))
+        self.assertEqual((result.updated, result.recheck), (1, []))
+
+    def test_other_shipment_is_rejected(self):
+        session = make_session()
+        with self.assertRaises(ValueError):
+            reimport_manifest(session, manifest(session), "Отгрузка №2", "a")
+
+    def test_large_reimport_is_fast(self):
+        device = Device("a", make_session(100000), fresh=True)
+        for i in range(0, 100000, 3):
+            device.collect(i)
+        orders = manifest(device.session)
+        for i in range(0, 100000, 10):
+            orders[i]['quantity'] += 1
+        orders = orders[::-1]  # Другой порядок маршрута
+
+        started = time.perf_counter()
+        result = reimport_manifest(device.save(), orders, "Отгрузка №1 от 01-02-2025", "a")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(result.session_data["assembly_items"]), 100000)
+        self.assertEqual(result.added + result.dropped, 0)
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
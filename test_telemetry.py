@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import openpyxl
+
+from telemetry import PickTelemetry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class TestPickTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = Path(self.tmp.name) / "session.picklog"
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def pick(self, telemetry, seconds, action, line_id, box=1, quantity=1, location='A-01'):
+        self.clock.advance(seconds)
+        telemetry.record(action, {'line_id': line_id, 'location': location}, box=box, quantity=quantity)
+
+    def test_rates_and_breaks(self):
+        telemetry = PickTelemetry(self.log_path, clock=self.clock)
+        telemetry.record('start')
+        self.pick(telemetry, 10, 'collect', 0, quantity=2)
+        self.pick(telemetry, 20, 'collect', 1, quantity=3, location='B-02')
+        self.pick(telemetry, 3600, 'skip', 2, box=0, quantity=0)  # Перерыв не считается
+        self.pick(telemetry, 30, 'quantity', 3, quantity=1)
+
+        stats = telemetry.stats()
+        self.assertEqual(stats['lines'], 4)
+        self.assertEqual(stats['units'], 6)
+        self.assertAlmostEqual(stats['active_seconds'], 60)
+        self.assertAlmostEqual(stats['lines_per_hour'], 240)
+        self.assertAlmostEqual(stats['seconds_per_line'], 20)
+        self.assertEqual(telemetry.per_location()['B-02'], {'lines': 1, 'seconds': 20})
+        self.assertAlmostEqual(telemetry.remaining_seconds(10), 200)
+
+    def test_closed_box_is_taken_from_the_event(self):
+        telemetry = PickTelemetry(self.log_path, clock=self.clock)
+        telemetry.record('start')
+        self.pick(telemetry, 5, 'collect', 0, box=2)
+        self.clock.advance(7)
+        telemetry.record('box', box=2)  # После объединения сессий следующая коробка - 5
+        self.pick(telemetry, 4, 'collect', 1, box=5)
+
+        per_box = PickTelemetry(self.log_path, clock=self.clock).per_box()
+        self.assertEqual(per_box[2]['seconds'], 12)
+        self.assertEqual(per_box[5], {'lines': 1, 'units': 1, 'seconds': 4})
+        self.assertNotIn(4, per_box)
+
+    def test_log_is_appended_and_replayed(self):
+        telemetry = PickTelemetry(self.log_path, clock=self.clock)
+        telemetry.record('start')
+        self.pick(telemetry, 5, 'collect', 0)
+        self.clock.advance(5)
+        telemetry.record('box', box=1)
+
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("1700000020.0\tC\t1")  # Строка, оборванная при сбое
+
+        resumed = PickTelemetry(self.log_path, clock=self.clock)
+        self.assertEqual([e.action for e in resumed.events], ['start', 'collect', 'box'])
+        self.assertEqual(resumed.per_box()[1]['seconds'], 10)
+        self.pick(resumed, 5, 'collect', 2)
+        self.assertEqual(len(PickTelemetry.read_log(self.log_path)), 4)
+
+        fresh = PickTelemetry(self.log_path, fresh=True, clock=self.clock)
+        self.assertEqual(fresh.events, [])
+        self.assertFalse(self.log_path.exists())
+
+    def test_record_many_is_one_action(self):
+        telemetry = PickTelemetry(self.log_path, clock=self.clock)
+        telemetry.record('start')
+        self.clock.advance(12)
+        items = [{'line_id': i, 'location': 'A-01', 'collected_quantity': 2} for i in range(3)]
+        telemetry.record_many('collect', items, box=1)
+
+        self.assertEqual(len(PickTelemetry.read_log(self.log_path)), 4)
+        stats = telemetry.stats()
+        self.assertEqual((stats['lines'], stats['units'], stats['active_seconds']), (3, 6, 12))
+        self.assertEqual(stats['seconds_per_line'], 4)
+
+    def test_write_report(self):
+        telemetry = PickTelemetry(clock=self.clock)
+        telemetry.record('start')
+        self.pick(telemetry, 12, 'collect', 0, quantity=4)
+
+        report_path = telemetry.write_report("Отгрузка №1", self.tmp.name, "manifest")
+        self.assertTrue(os.path.exists(report_path))
+
+        ws = openpyxl.load_workbook(report_path).active
+        self.assertEqual(ws.cell(row=1, column=1).value, "Отгрузка №1")
+        labels = {ws.cell(row=r, column=1).value: ws.cell(row=r, column=2).value for r in range(3, 12)}
+        self.assertEqual(labels["Единиц"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+import flet as ft
+
+from ui_metrics import UIUpdateRecorder, count_controls
+
+
+class TestUIMetrics(unittest.TestCase):
+    def test_controls_are_counted_through_public_attributes(self):
+        dialog = ft.AlertDialog(
+            title=ft.Text("Количество"),
+            content=ft.Column([ft.TextField(), ft.Dropdown(options=[ft.dropdown.Option("1"), ft.dropdown.Option("2")])]),
+            actions=[ft.TextButton("Отмена"), ft.TextButton(content=ft.Text("Сохранить"))],
+        )
+        self.assertEqual(count_controls(dialog), 10)
+        self.assertEqual(count_controls(ft.ListTile(title="Строка"), None), 1)  # Текстовый title - не контрол
+
+    def test_refresh_records_the_named_source(self):
+        from flet_app import AssemblyApp
+        from headless_page import HeadlessPage
+
+        recorder = UIUpdateRecorder()
+        app = AssemblyApp(HeadlessPage(), ui_recorder=recorder)
+        self.addCleanup(app.scanner.stop)
+        self.addCleanup(app.executor.shutdown)
+        text = ft.Text("Позиция 1 из 1")
+        app.refresh('append_items', text)
+        self.assertEqual(recorder.records[-1][:2], ('append_items', 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import openpyxl
+
+from wave_picking import Wave, location_sort_key
+
+
+def order(article, quantity, location, barcode=''):
+    return {'name': f"Товар {article}", 'quantity': quantity, 'article': article,
+            'location': location, 'barcode': barcode}
+
+
+def make_wave():
+    return Wave([
+        {'file_path': '/tmp/ozon_1.xlsx', 'shipment_info': 'Отгрузка №1 от 01-02-2025',
+         'orders': [order('A', 2, 'B-10', '4601'), order('B', 1, 'A-2', '4602')]},
+        {'file_path': '/tmp/wb_2.xlsx', 'shipment_info': 'Отгрузка №2 от 01-02-2025',
+         'orders': [order('A', 3, 'B-10', '4601'), order('C', 4, 'A-10', '4603')]},
+    ])
+
+
+def pick_all(wave, shortages=None):
+    """Отмечает все строки листа сборки собранными; shortages: артикул -> собранное количество."""
+    shortages = shortages or {}
+    for line in wave.pick_items:
+        collected = shortages.get(line['article'], line['quantity'])
+        line['status'] = 'collected' if collected == line['quantity'] else 'quantity_changed'
+        if collected == 0:
+            line['status'] = 'skipped'
+        line['collected_quantity'] = collected
+
+
+class TestWaveMerge(unittest.TestCase):
+    def test_identical_skus_are_merged_and_sorted_by_cell(self):
+        wave = make_wave()
+
+        self.assertEqual([line['article'] for line in wave.pick_items], ['B', 'C', 'A'])
+        merged = wave.pick_items[2]
+        self.assertEqual(merged['quantity'], 5)
+        self.assertEqual(merged['demand'], [[0, 0, 2], [1, 0, 3]])
+
+    def test_location_sort_is_numeric(self):
+        locations = ['A-10', '', 'A-2', 'B-1']
+        self.assertEqual(sorted(locations, key=location_sort_key), ['A-2', 'A-10', 'B-1', ''])
+
+
+class TestPutWall(unittest.TestCase):
+    def test_shortage_goes_to_later_shipments(self):
+        wave = make_wave()
+        pick_all(wave, shortages={'A': 4})
+        wave.allocate()
+
+        tasks = {(t['shipment'], wave.shipments[t['shipment']]['orders'][t['order']]['article']): t['quantity']
+                 for t in wave.put_tasks}
+        self.assertEqual(tasks[(0, 'A')], 2)
+        self.assertEqual(tasks[(1, 'A')], 2)
+
+    def test_boxes_and_discrepancies_per_shipment(self):
+        wave = make_wave()
+        pick_all(wave, shortages={'A': 4, 'C': 0})
+        wave.allocate()
+
+        for i in wave.pending_tasks():
+            task = wave.put_tasks[i]
+            if task['shipment'] == 1:
+                wave.next_box(1)
+            wave.put(i)
+
+        written = []
+
+        class FakeWriter:
+            def __init__(self, **kwargs):
+                written.append(kwargs)
+
+            def generate_final_file(self):
+                return "out.xlsx"
+
+        results = wave.write_results("/tmp/out", writer_cls=FakeWriter)
+
+        self.assertEqual([r['path'] for r in results], ["out.xlsx", "out.xlsx"])
+        self.assertEqual(results[0]['discrepancies'], [])
+        self.assertEqual(results[1]['discrepancies'], [
+            "Изменено: 4601 было 3, стало 2",
+            "Пропущено: 4603 - 4 шт.",
+        ])
+        self.assertEqual(written[1]['collected_data'][0]['box'], 2)
+        self.assertEqual(written[1]['original_file_path'], '/tmp/wb_2.xlsx')
+
+    def test_failed_shipment_can_be_written_again(self):
+        wave = make_wave()
+        pick_all(wave)
+        wave.allocate()
+        wave.put(wave.pending_tasks()[0])  # Остальное не разложено
+        written = []
+        failing = {'/tmp/wb_2.xlsx'}
+
+        class FlakyWriter:
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+
+            def generate_final_file(self):
+                if self.kwargs['original_file_path'] in failing:
+                    raise ValueError("Нет доступа к папке")
+                written.append(self.kwargs['original_file_path'])
+                return self.kwargs['original_file_path'] + ".out"
+
+        results = wave.write_results("/tmp/out", writer_cls=FlakyWriter)
+        self.assertEqual([r['error'] for r in results], [None, "Нет доступа к папке"])
+        self.assertEqual(results[1]['discrepancies'], ["Пропущено: 4601 - 3 шт.", "Пропущено: 4603 - 4 шт."])
+        # Волна не закрыта: раскладку и повтор записи можно продолжить
+        self.assertEqual(len(wave.pending_tasks()), 3)
+        self.assertEqual({o['status'] for o in wave.shipments[1]['orders']}, {'pending'})
+
+        failing.clear()
+        results = wave.write_results("/tmp/out", writer_cls=FlakyWriter)
+        self.assertEqual(written, ['/tmp/ozon_1.xlsx', '/tmp/wb_2.xlsx'])
+        self.assertEqual([r['path'] for r in results], ['/tmp/ozon_1.xlsx.out', '/tmp/wb_2.xlsx.out'])
+
+    def test_unput_items_become_discrepancies(self):
+        wave = make_wave()
+        pick_all(wave)
+        wave.allocate()
+        wave.put(wave.pending_tasks()[0])
+        wave.close()
+
+        notes = [o['status'] for s in wave.shipments for o in s['orders']]
+        self.assertEqual(notes.count('collected'), 1)
+        self.assertEqual(notes.count('skipped'), 3)
+
+    def test_state_round_trip(self):
+        wave = make_wave()
+        pick_all(wave)
+        wave.allocate()
+        wave.put(0)
+
+        restored = Wave.from_dict(wave.to_dict(), wave.pick_items)
+
+        self.assertTrue(restored.allocated)
+        self.assertEqual(restored.pending_tasks(), wave.pending_tasks())
+
+    def test_one_excel_file_per_shipment(self):
+        wave = make_wave()
+        pick_all(wave)
+        wave.allocate()
+        for i in wave.pending_tasks():
+            wave.put(i)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results = wave.write_results(tmp)
+            names = sorted(Path(r['path']).name.split('_сборка_')[0] for r in results)
+            self.assertEqual(names, ['ozon_1', 'wb_2'])
+
+            ws = openpyxl.load_workbook(results[1]['path']).active
+            self.assertEqual(ws.cell(row=1, column=1).value, 'Отгрузка №2 от 01-02-2025')
+            self.assertEqual(ws.cell(row=4, column=1).value, "КОРОБКА №1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import time
+from collections import defaultdict, deque
+from statistics import median
+from typing import Any, Dict, List, Optional, Tuple
+
+ENV_FLAG = "OFFLINE_ASSEMBLER_UI_STATS"
+STARTUP_ENV_FLAG = "OFFLINE_ASSEMBLER_STARTUP_PROFILE"
+
+
+# Публичные атрибуты контролов Flet, в которых лежат дочерние контролы
+CHILD_ATTRIBUTES = ("controls", "content", "actions", "title", "subtitle", "leading", "trailing",
+                    "options", "rows", "cells", "tabs", "tab_content")
+
+
+def count_controls(*controls) -> int:
+    """
+    Считает контролы во всех переданных поддеревьях. Дочерние контролы
+    берутся из публичных атрибутов (CHILD_ATTRIBUTES); строки в них
+    (например, текстовый title) не считаются.
+    """
+    count = 0
+    stack = list(controls)
+    while stack:
+        control = stack.pop()
+        if control is None or isinstance(control, str):
+            continue
+        count += 1
+        for name in CHILD_ATTRIBUTES:
+            child = getattr(control, name, None)
+            if isinstance(child, (list, tuple)):
+                stack.extend(child)
+            elif child is not None:
+                stack.append(child)
+    return count
+
+
+class UIUpdateRecorder:
+    """
+    Журнал обновлений интерфейса: сколько длилось page.update() и сколько
+    контролов в него попало. Включается переменной окружения
+    OFFLINE_ASSEMBLER_UI_STATS (значение "print" дополнительно печатает
+    каждое обновление) или передачей объекта в AssemblyApp.
+    """
+
+    def __init__(self, max_records: int = 10000, echo: bool = False):
+        self.records = deque(maxlen=max_records)
+        self.echo = echo
+
+    @classmethod
+    def from_env(cls) -> Optional["UIUpdateRecorder"]:
+        value = os.environ.get(ENV_FLAG, "").strip().lower()
+        if not value or value in ("0", "false", "no"):
+            return None
+        return cls(echo=value == "print")
+
+    def record(self, name: str, controls: int, seconds: float):
+        self.records.append((name, controls, seconds))
+        if self.echo:
+            print(f"[ui] {name}: {controls} контролов, {seconds * 1000:.2f} мс")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по источникам обновлений: количество, медиана и максимум времени, средний размер."""
+        grouped = defaultdict(list)
+        for name, controls, seconds in self.records:
+            grouped[name].append((controls, seconds))
+
+        result = {}
+        for name, rows in grouped.items():
+            times = [seconds * 1000 for _, seconds in rows]
+            result[name] = {
+                "count": len(rows),
+                "median_ms": median(times),
+                "max_ms": max(times),
+                "avg_controls": sum(controls for controls, _ in rows) / len(rows),
+            }
+        return result
+
+    def report(self) -> str:
+        lines = [f"{'источник':<28} {'раз':>6} {'медиана, мс':>12} {'макс, мс':>10} {'контролов':>10}"]
+        for name, s in sorted(self.summary().items()):
+            lines.append(f"{name:<28} {s['count']:>6} {s['median_ms']:>12.2f} {s['max_ms']:>10.2f} {s['avg_controls']:>10.1f}")
+        return "\n".join(lines)
+
+
+def seconds_since_process_start() -> Optional[float]:
+    """Время с запуска процесса по /proc (Linux, Android); None, если недоступно."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        # starttime - 22-е поле, после отрезания pid и имени процесса оно 20-е
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimeline:
+    """
+    Отметки времени запуска: от старта процесса до первой отрисовки и
+    фоновой загрузки тяжелых модулей. Включается переменной окружения
+    OFFLINE_ASSEMBLER_STARTUP_PROFILE.
+    """
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.marks: List[Tuple[str, float]] = []
+        # Сколько прошло от запуска процесса до started_at (интерпретатор и его импорты)
+        since_start = seconds_since_process_start()
+        self.before_start = since_start - (time.perf_counter() - started_at) if since_start is not None else None
+
+    @classmethod
+    def from_env(cls, started_at: float) -> Optional["StartupTimeline"]:
+        value = os.environ.get(STARTUP_ENV_FLAG, "").strip().lower()
+        if not value or value in ("0", "false", "no"):
+            return None
+        return cls(started_at)
+
+    def mark(self, name: str):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self) -> str:
+        offset = self.before_start or 0.0
+        lines = []
+        if self.before_start is not None:
+            lines.append(f"{offset * 1000:>9.1f} мс  {offset * 1000:>+9.1f} мс  старт интерпретатора")
+        previous = self.started_at
+        for name, at in self.marks:
+            total = (at - self.started_at + offset) * 1000
+            lines.append(f"{total:>9.1f} мс  {(at - previous) * 1000:>+9.1f} мс  {name}")
+            previous = at
+        return "\n".join(lines)
@@ -0,0 +1,210 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from assembly_state import discrepancy_notes, write_result
+
+# Код товара для объединения строк разных отгрузок: один товар в одной ячейке
+SKU_FIELDS = ('article', 'barcode', 'location')
+
+
+def location_sort_key(location: str):
+    """Ключ сортировки ячеек с учетом чисел: A-2 раньше A-10, пустые ячейки в конце."""
+    location = str(location or '').strip()
+    parts = re.split(r'(\d+)', location.lower())
+    return (location == '', [int(part) if i % 2 else part for i, part in enumerate(parts)])
+
+
+def sku_key(item: Dict[str, Any]) -> tuple:
+    return tuple(str(item.get(field, '') or '').strip().lower() for field in SKU_FIELDS)
+
+
+class Wave:
+    """
+    Волна: несколько отгрузок собираются за один обход склада.
+    Одинаковые товары из всех отгрузок объединяются в одну строку
+    листа сборки (pick_items), отсортированного по ячейкам. После обхода
+    allocate() распределяет собранное по отгрузкам и строит задания
+    раскладки на стену: какой товар, сколько и в ячейку стены какой
+    отгрузки положить. У каждой отгрузки свои коробки и свой итоговый
+    файл ExcelWriter со своими расхождениями.
+    """
+
+    def __init__(self, manifests: List[Dict[str, Any]]):
+        """manifests: словари с ключами file_path, shipment_info и orders (строки ExcelProcessor)."""
+        if not manifests:
+            raise ValueError("Не выбраны файлы для волны.")
+
+        self.shipments: List[Dict[str, Any]] = []
+        for slot, manifest in enumerate(manifests, 1):
+            self.shipments.append({
+                'slot': slot,
+                'file_path': manifest['file_path'],
+                'shipment_info': manifest['shipment_info'],
+                'box': 1,
+                'orders': [
+                    {**order, 'status': 'pending', 'collected_quantity': 0, 'box': 0}
+                    for order in manifest['orders']
+                ],
+            })
+
+        self.pick_items = self.merge()
+        self.put_tasks: List[Dict[str, Any]] = []
+        self.allocated = False
+
+    @classmethod
+    def from_files(cls, file_paths: List[str], processor_cls: Optional[Callable] = None) -> "Wave":
+        """Читает каждый файл через ExcelProcessor; ошибка в одном файле останавливает волну."""
+        if processor_cls is None:
+            from excel_processor import ExcelProcessor as processor_cls
+        manifests = []
+        for file_path in file_paths:
+            try:
+                orders, shipment_info = processor_cls(file_path).process_file()
+            except ValueError as e:
+                raise ValueError(f"{file_path}: {e}")
+            manifests.append({'file_path': file_path, 'shipment_info': shipment_info, 'orders': orders})
+        return cls(manifests)
+
+    @property
+    def shipment_info(self) -> str:
+        return "Волна: " + ", ".join(shipment['shipment_info'] for shipment in self.shipments)
+
+    def merge(self) -> List[Dict[str, Any]]:
+        """
+        Лист сборки волны: одна строка на товар в ячейке с суммой по всем
+        отгрузкам. В demand сохраняется, сколько просит каждая строка
+        каждой отгрузки: [номер отгрузки, номер строки, количество].
+        """
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for s, shipment in enumerate(self.shipments):
+            for o, order in enumerate(shipment['orders']):
+                key = sku_key(order)
+                line = merged.get(key)
+                if line is None:
+                    line = merged[key] = {
+                        'name': order['name'],
+                        'quantity': 0,
+                        'article': order['article'],
+                        'location': order.get('location', ''),
+                        'barcode': order.get('barcode', ''),
+                        'status': 'pending',
+                        'collected_quantity': 0,
+                        'box': 0,
+                        'demand': [],
+                    }
+                line['quantity'] += order['quantity']
+                line['demand'].append([s, o, order['quantity']])
+
+        return sorted(merged.values(), key=lambda line: (location_sort_key(line['location']), line['article']))
+
+    def allocate(self, pick_items: Optional[List[Dict[str, Any]]] = None):
+        """
+        Распределяет собранное количество каждой строки по отгрузкам в порядке
+        загрузки файлов: при недостаче первыми укомплектовываются первые
+        отгрузки. Строки без товара сразу становятся пропущенными.
+        """
+        if pick_items is not None:
+            self.pick_items = pick_items
+
+        self.put_tasks = []
+        for line in self.pick_items:
+            available = line['collected_quantity'] if line['status'] in ('collected', 'quantity_changed') else 0
+            for s, o, requested in line['demand']:
+                order = self.shipments[s]['orders'][o]
+                quantity = min(available, requested)
+                available -= quantity
+                if quantity:
+                    order['status'] = 'pending'
+                    self.put_tasks.append({
+                        'line_id': line.get('line_id', -1),
+                        'shipment': s,
+                        'order': o,
+                        'quantity': quantity,
+                        'status': 'pending',
+                    })
+                else:
+                    order['status'] = 'skipped'
+                    order['collected_quantity'] = 0
+                    order['box'] = 0
+        self.allocated = True
+
+    def pending_tasks(self) -> List[int]:
+        return [i for i, task in enumerate(self.put_tasks) if task['status'] == 'pending']
+
+    def put(self, task_index: int):
+        """Подтверждает раскладку: товар лежит в текущей коробке отгрузки."""
+        task = self.put_tasks[task_index]
+        shipment = self.shipments[task['shipment']]
+        order = shipment['orders'][task['order']]
+        order['collected_quantity'] = task['quantity']
+        order['status'] = 'collected' if task['quantity'] == order['quantity'] else 'quantity_changed'
+        order['box'] = shipment['box']
+        task['status'] = 'done'
+
+    def next_box(self, shipment_index: int) -> int:
+        shipment = self.shipments[shipment_index]
+        shipment['box'] += 1
+        return shipment['box']
+
+    def closed_orders(self, shipment_index: int) -> List[Dict[str, Any]]:
+        """
+        Строки отгрузки такими, какими их делает close(): неразложенный товар
+        и необработанные строки пропущены. Возвращает копии, волна не меняется.
+        """
+        orders = [dict(order) for order in self.shipments[shipment_index]['orders']]
+        for task in self.put_tasks:
+            if task['status'] == 'pending' and task['shipment'] == shipment_index:
+                orders[task['order']].update(status='skipped', collected_quantity=0, box=0)
+        for order in orders:
+            if order['status'] == 'pending':
+                order['status'] = 'skipped'
+        return orders
+
+    def close(self):
+        """Неразложенный товар не попал в коробки отгрузок и считается пропущенным."""
+        for i, shipment in enumerate(self.shipments):
+            for order, closed in zip(shipment['orders'], self.closed_orders(i)):
+                order.update(closed)
+        for task in self.put_tasks:
+            if task['status'] == 'pending':
+                task['status'] = 'skipped'
+
+    def write_results(self, output_directory: Optional[str] = None,
+                      writer_cls: Optional[Callable] = None) -> List[Dict[str, Any]]:
+        """
+        Пишет итоговый файл для каждой отгрузки волны, у которой его еще нет.
+        Волна не меняется, кроме пути записанного файла в отгрузке, поэтому
+        отгрузки с ошибкой записи можно записать повторным вызовом. Возвращает
+        по строке на отгрузку: путь к файлу (или ошибку) и ее расхождения.
+        """
+        results = []
+        for i, shipment in enumerate(self.shipments):
+            orders = self.closed_orders(i)
+            result = {
+                'shipment_info': shipment['shipment_info'],
+                'discrepancies': discrepancy_notes(orders),
+                'path': shipment.get('result_path'),
+                'error': None,
+            }
+            if result['path'] is None:
+                try:
+                    result['path'] = write_result(orders, shipment['shipment_info'], shipment['file_path'],
+                                                  output_directory, writer_cls)
+                    shipment['result_path'] = result['path']
+                except ValueError as e:
+                    result['error'] = str(e)
+            results.append(result)
+        return results
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Состояние для сохранения сессии; лист сборки сохраняется отдельно как assembly_items."""
+        return {'shipments': self.shipments, 'put_tasks': self.put_tasks, 'allocated': self.allocated}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], pick_items: List[Dict[str, Any]]) -> "Wave":
+        wave = cls.__new__(cls)
+        wave.shipments = data['shipments']
+        wave.put_tasks = data.get('put_tasks', [])
+        wave.allocated = data.get('allocated', False)
+        wave.pick_items = pick_items
+        return wave